@@ -6,7 +6,9 @@ import argparse
 from shutil import copy2
 import filecmp
 import coloredlogs, logging, verboselogs
-import exiftool
+from camera_tools import exiftool
+from camera_tools.metadata_cache import MetadataCache
+from camera_tools import probe, isobmff
 from fractions import Fraction
 
 EXIF_CAMERA_MODEL = 'EXIF:Model'
@@ -21,7 +23,14 @@ QUADRUPLE_BITRATE_FPS = [80, 150]
 
 EXIF_OBS_GRAPHICS_MODE = 'QuickTime:GraphicsMode'
 EXIF_OBS_TRACK2NAME = 'QuickTime:Track2Name'
+EXIF_MANUFACTURER = 'XML:DeviceManufacturer'
+# Only these tags are read, instead of all metadata.
+EXIF_TAGS = [EXIF_CAMERA_MODEL, EXIF_MANUFACTURER, EXIF_VIDEO_HEIGHT, EXIF_VIDEO_FPS, EXIF_MKV_VIDEO_HEIGHT, EXIF_MKV_VIDEO_FPS, EXIF_OBS_GRAPHICS_MODE, EXIF_OBS_TRACK2NAME]
 OBS_AUDIOTRACK_NAME = 'All (recording)'         # Assuming that the first audio track is names as this for all OBS videos.
+# exiftool -if conditions selecting the videos worth reading, so the others are filtered out by exiftool itself.
+# OBS MKVs are detected with ffprobe, so they are always read. (# reads the unconverted value, as with -n)
+EXIF_CAMERA_CONDITION = f"${EXIF_CAMERA_MODEL} eq 'Canon EOS M50' or ${EXIF_MANUFACTURER} eq 'Sony'"
+EXIF_OBS_CONDITION = f"(${EXIF_OBS_GRAPHICS_MODE}# eq 0 and ${EXIF_OBS_TRACK2NAME} eq '{OBS_AUDIOTRACK_NAME}') or $File:FileType eq 'MKV'"
 
 #COLOUR_RANGE_FULL = ["-color_range", "pc", "-colorspace", "bt709", "-color_trc", "bt709", "-color_primaries", "bt709", "-pix_fmt", "yuvj420p"]
 COLOUR_RANGE_FULL = ["-color_range", "pc", "-colorspace", "bt709", "-color_trc", "bt709", "-color_primaries", "bt709"]
@@ -37,8 +46,11 @@ elif ffprobe_out['streams'][0]['color_space'] == 'bt470bg':
     colour_range = COLOUR_RANGE_LIMITED_PAL
 """
 
-
-FFPROBE = ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-print_format", "json"]
+# Only these entries are read with ffprobe: of the first video stream, or of all streams for MKV (audio track title).
+# They include those of isobmff.video_info_from_probe(), so verifying encoded videos reuses the same memoised probe.
+FFPROBE_STREAM_ENTRIES = ['color_space', 'codec_name', 'width', 'height', 'r_frame_rate', 'duration', 'pix_fmt']
+FFPROBE_FORMAT_ENTRIES = isobmff.FFPROBE_FORMAT_ENTRIES
+FFPROBE_MKV_STREAM_TAGS = ['title']
 
 class Formatter(argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter):
     pass
@@ -61,23 +73,98 @@ parser.add_argument('-u', '--uhd_bitrate', type=int, default=32000,
 parser.add_argument('--detect', type=str, default='camera', choices=['camera', 'OBS'],
         help='Whether to detect camera videos or OBS videos')
 parser.add_argument('--action_detect_failed', type=str, default='copy', choices=['copy', 'encode'],
-        help='When video detection is failed (due to Korean file name), copy the file or encode the file?')
+        help='When video detection is failed (exiftool cannot read the file), copy the file or encode the file?')
 parser.add_argument('--skip_ext', type=str, nargs='*', default=['CR3', 'ARW'],
         help='File extensions to skip')
 parser.add_argument('--verify_encoded_videos', action='store_true',
         help='Verify if the encoding has not failed, by seeing if duration almost matches (up to a second)')
+parser.add_argument('-j', '--exiftool_workers', type=int, default=os.cpu_count() or 1,
+        help='Number of exiftool processes reading video metadata in parallel')
+parser.add_argument('--exiftool_fast', type=int, default=1, choices=[0, 1, 2],
+        help='exiftool -fast level. 2 stops reading at the mdat atom, which misses metadata stored after the video data')
+parser.add_argument('--no_cache', action='store_true',
+        help='Do not use the EXIF metadata cache')
+parser.add_argument('--refresh_cache', action='store_true',
+        help='Read metadata of every video again and overwrite the cache')
+parser.add_argument('--ffprobe_workers', type=int, default=None,
+        help='Number of ffprobe processes reading videos in parallel. Defaults to min(8, number of CPUs)')
 
 args = parser.parse_args()
 
 class CopyFile(Exception): pass
 class DontCopyFile(Exception): pass
 
-import json
 def ffprobe(source_file):
-    proc = subprocess.Popen(FFPROBE + [source_file], stdout=subprocess.PIPE, shell=False)
-    (ffprobe_out, ffprobe_err) = proc.communicate()
-    ffprobe_out = ffprobe_out.decode('utf-8')
-    return json.loads(ffprobe_out)
+    """Probe the first video stream. Results are memoised, so each file is only probed once.
+    """
+    return probe.probe(source_file, FFPROBE_STREAM_ENTRIES, FFPROBE_FORMAT_ENTRIES, select_streams='v:0')
+
+def ffprobe_mkv(source_file):
+    """Probe all streams of an MKV, with their titles (streams[1] is the first audio track).
+    """
+    return probe.probe(source_file, FFPROBE_STREAM_ENTRIES, FFPROBE_FORMAT_ENTRIES, stream_tags=FFPROBE_MKV_STREAM_TAGS)
+
+def video_info(video_file):
+    """Read the video properties from the boxes of MP4/MOV, or else from the same memoised probe as the checks above.
+    """
+    info = isobmff.read_video_info(video_file)
+    if info is not None:
+        return info
+    if os.path.splitext(video_file)[1][1:].lower() == 'mkv':
+        return isobmff.video_info_from_probe(ffprobe_mkv(video_file))
+    return isobmff.video_info_from_probe(ffprobe(video_file))
+
+
+METADATA_EXTS = ['mp4', 'mkv']
+prefetched_metadata = {}
+metadata_cache = None
+
+def prefetch_metadata(source_dir):
+    """Read the metadata of all videos up front, spreading the work over multiple exiftool processes.
+    Only the videos that may be detected are returned by exiftool. The others get empty metadata.
+    """
+    source_files = []
+    for root, dirs, files in os.walk(source_dir):
+        for name in files:
+            if os.path.splitext(name)[1][1:].lower() in METADATA_EXTS:
+                source_files.append(os.path.join(root, name))
+
+    if not source_files:
+        return {}
+
+    with exiftool.ExifToolPool(min(args.exiftool_workers, len(source_files)), cache=metadata_cache, fast=args.exiftool_fast) as et:
+        condition = EXIF_CAMERA_CONDITION if args.detect == 'camera' else EXIF_OBS_CONDITION
+        result = et.read_tags_batch(EXIF_TAGS, source_files, condition=condition)
+
+    metadata = {}
+    for source_file, file_metadata in zip(source_files, result.metadata):
+        if file_metadata is None and source_file not in result.errors:
+            file_metadata = {}      # didn't match the condition
+        metadata[source_file] = file_metadata       # None for files exiftool can't read
+    return metadata
+
+def prefetch_ffprobe(source_dir):
+    """Probe the videos that are always probed (MTS for camera, MKV for OBS) up front, in parallel.
+    The results are memoised, so the checks below don't run ffprobe again.
+    """
+    if args.detect == 'camera':
+        probe_ext, probe_kwargs = 'mts', {'select_streams': 'v:0'}
+    else:
+        probe_ext, probe_kwargs = 'mkv', {'stream_tags': FFPROBE_MKV_STREAM_TAGS}
+    source_files = (os.path.join(root, name)
+            for root, dirs, files in os.walk(source_dir)
+            for name in files if os.path.splitext(name)[1][1:].lower() == probe_ext)
+    for _ in probe.probe_many(source_files, FFPROBE_STREAM_ENTRIES, FFPROBE_FORMAT_ENTRIES, workers=args.ffprobe_workers, **probe_kwargs):
+        pass
+
+def get_metadata(source_file):
+    """Return None if exiftool can't read the file.
+    """
+    if source_file in prefetched_metadata:
+        return prefetched_metadata[source_file]
+    with exiftool.ExifTool(cache=metadata_cache, fast=args.exiftool_fast) as et:
+        metadata = et.get_tags_batch(EXIF_TAGS, [source_file])
+    return metadata[0] if metadata else None
 
 
 def check_file_OBS_video(source_file, ext):
@@ -86,12 +173,9 @@ def check_file_OBS_video(source_file, ext):
     Detects OBS video with the first audio trackname as "All (recording)" and the colour space is bt709 (full range).
     """
     if ext == "mp4":
-        try:
-            with exiftool.ExifTool() as et:
-                metadata = et.get_metadata(source_file)
-        except json.decoder.JSONDecodeError:
-            ffprobe_out = ffprobe(source_file)
-            return 'failed', None, ffprobe_out      # failed to read the metadata. Possibly Korean filename?
+        metadata = get_metadata(source_file)
+        if metadata is None:
+            return 'failed', None, ffprobe(source_file)     # failed to read the metadata.
 
         if EXIF_OBS_GRAPHICS_MODE in metadata.keys():
             graphics_mode = metadata[EXIF_OBS_GRAPHICS_MODE]
@@ -104,13 +188,8 @@ def check_file_OBS_video(source_file, ext):
                         if ffprobe_out['streams'][0]['color_space'] == 'bt709':
                             return 'OBS', metadata, ffprobe_out
     elif ext == "mkv":
-        try:
-            with exiftool.ExifTool() as et:
-                metadata = et.get_metadata(source_file)
-        except json.decoder.JSONDecodeError:
-            metadata = None         # failed to read the metadata. Possibly Korean filename?
-
-        ffprobe_out = ffprobe(source_file)
+        metadata = get_metadata(source_file)
+        ffprobe_out = ffprobe_mkv(source_file)
         if ffprobe_out['streams'][1]['tags']['title'] == OBS_AUDIOTRACK_NAME:
             # Assuming that the first audio track is names as this for all OBS videos.
             if ffprobe_out['streams'][0]['color_space'] == 'bt709':
@@ -120,12 +199,9 @@ def check_file_OBS_video(source_file, ext):
 
 def check_file_M50_video(source_file, ext):
     if ext == "mp4":
-        try:
-            with exiftool.ExifTool() as et:
-                metadata = et.get_metadata(source_file)
-        except json.decoder.JSONDecodeError:
-            ffprobe_out = ffprobe(source_file)
-            return 'failed', None, ffprobe_out      # failed to read the metadata. Possibly Korean filename?
+        metadata = get_metadata(source_file)
+        if metadata is None:
+            return 'failed', None, ffprobe(source_file)     # failed to read the metadata.
 
         if EXIF_CAMERA_MODEL in metadata.keys():
             camera_model = metadata[EXIF_CAMERA_MODEL]
@@ -136,14 +212,10 @@ def check_file_M50_video(source_file, ext):
 
 def check_file_a6000_video(source_file, ext):
     if ext == "mp4":
-        try:
-            with exiftool.ExifTool() as et:
-                metadata = et.get_metadata(source_file)
-        except json.decoder.JSONDecodeError:
-            ffprobe_out = ffprobe(source_file)
-            return 'failed', None, ffprobe_out      # failed to read the metadata. Possibly Korean filename?
-
-        EXIF_MANUFACTURER = 'XML:DeviceManufacturer'
+        metadata = get_metadata(source_file)
+        if metadata is None:
+            return 'failed', None, ffprobe(source_file)     # failed to read the metadata.
+
         if EXIF_MANUFACTURER in metadata.keys():
             manufacturer = metadata[EXIF_MANUFACTURER]
 
@@ -154,7 +226,7 @@ def check_file_a6000_video(source_file, ext):
 def check_file_handycam_video(source_file, ext):
     if ext == "mts":
         ffprobe_out = ffprobe(source_file)
-        return 'handycam', None, ffprobe_out      # failed to read the metadata. Possibly Korean filename?
+        return 'handycam', None, ffprobe_out
 
     return 'unknown', None, None
 
@@ -186,6 +258,13 @@ if __name__ == '__main__':
 
     check_file_camera_or_obs_video = check_file_camera_video if args.detect == 'camera' else check_file_OBS_video
 
+    if not args.no_cache:
+        metadata_cache = MetadataCache(refresh=args.refresh_cache)
+    logger.info("Reading video metadata with %d exiftool processes", args.exiftool_workers)
+    prefetched_metadata = prefetch_metadata(args.source_dir)
+    logger.info("Reading videos with ffprobe")
+    prefetch_ffprobe(args.source_dir)
+
     for root, dirs, files in os.walk(args.source_dir):
         dest_root = root.replace(args.source_dir, args.destination_dir, 1)
 
@@ -215,13 +294,13 @@ if __name__ == '__main__':
                 if filecmp.cmp(source_file,dest_file,shallow=True):     # doesn't compare file content
                     logger.info("Skipping file (already exists): %s", dest_file)
                 else:
-                    camera_brand, _, ffprobe_source = check_file_camera_or_obs_video(source_file, ext)
+                    camera_brand, _, _ = check_file_camera_or_obs_video(source_file, ext)
                     if camera_brand not in ['unknown', 'failed']:
                         if args.verify_encoded_videos:
-                            if ffprobe_source is None:
-                                ffprobe_source = ffprobe(source_file)
-                            ffprobe_dest = ffprobe(dest_file)
-                            if abs(float(ffprobe_source['streams'][0]['duration']) - float(ffprobe_dest['streams'][0]['duration'])) > 1.0:
+                            # MP4 durations are read from the boxes directly, others from the prefetched probe.
+                            source_info = video_info(source_file)
+                            dest_info = video_info(dest_file)
+                            if source_info is None or dest_info is None or abs(source_info.duration - dest_info.duration) > 1.0:
                                 logger.error("Video not encoded properly! Skipping: %s", dest_file)
                                 nb_error += 1
                             else:
@@ -242,7 +321,7 @@ if __name__ == '__main__':
                     camera_brand, metadata, ffprobe_out = check_file_camera_or_obs_video(source_file, ext)
 
                     if camera_brand == 'failed':
-                        logger.warning("Cannot identify metadata from video: %s. Korean file names may not be supported.", source_file)
+                        logger.warning("Cannot identify metadata from video: %s", source_file)
                         nb_warning += 1
 
                     camera_file_detected = camera_brand not in ['unknown', 'failed']
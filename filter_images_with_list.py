@@ -32,7 +32,7 @@ parser.add_argument(
 parser.add_argument(
     "--copy_json",
     action="store_true",
-    help="Copy the json files together with the images.",
+    help="Copy the saved EXIF together with the images: from the EXIF sidecar store (.camera_tools_exif.sqlite) into the destination's, or else the json files.",
 )
 parser.add_argument(
     "--copy_cr3",
@@ -52,6 +52,9 @@ parser.add_argument(
 args = parser.parse_args()
 
 
+from camera_tools.exif_sidecar import ExifSidecars
+
+
 def copy_file(
     source_dir: str | PathLike,
     destination_dir: str | PathLike,
@@ -104,17 +107,29 @@ if __name__ == "__main__":
         copy_func = copy2
         copy_msg = "Copying"
 
+    sidecars = ExifSidecars()
     for image_name in image_name_list:
         nb_error += not copy_file(
             args.source_dir, args.destination_dir, image_name, copy_func, copy_msg
         )
 
         if args.copy_json:
-            # JSON
-            json_name = image_name + ".json"
-            nb_error += not copy_file(
-                args.source_dir, args.destination_dir, json_name, copy_func, copy_msg
-            )
+            if sidecars.copy(
+                os.path.join(args.source_dir, image_name),
+                os.path.join(args.destination_dir, image_name),
+                move=args.delete_originals,
+            ):
+                logger.info("%s EXIF of %s to the sidecar store", copy_msg, image_name)
+            else:
+                # JSON
+                json_name = image_name + ".json"
+                nb_error += not copy_file(
+                    args.source_dir,
+                    args.destination_dir,
+                    json_name,
+                    copy_func,
+                    copy_msg,
+                )
 
         if args.copy_cr3:
             # CR3
@@ -130,6 +145,8 @@ if __name__ == "__main__":
                 args.source_dir, args.destination_dir, arw_name, copy_func, copy_msg
             )
 
+    sidecars.close()
+
     if nb_warning > 0:
         logger.warning("%d warning(s) found.", nb_warning)
 
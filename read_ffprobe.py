@@ -1,8 +1,5 @@
 #!/usr/bin/env python3
 
-FFPROBE = ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-print_format", "json"]
-
-
 import argparse
 
 class Formatter(argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter):
@@ -15,31 +12,27 @@ Author: Kiyoon Kim (yoonkr33@gmail.com)''',
         formatter_class=Formatter)
 parser.add_argument('input_files', type=str, nargs='+',
         help='files to read metadata')
+parser.add_argument('--stream_entries', type=str, nargs='*',
+        help='Only show these stream entries (e.g. codec_name height r_frame_rate). Shows everything if no entries are given')
+parser.add_argument('--format_entries', type=str, nargs='*',
+        help='Only show these format entries (e.g. duration)')
+parser.add_argument('--select_streams', type=str,
+        help='Only show these streams (e.g. v:0 for the first video stream)')
+parser.add_argument('-j', '--workers', type=int, default=None,
+        help='Number of ffprobe processes running in parallel. Defaults to min(8, number of CPUs)')
 
 args = parser.parse_args()
 
 
 import glob
 
-import os
-import exiftool
 import pprint
 
-import json
-import subprocess
-def ffprobe(source_file):
-    proc = subprocess.Popen(FFPROBE + [source_file], stdout=subprocess.PIPE, shell=False)
-    (ffprobe_out, ffprobe_err) = proc.communicate()
-    ffprobe_out = ffprobe_out.decode('utf-8')
-    return json.loads(ffprobe_out)
+from camera_tools import probe
 
 if __name__ == "__main__":
-    for origpath in args.input_files:
-        for path in glob.glob(origpath):    # glob: Windows wildcard support
-            root, fname_ext = os.path.split(path)
-            fname, fext = os.path.splitext(fname_ext)
-
-            metadata = ffprobe(path)
-
-            print(path)
-            pprint.pprint(metadata)
+    paths = (path for origpath in args.input_files for path in glob.glob(origpath))    # glob: Windows wildcard support
+    for path, metadata in probe.probe_many(paths, args.stream_entries, args.format_entries,
+            select_streams=args.select_streams, workers=args.workers):
+        print(path)
+        pprint.pprint(metadata)
@@ -6,16 +6,12 @@ import argparse
 from shutil import copy2
 import filecmp
 import coloredlogs, logging, verboselogs
-from fractions import Fraction
 
 DOUBLE_BITRATE_FPS = [40,80]
 QUADRUPLE_BITRATE_FPS = [80, 150]
 
 COLOUR_RANGE_FULL = ["-color_range", "pc", "-colorspace", "bt709", "-color_trc", "bt709", "-color_primaries", "bt709"]
 
-
-FFPROBE = ["ffprobe", "-v", "error", "-show_streams", "-show_format", "-print_format", "json"]
-
 class Formatter(argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter):
     pass
 
@@ -39,22 +35,20 @@ parser.add_argument('--verify_encoded_videos', action='store_true',
 args = parser.parse_args()
 
 
-import json
-def ffprobe(source_file):
-    proc = subprocess.Popen(FFPROBE + [source_file], stdout=subprocess.PIPE, shell=False)
-    (ffprobe_out, ffprobe_err) = proc.communicate()
-    ffprobe_out = ffprobe_out.decode('utf-8')
-    return json.loads(ffprobe_out)
+from camera_tools import isobmff
 
 
 def is_mp4_hevc_10bit_422(source_file, ext):
+    """The video properties are read from the MP4 boxes directly, falling back to ffprobe.
+    """
+    video_info = None
     if ext == "mp4":
-        ffprobe_out = ffprobe(source_file)
-        if ffprobe_out['streams'][0]['codec_name'] == 'hevc':
-            if ffprobe_out['streams'][0]['pix_fmt'] == 'yuv422p10le':
-                return True, ffprobe_out
+        video_info = isobmff.video_info(source_file)
+        if video_info is not None and video_info.codec == 'hevc':
+            if video_info.pix_fmt == 'yuv422p10le':
+                return True, video_info
 
-    return False, ffprobe_out
+    return False, video_info
 
 
 if __name__ == '__main__':
@@ -96,13 +90,11 @@ if __name__ == '__main__':
                 if filecmp.cmp(source_file,dest_file,shallow=True):     # doesn't compare file content
                     logger.info("Skipping file (already exists): %s", dest_file)
                 else:
-                    perform_transcode, ffprobe_source = is_mp4_hevc_10bit_422(source_file, ext)
+                    perform_transcode, source_info = is_mp4_hevc_10bit_422(source_file, ext)
                     if perform_transcode:
                         if args.verify_encoded_videos:
-                            if ffprobe_source is None:
-                                ffprobe_source = ffprobe(source_file)
-                            ffprobe_dest = ffprobe(dest_file)
-                            if abs(float(ffprobe_source['streams'][0]['duration']) - float(ffprobe_dest['streams'][0]['duration'])) > 1.0:
+                            dest_info = isobmff.video_info(dest_file)
+                            if dest_info is None or abs(source_info.duration - dest_info.duration) > 1.0:
                                 logger.error("Video not encoded properly! Skipping: %s", dest_file)
                                 nb_error += 1
                             else:
@@ -114,16 +106,15 @@ if __name__ == '__main__':
                         nb_error += 1
             else:
                 try:
-                    perform_transcode, ffprobe_out = is_mp4_hevc_10bit_422(source_file, ext)
+                    perform_transcode, video_info = is_mp4_hevc_10bit_422(source_file, ext)
 
                     if not perform_transcode:
                         logger.info("Skipping non-supported videos that are not HEVC 10bit 4:2:2: %s", source_file)
                         continue
 
 
-                    # read video height and fps using ffprobe
-                    video_height = int(ffprobe_out['streams'][0]['height'])
-                    video_fps = float(Fraction(ffprobe_out['streams'][0]['r_frame_rate']))
+                    video_height = video_info.height
+                    video_fps = video_info.fps
 
                     bitrate = args.bitrate
                     if DOUBLE_BITRATE_FPS[0] <= video_fps < DOUBLE_BITRATE_FPS[1]:
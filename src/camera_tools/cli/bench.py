@@ -0,0 +1,278 @@
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Annotated
+
+import piexif
+from cyclopts import App, Parameter
+from PIL import Image
+
+from .. import __version__, exiftool
+from ..utils.log import console
+
+bench_app = App(name="bench", help="Benchmarks to track performance between releases.")
+
+# Tags every synthetic file has, read by the "date" projection.
+DATE_TAGS = ["Composite:SubSecCreateDate", "EXIF:Model", "QuickTime:CreateDate"]
+
+# Seconds between 1904-01-01 (QuickTime epoch) and 1970-01-01.
+_QUICKTIME_EPOCH_OFFSET = 2082844800
+
+# Time zone of the synthetic files, as in their EXIF offset tags.
+_FILES_TIMEZONE = timezone(timedelta(hours=9))
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(payload)) + box_type + payload
+
+
+def make_jpeg(path: Path, date: datetime, index: int, size: int = 64):
+    """Write a small JPEG with EXIF date, sub-second, offset and camera tags."""
+    date_str = date.strftime("%Y:%m:%d %H:%M:%S").encode()
+    exif = {
+        "0th": {
+            piexif.ImageIFD.Make: b"Canon",
+            piexif.ImageIFD.Model: b"Canon EOS R6",
+            piexif.ImageIFD.DateTime: date_str,
+        },
+        "Exif": {
+            piexif.ExifIFD.DateTimeOriginal: date_str,
+            piexif.ExifIFD.DateTimeDigitized: date_str,
+            piexif.ExifIFD.SubSecTimeOriginal: f"{index % 100:02d}".encode(),
+            piexif.ExifIFD.SubSecTimeDigitized: f"{index % 100:02d}".encode(),
+            piexif.ExifIFD.OffsetTimeOriginal: b"+09:00",
+            piexif.ExifIFD.OffsetTimeDigitized: b"+09:00",
+        },
+    }
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (index % 256, 128, 64)).save(
+        buffer, "JPEG", exif=piexif.dump(exif)
+    )
+    path.write_bytes(buffer.getvalue())
+
+
+def make_mp4(path: Path, date: datetime, duration: int = 10, mdat_size: int = 4096):
+    """Write a minimal MP4 (ftyp, moov/mvhd with the creation date, mdat) without any encoder."""
+    timestamp = int(date.timestamp()) + _QUICKTIME_EPOCH_OFFSET
+    timescale = 1000
+    mvhd = struct.pack(
+        ">B3xIIII",  # version 0, flags
+        0,
+        timestamp,
+        timestamp,
+        timescale,
+        duration * timescale,
+    )
+    mvhd += struct.pack(">IH10x", 0x00010000, 0x0100)  # rate 1.0, volume 1.0
+    mvhd += struct.pack(">9I", 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)
+    mvhd += bytes(24)  # pre_defined
+    mvhd += struct.pack(">I", 2)  # next_track_ID
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 0x200) + b"isomiso2mp41")
+    path.write_bytes(
+        ftyp + _box(b"moov", _box(b"mvhd", mvhd)) + _box(b"mdat", bytes(mdat_size))
+    )
+
+
+def make_files(directory: Path, n_files: int) -> list[str]:
+    """
+    Generate `n_files` synthetic files with known dates, alternating JPEG and MP4.
+
+    Files already generated in `directory` are reused.
+    """
+    start = datetime(2024, 1, 1, 9, 0, 0, tzinfo=_FILES_TIMEZONE)
+    paths = []
+    for i in range(n_files):
+        date = start + timedelta(seconds=i)
+        if i % 2 == 0:
+            path = directory / f"IMG_{i:05d}.JPG"
+            if not path.exists():
+                make_jpeg(path, date, i)
+        else:
+            path = directory / f"MVI_{i:05d}.MP4"
+            if not path.exists():
+                make_mp4(path, date)
+        paths.append(str(path))
+    return paths
+
+
+def _peak_rss_mb(children: bool = False) -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    max_rss = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return max_rss / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(
+    paths: list[str],
+    json_bytes: int,
+    batch_size: int,
+    projection: str,
+    workers: int,
+    executable: str | None,
+    fast: int,
+) -> dict:
+    """
+    Read `paths` in batches of `batch_size` and measure it.
+
+    Run in a fresh process, so peak RSS belongs to this scenario only.
+    `workers` of 0 means a single `ExifTool`, otherwise an `ExifToolPool`.
+    """
+    if workers:
+        et = exiftool.ExifToolPool(workers, executable, fast=fast, server="never")
+    else:
+        et = exiftool.ExifTool(executable, fast=fast, server="never")
+    latencies = []
+    with et:
+        start = time.perf_counter()
+        for begin in range(0, len(paths), batch_size):
+            batch = paths[begin : begin + batch_size]
+            call_start = time.perf_counter()
+            if projection == "all":
+                et.get_metadata_batch(batch)
+            else:
+                et.get_tags_batch(DATE_TAGS, batch)
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        percentiles = latencies * 99
+    return {
+        "mode": "pool" if workers else "single",
+        "workers": workers or 1,
+        "batch_size": batch_size,
+        "projection": projection,
+        "n_files": len(paths),
+        "n_calls": len(latencies),
+        "seconds": elapsed,
+        "files_per_second": len(paths) / elapsed,
+        "json_mb_per_second": json_bytes / elapsed / 1e6,
+        "latency_ms": {
+            "p50": percentiles[49] * 1000,
+            "p90": percentiles[89] * 1000,
+            "p99": percentiles[98] * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+        # exiftool processes, once terminated
+        "children_peak_rss_mb": _peak_rss_mb(children=True),
+    }
+
+
+def _print_row(row: str):
+    # Plain, so the columns line up however wide the terminal is.
+    console.print(row, markup=False, highlight=False, soft_wrap=True)
+
+
+@bench_app.command(name="exiftool")
+def bench_exiftool(
+    *,
+    n_files: Annotated[int, Parameter(name=["--n-files", "-n"])] = 500,
+    batch_sizes: list[int] = [1, 32, 256],  # noqa: B006
+    projections: list[str] = ["all", "date"],  # noqa: B006
+    workers: Annotated[int | None, Parameter(name=["--workers", "-j"])] = None,
+    fast: int = 0,
+    executable: str | None = None,
+    output: Annotated[Path | None, Parameter(name=["--output", "-o"])] = None,
+    files_dir: Path | None = None,
+):
+    """
+    Benchmark reading metadata with camera_tools.exiftool on synthetic JPEG/MP4 files.
+
+    Every combination of batch size, tag projection and single/pooled processes reads all files,
+    in its own Python process. Reported are files/s, MB/s of exiftool JSON parsed,
+    per-call latency percentiles and peak RSS (of Python and of the exiftool processes).
+
+    Author: Kiyoon Kim
+
+    Args:
+        n_files: Number of synthetic files (half JPEG, half MP4).
+        batch_sizes: Number of files per call.
+        projections: "all" reads all metadata, "date" only a few date tags.
+        workers: Number of processes of the pooled runs. Defaults to the number of CPUs.
+        fast: exiftool -fast level.
+        executable: exiftool executable. Defaults to the one camera_tools uses.
+        output: Write the results as JSON to this file, to track regressions between releases.
+        files_dir: Generate the files here and keep them, instead of in a temporary directory.
+            Files generated by a previous run are reused.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    for projection in projections:
+        if projection not in ("all", "date"):
+            raise ValueError(f"Unknown projection: {projection}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = Path(tmp_dir) if files_dir is None else files_dir
+        directory.mkdir(parents=True, exist_ok=True)
+        console.print(f"Generating {n_files} files in {directory}...", markup=False)
+        paths = make_files(directory, n_files)
+
+        # Size of the JSON each projection parses, for MB/s
+        json_bytes = {}
+        with exiftool.ExifTool(executable, fast=fast, server="never") as et:
+            exiftool_version = et.execute(b"-ver").decode().strip()
+            for projection in projections:
+                tag_params = [] if projection == "all" else ["-" + t for t in DATE_TAGS]
+                params = [exiftool.fsencode(p) for p in ("-j", *tag_params, *paths)]
+                json_bytes[projection] = len(et.execute(*params))
+
+        results = []
+        _print_row(
+            f"{'mode':>6} {'batch':>6} {'tags':>5} {'files/s':>9} {'JSON MB/s':>10}"
+            f" {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'RSS MB':>7} {'exiftool RSS MB':>16}"
+        )
+        spawn = multiprocessing.get_context("spawn")
+        for pool_workers in (0, workers):
+            for batch_size in batch_sizes:
+                for projection in projections:
+                    with ProcessPoolExecutor(1, mp_context=spawn) as executor:
+                        result = executor.submit(
+                            run_scenario,
+                            paths,
+                            json_bytes[projection],
+                            batch_size,
+                            projection,
+                            pool_workers,
+                            executable,
+                            fast,
+                        ).result()
+                    results.append(result)
+                    latency = result["latency_ms"]
+                    _print_row(
+                        f"{result['mode']:>6} {batch_size:>6} {projection:>5}"
+                        f" {result['files_per_second']:>9.1f} {result['json_mb_per_second']:>10.2f}"
+                        f" {latency['p50']:>8.1f} {latency['p90']:>8.1f} {latency['p99']:>8.1f}"
+                        f" {result['peak_rss_mb'] or 0:>7.1f} {result['children_peak_rss_mb'] or 0:>16.1f}"
+                    )
+
+    if output is not None:
+        report = {
+            "camera_tools_version": __version__,
+            "exiftool_version": exiftool_version,
+            "python_version": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "n_files": n_files,
+            "fast": fast,
+            "results": results,
+        }
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        console.print(f"Results written to {output}", markup=False)
@@ -1,40 +1,51 @@
 import glob
+import itertools
 import os
 import platform
 import pprint
 import re
-from datetime import datetime
+from collections.abc import Iterable
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 from enum import Enum
 from os import PathLike
 from pathlib import Path
-from typing import Annotated, Any
+from typing import Annotated, Any, NamedTuple, TextIO
 
 import tqdm
 from cyclopts import Parameter
 
 from camera_tools import exiftool
+from camera_tools.exif_sidecar import ExifSidecars
+from camera_tools.jpeg_header import TAG_NAMES, read_jpeg_tags
+from camera_tools.metadata_cache import MetadataCache
+from camera_tools.rename_journal import JournalRun, RenameJournal
+from camera_tools.utils.birth_time import birth_time
+from camera_tools.utils.log import console
 
+# In the current directory, like the undo scripts.
+JOURNAL_FILENAME = ".datename_journal.jsonl"
 
-def creation_date(file_path: str | PathLike):
+
+def creation_date(file_path: str | PathLike, fallbacks: list | None = None):
     """
     Try to get the date that a file was created, falling back to when it was last modified if that isn't possible.
 
-    See http://stackoverflow.com/a/39501288/1709587 for explanation.
+    On Linux, it is read with statx(2), if the file system records it.
+    The files that fall back are appended to `fallbacks`, to warn once for all of them,
+    or else a warning is printed for each.
     """
-    file_path = Path(file_path)
-    if platform.system() == "Windows":
-        return file_path.stat().st_ctime
+    timestamp = birth_time(file_path)
+    if timestamp is not None:
+        return timestamp
+    if fallbacks is not None:
+        fallbacks.append(file_path)
     else:
-        stat = file_path.stat()
-        try:
-            return stat.st_birthtime
-        except AttributeError:
-            # We're probably on Linux or Mac. No easy way to get creation dates here,
-            # so we'll settle for when its content was last modified.
-            print(
-                "Warning: creation date is only supported on Windows. Using modified date"
-            )
-            return stat.st_mtime
+        print(
+            f"Warning: creation date is not recorded for {file_path}. Using modified date"
+        )
+    return modified_date(file_path)
 
 
 def modified_date(file_path: str | PathLike):
@@ -47,34 +58,160 @@ def modified_date(file_path: str | PathLike):
         return stat.st_mtime
 
 
-def path_no_overwrite_counter(path: str | PathLike, zfill=2):
-    path = Path(path)
-    path_wo_ext, fext = os.path.splitext(path)
-    if path.is_file():
-        counter = 2
-        path = Path(path_wo_ext + "_" + str(counter).zfill(zfill) + fext)
-        while path.is_file():
-            counter += 1
-            path = Path(path_wo_ext + "_" + str(counter).zfill(zfill) + fext)
+class DirectoryNames:
+    """
+    Names in the target directories, each listed only once, plus the names planned so far.
+
+    Names are compared case-insensitively, as on Windows and macOS file systems.
+    """
 
-    return path
+    def __init__(self):
+        self._names: dict[Path, dict[str, str]] = {}
+
+    def _listing(self, directory: Path) -> dict[str, str]:
+        names = self._names.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory) as entries:
+                    names = {entry.name.casefold(): entry.name for entry in entries}
+            except OSError:
+                names = {}
+            self._names[directory] = names
+        return names
+
+    def find(self, directory: Path, name: str) -> str | None:
+        """Return the actual name of a file, which may differ in case, or None if it doesn't exist."""
+        return self._listing(directory).get(name.casefold())
+
+    def reserve(self, directory: Path, stem: str, suffixes: list[str], zfill=2) -> str:
+        """
+        Reserve `stem + suffix` for every suffix, adding a counter to the stem (e.g. _02) until all are free.
+
+        Returns:
+            The stem reserved.
+        """
+        names = self._listing(directory)
+        new_stem = stem
+        counter = 1
+        while any((new_stem + suffix).casefold() in names for suffix in suffixes):
+            counter += 1
+            new_stem = stem + "_" + str(counter).zfill(zfill)
+        for suffix in suffixes:
+            names[(new_stem + suffix).casefold()] = new_stem + suffix
+        return new_stem
 
 
-def get_exif_batch(input_files: list[str]):
-    glob_input_files = []
+def glob_input_files(input_files: list[str]) -> list[str]:
+    paths = []
     for origpath in input_files:
-        for path in glob.glob(origpath):  # glob: Windows wildcard support
-            glob_input_files.append(path)
+        paths.extend(glob.glob(origpath))  # glob: Windows wildcard support
+    return paths
+
+
+def iter_exif_batch(
+    paths: list[str],
+    workers: int | None = None,
+    cache: MetadataCache | None = None,
+    tags: list[str] | None = None,
+    fast: int = 0,
+    errors: dict[str, str] | None = None,
+    timeout: float | None = None,
+):
+    """
+    Yield (path, EXIF metadata) pairs chunk by chunk, so renaming can start before all EXIF is read.
 
-    # parallelly get exif data
-    with exiftool.ExifTool() as et:
-        metadata = et.get_metadata_batch(glob_input_files)
+    If `tags` is given, read only those tags instead of all metadata, as compact records.
+    The metadata of files that can't be read is None, and their errors are stored in `errors`.
+    An exiftool that doesn't answer within `timeout` seconds is restarted, failing only the file that hung it.
+    """
+    if not paths:
+        return
+
+    # parallelly get exif data, no more processes than chunks
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, -(-len(paths) // exiftool.default_chunk_size))
+    with exiftool.ExifToolPool(workers, timeout=timeout, cache=cache, fast=fast) as et:
+        if tags is None:
+            yield from et.iter_metadata(paths, errors=errors)
+        else:
+            yield from et.iter_tags(tags, paths, errors=errors, records=True)
+
+
+def iter_exif_directories(
+    directories: list[str],
+    workers: int | None = None,
+    cache: MetadataCache | None = None,
+    tags: list[str] | None = None,
+    fast: int = 0,
+    errors: dict[str, str] | None = None,
+    timeout: float | None = None,
+    extensions: list[str] | None = None,
+    exclude_extensions: list[str] | None = None,
+    recursive: bool = False,
+):
+    """
+    Yield (path, EXIF metadata) pairs of the files in directories, in the order they are listed.
 
-    result: dict[str, dict[str, Any]] = {}
-    for glob_input_file, metadatum in zip(glob_input_files, metadata, strict=True):
-        result[glob_input_file] = metadatum
+    Like `iter_exif_batch`, but the files are those exiftool would read in the directories
+    (see `ExifToolPool.iter_directory`), split across the processes whatever the number of directories.
+    """
+    if not directories:
+        return
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if tags is not None:
+        tags = [*tags, "ExifTool:Error"]
+        record_type = exiftool.make_record_type(tags)
+    with exiftool.ExifToolPool(workers, timeout=timeout, cache=cache, fast=fast) as et:
+        for path, metadata in et.iter_directory(
+            directories,
+            tags,
+            extensions=extensions,
+            exclude_extensions=exclude_extensions,
+            recursive=recursive,
+        ):
+            if "ExifTool:Error" in metadata:
+                if errors is not None:
+                    errors[path] = metadata["ExifTool:Error"]
+                yield path, None
+            elif tags is None:
+                yield path, metadata
+            else:
+                yield path, record_type.from_dict(metadata)
+
+
+def split_native_jpegs(
+    paths: list[str], exif_date_keys: list[str]
+) -> tuple[list[tuple[str, dict]], list[str]]:
+    """
+    Read the date of JPEGs from their headers, without exiftool.
+
+    Returns:
+        (path, tags) pairs of the JPEGs whose header has the first of `exif_date_keys`
+        that exiftool would find, and the other paths, which need exiftool.
+    """
+    native = []
+    rest = []
+    for path in paths:
+        tags = None
+        if path.lower().endswith((".jpg", ".jpeg")):
+            tags = read_jpeg_tags(path)
+        if tags is not None and _has_native_date(tags, exif_date_keys):
+            native.append((path, tags))
+        else:
+            rest.append(path)
+    return native, rest
 
-    return result
+
+def _has_native_date(tags: dict, exif_date_keys: list[str]) -> bool:
+    for key in exif_date_keys:
+        if key in tags:
+            return True
+        if key not in TAG_NAMES:  # only exiftool can tell if the file has it
+            return False
+    return False
 
 
 class DateSourceOption(str, Enum):
@@ -83,46 +220,446 @@ class DateSourceOption(str, Enum):
     file_modified = "file_modified"
 
 
+class SidecarOption(str, Enum):
+    json = "json"
+    sqlite = "sqlite"
+
+
+class PlannedRename(NamedTuple):
+    source: Path
+    target: Path
+    raw_source: Path | None = None
+    raw_target: Path | None = None
+
+
+def parse_exif_date(value: str) -> datetime | None:
+    """
+    Parse a date as exiftool prints it (e.g. "2024:01:01 09:00:00.12+09:00") by position.
+
+    Sub-seconds and the time zone (+09:00, +0900, +09 or Z) are optional, and the "-" and "T"
+    separators of XMP dates are accepted, as is text after a space (e.g. " DST").
+    Much faster than a regex and strptime.
+
+    Returns:
+        None if it isn't such a date (e.g. "0000:00:00 00:00:00").
+    """
+    if len(value) < 19:
+        return None
+    try:
+        end = 19
+        microsecond = 0
+        if value[19:20] == ".":
+            end = 20
+            while end < len(value) and value[end].isdigit():
+                end += 1
+            microsecond = int(value[20:end][:6].ljust(6, "0"))
+        # e.g. "+09:00 DST" of H264:DateTimeOriginal
+        zone = value[end:].split(" ", 1)[0]
+        tzinfo = None
+        if zone == "Z":
+            tzinfo = dt_timezone.utc
+        elif zone:
+            digits = zone[1:].replace(":", "")
+            if zone[0] not in "+-" or len(digits) not in (2, 4) or not digits.isdigit():
+                return None
+            offset = timedelta(hours=int(digits[:2]), minutes=int(digits[2:] or 0))
+            tzinfo = dt_timezone(-offset if zone[0] == "-" else offset)
+        return datetime(
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+            microsecond,
+            tzinfo,
+        )
+    except ValueError:
+        return None
+
+
+def exif_date_of(
+    metadata, exif_date_keys: list[str], exif_date_format: str | None
+) -> datetime | None:
+    """Return the date of the first of `exif_date_keys` that has one, or None."""
+    for key in exif_date_keys:
+        exif_date = metadata.get(key)
+        if not isinstance(exif_date, str):
+            continue
+        if exif_date_format is None:
+            photo_date = parse_exif_date(exif_date)
+        else:
+            # Python3.6 can't parse %z with colon (e.g. +09:00) so delete the colon (e.g. +0900)
+            exif_date = re.sub("([+-])([0-9]{2}):([0-9]{2})", r"\1\2\3", exif_date)
+            try:
+                photo_date = datetime.strptime(exif_date, exif_date_format)
+            except ValueError:
+                photo_date = None
+        if photo_date is not None:
+            return photo_date
+    return None
+
+
+def photo_date_of(
+    path: Path,
+    metadata,
+    date_source: DateSourceOption,
+    exif_date_keys: list[str],
+    exif_date_format: str | None,
+    timezone: str | None,
+    creation_date_fallbacks: list | None = None,
+) -> datetime | None:
+    if date_source == DateSourceOption.EXIF:
+        photo_date = exif_date_of(metadata, exif_date_keys, exif_date_format)
+        if photo_date is None:
+            return None
+    elif date_source == DateSourceOption.file_created:
+        photo_date = datetime.fromtimestamp(
+            creation_date(path, creation_date_fallbacks)
+        )
+    else:  # date == 'file_modified':
+        photo_date = datetime.fromtimestamp(modified_date(path))
+
+    # Change timezone
+    if timezone:
+        new_timezone = datetime.strptime(timezone, "%z").tzinfo
+        photo_date = photo_date.astimezone(tz=new_timezone)
+    return photo_date
+
+
+def plan_renames(
+    path_and_exif: Iterable[tuple[str, Any]],
+    *,
+    prefix: str,
+    date_source: DateSourceOption,
+    exif_date_keys: list[str],
+    exif_date_format: str | None,
+    timezone: str | None,
+    rename_raw: bool,
+    raw_ext: str,
+    exif_errors: dict[str, str],
+    progress: tqdm.tqdm,
+    creation_date_fallbacks: list | None = None,
+) -> list[PlannedRename]:
+    """
+    Work out every rename, including RAW siblings, before renaming anything.
+
+    Each directory is listed once, and new names are checked against those listings and the names
+    already planned, in memory, instead of checking the file system for every candidate name.
+    Existing names are never reused, even if their files are renamed by the same plan.
+    Files already named after their date are left as they are.
+    """
+    raw_suffix = "." + raw_ext.lower()
+    deferred_raws = []
+
+    def raws_last():
+        # RAW files are planned after the rest, so those with a JPG are already planned with it
+        # and only those without one are renamed on their own.
+        for path, metadata in path_and_exif:
+            if rename_raw and os.path.splitext(path)[1].lower() == raw_suffix:
+                deferred_raws.append((path, metadata))
+            else:
+                yield path, metadata
+        yield from deferred_raws
+
+    directory_names = DirectoryNames()
+    planned_sources = set()
+    plan = []
+    for path, metadata in raws_last():
+        progress.update(1)
+        if date_source == DateSourceOption.EXIF and metadata is None:
+            tqdm.tqdm.write(f"Skipping {path}: {exif_errors[path]}")
+            continue
+
+        path = Path(path)
+        if path in planned_sources:  # given twice, or already renamed as a RAW sibling
+            continue
+        root = path.parent
+        fname = path.stem
+        fext = path.suffix
+
+        photo_date = photo_date_of(
+            path,
+            metadata,
+            date_source,
+            exif_date_keys,
+            exif_date_format,
+            timezone,
+            creation_date_fallbacks,
+        )
+        if photo_date is None:
+            tqdm.tqdm.write(f"Skipping {path}: no date in {', '.join(exif_date_keys)}")
+            continue
+        new_fname = photo_date.strftime("%Y%m%d_%H%M%S.%f")[:-4] + photo_date.strftime(
+            "%z"
+        )
+
+        # Already renamed, e.g. by a killed run that is run again.
+        new_stem = prefix + new_fname
+        if (
+            fname == new_stem
+            or (
+                fname.startswith(new_stem + "_")
+                and len(fname) - len(new_stem) > 2  # a counter has 2+ digits, e.g. _02
+                and fname[len(new_stem) + 1 :].isdigit()
+            )
+        ):
+            continue
+
+        raw_path = None
+        if rename_raw and fext.lower() == ".jpg":
+            raw_name = directory_names.find(root, fname + "." + raw_ext)
+            if raw_name is not None and root / raw_name not in planned_sources:
+                raw_path = root / raw_name
+
+        # The JPG and its RAW file get the same counter, if any.
+        suffixes = [fext] if raw_path is None else [fext, raw_path.suffix]
+        # NOTE: filename contains dot, so we can't use with_suffix
+        new_stem = directory_names.reserve(root, new_stem, suffixes)
+        planned_sources.add(path)
+        if raw_path is None:
+            plan.append(PlannedRename(path, root / (new_stem + fext)))
+        else:
+            planned_sources.add(raw_path)
+            plan.append(
+                PlannedRename(
+                    path,
+                    root / (new_stem + fext),
+                    raw_path,
+                    root / (new_stem + raw_path.suffix),
+                )
+            )
+    return plan
+
+
+def apply_renames(
+    plan: list[PlannedRename],
+    *,
+    journal: RenameJournal,
+    undofile: TextIO,
+    undo_command: str,
+):
+    """
+    Rename the files as planned, recording them in the journal.
+
+    Every rename is recorded in the journal before the first one is done, so if this is killed,
+    the next run can finish the rest.
+    """
+    journal.begin(
+        (os.path.abspath(source), os.path.abspath(target))
+        for planned in plan
+        for source, target in (
+            (planned.source, planned.target),
+            (planned.raw_source, planned.raw_target),
+        )
+        if source is not None
+    )
+    for planned in tqdm.tqdm(plan, desc="Renaming"):
+        tqdm.tqdm.write(f"{planned.source} -> {planned.target}")
+        planned.source.rename(planned.target)
+        journal.done(os.path.abspath(planned.source), os.path.abspath(planned.target))
+        undofile.write(f'{undo_command} "{planned.target}" "{planned.source}"\n')
+        if planned.raw_source is not None:
+            tqdm.tqdm.write(f"{planned.raw_source} -> {planned.raw_target}")
+            planned.raw_source.rename(planned.raw_target)
+            journal.done(
+                os.path.abspath(planned.raw_source),
+                os.path.abspath(planned.raw_target),
+            )
+            undofile.write(
+                f'{undo_command} "{planned.raw_target}" "{planned.raw_source}"\n'
+            )
+    journal.end()
+
+
+def save_exif_of(
+    paths: list[Path],
+    *,
+    workers: int | None,
+    cache: MetadataCache | None,
+    timeout: float | None,
+    sidecars: ExifSidecars | None = None,
+):
+    """
+    Save the EXIF of renamed files alongside them, read chunk by chunk as it is saved.
+
+    The EXIF is saved in the directories' sidecar stores if `sidecars` is given, or else as <file>.json.
+    Only a chunk of metadata is in memory at a time, however many files there are.
+    """
+    metadata_of = iter_exif_batch(
+        [str(path) for path in paths], workers, cache, timeout=timeout
+    )
+    for path, metadata in tqdm.tqdm(metadata_of, desc="Saving EXIF", total=len(paths)):
+        if metadata is None:  # exiftool can't read it (only renamed with file dates)
+            continue
+        if sidecars is not None:
+            sidecars.put(path, metadata)
+        else:
+            with open(path + ".json", "w") as f:
+                f.write(pprint.pformat(metadata, indent=4))
+
+
+def resume_run(journal: RenameJournal, run: JournalRun):
+    """Do the renames of an interrupted run that weren't done yet."""
+    tqdm.tqdm.write(f"Resuming interrupted run {run.run} from {journal.path}")
+    for source, target in tqdm.tqdm(run.renames, desc="Resuming"):
+        if (source, target) in run.done:
+            continue
+        if os.path.lexists(source) and not os.path.lexists(target):
+            tqdm.tqdm.write(f"{source} -> {target}")
+            os.rename(source, target)
+        elif not (os.path.lexists(target) and not os.path.lexists(source)):
+            tqdm.tqdm.write(
+                f"Skipping {source}: both or neither of it and {target} exist"
+            )
+            continue
+        # else it was renamed, but the record was not synced before the run was killed.
+        journal.done(source, target, run=run.run)
+    journal.end(run=run.run)
+
+
+def undo_run(journal: RenameJournal, run: JournalRun):
+    """Rename the files of a run back, in reverse order."""
+    tqdm.tqdm.write(f"Undoing run {run.run} from {journal.path}")
+    for source, target in tqdm.tqdm(run.renames[::-1], desc="Undoing"):
+        if (source, target) in run.undone:
+            continue
+        if os.path.lexists(target) and not os.path.lexists(source):
+            tqdm.tqdm.write(f"{target} -> {source}")
+            os.rename(target, source)
+            journal.undone(source, target, run=run.run)
+        elif (source, target) in run.done:
+            tqdm.tqdm.write(f"Skipping {target}: it is missing or {source} exists")
+    journal.undo_end(run=run.run)
+
+
+def print_rename(source: str | PathLike, target: str | PathLike):
+    # As is: file names are not rich markup.
+    console.print(
+        f"{source} -> {target}", markup=False, highlight=False, soft_wrap=True
+    )
+
+
+def print_undo_plan(run: JournalRun):
+    """Print the renames `undo_run()` would do, without renaming or writing to the journal."""
+    for source, target in run.renames[::-1]:
+        if (source, target) in run.undone:
+            continue
+        if os.path.lexists(target) and not os.path.lexists(source):
+            print_rename(target, source)
+
+
 def datename(
-    input_files: list[str],
+    input_files: list[str] | None = None,
+    /,
     *,
     prefix: Annotated[str, Parameter(name=["--prefix", "-p"])] = "",
     date_source: DateSourceOption = DateSourceOption.EXIF,
-    exif_date_key: str = "Composite:SubSecCreateDate",
-    exif_date_format: str = "%Y:%m:%d %H:%M:%S.%f%z",
+    # Repeat the option per key, so the input files after it aren't taken as keys.
+    exif_date_key: Annotated[
+        list[str] | None, Parameter(consume_multiple=False)
+    ] = None,
+    exif_date_format: str | None = None,
     undo: bool = True,
+    undo_last: bool = False,
     save_exif: bool = True,
+    exif_sidecar: SidecarOption = SidecarOption.json,
     rename_raw: bool = True,
     raw_ext: str = "CR3",
     timezone: Annotated[str | None, Parameter(name=["--timezone", "-tz"])] = None,
+    workers: Annotated[int | None, Parameter(name=["--workers", "-j"])] = None,
+    no_cache: bool = False,
+    refresh_cache: bool = False,
+    fast: int = 1,
+    exiftool_timeout: float | None = 600,
+    recursive: Annotated[bool, Parameter(name=["--recursive", "-r"])] = False,
+    ext: Annotated[list[str] | None, Parameter(consume_multiple=False)] = None,
+    native_jpeg: bool = True,
+    dry_run: bool = False,
 ):
     """
     Change file names based on their file/EXIF creation/modified date.
 
-    If you want to undo it, execute .datename_undo.sh or .datename_undo.bat
+    The files of directories are split across the exiftool processes, and read through the metadata cache.
+
+    Every run is recorded in .datename_journal.jsonl in the current directory.
+    If a run is killed, the next run in the same directory finishes it first, so just run it again.
+    To undo the last run, run `camera-tools datename --undo-last` in the same directory.
 
     Author: Kiyoon Kim
 
     Args:
         prefix: Prefix of the output names.
         date_source: Source of the date info.
-        exif_date_key: Which EXIF data to use for the date.
-            M50: Composite:SubSecCreateDate,
+        exif_date_key: Which EXIF data to use for the date. Defaults to Composite:SubSecCreateDate.
+            Give it more than once (--exif-date-key A --exif-date-key B) for a fallback chain:
+            the first key with a date is used for each file, so a card with files of several cameras
+            is renamed in one run, with one read of all the keys.
+            M50/R6: Composite:SubSecCreateDate,
             Sony Cam: H264:DateTimeOriginal,
             Sony a6000: MakerNotes:SonyDateTime,
             Sony a6000 videos: XML:CreationDateValue
-        exif_date_format: EXIF date format for reading the time.
-            M50: %Y:%m:%d %H:%M:%S.%f%z,
-            Sony a6000/Handycam: %Y:%m:%d %H:%M:%S%z
+        exif_date_format: EXIF date format for reading the time (e.g. %Y:%m:%d %H:%M:%S.%f%z).
+            By default, dates as exiftool prints them are read, with or without sub-seconds and time zone.
         undo: Generate an undo script (.datename_undo.sh or .datename_undo.bat)
+        undo_last: Undo the last run recorded in the journal, instead of renaming.
+            With --dry-run, only print how the files would be renamed back.
         save_exif: Save exif info as json files. Useful backup in case some editing software messes up the exif info.
+        exif_sidecar: Where to save the exif info.
+            json: a <file>.json per file.
+            sqlite: one compressed .camera_tools_exif.sqlite per directory, keyed on the new file names.
         rename_raw: Rename RAW files along with the JPG files.
         raw_ext: Extension of the RAW files.
         timezone: Change timezone (e.g. +0900 means Korea).
             Use when you forgot to reset the timezone when you were abroad.
             Leave it empty if you do not want to change the timezone.
+        workers: Number of exiftool processes reading EXIF in parallel.
+            Defaults to the number of CPUs.
+        no_cache: Do not use the EXIF metadata cache (~/.cache/camera-tools).
+        refresh_cache: Read EXIF of every file again and overwrite the cache.
+        fast: exiftool -fast level for reading the dates. 1 skips scanning JPEGs for trailers,
+            2 also skips MakerNotes (do not use with MakerNotes date keys).
+            The EXIF saved with --save-exif is always read in full.
+        exiftool_timeout: Seconds to wait for exiftool to read a batch of files.
+            If it hangs on a bad file, it is restarted and only that file is skipped.
+        recursive: Rename files in subdirectories of the given directories too.
+        ext: Extensions of the files to rename in the given directories (e.g. --ext JPG --ext MP4).
+            Defaults to every file type exiftool reads, except the .json EXIF backups.
+            RAW files with a JPG file are renamed along with it.
+        native_jpeg: Read the date of JPGs from their headers instead of with exiftool, which is much faster.
+            Only for EXIF/Composite:SubSec* date keys; exiftool reads the rest.
+        dry_run: Only print the renames, without renaming anything.
     """
-    if undo:
+    exif_date_keys = exif_date_key or ["Composite:SubSecCreateDate"]
+
+    # Read once, and only opened (created) to write to it.
+    journal = RenameJournal(JOURNAL_FILENAME)
+    if undo_last:
+        runs = [run for run in journal.runs if run.undoable]
+        if not runs:
+            console.print(f"Nothing to undo in {JOURNAL_FILENAME}", markup=False)
+        elif dry_run:
+            print_undo_plan(runs[-1])
+        else:
+            with journal:
+                undo_run(journal, runs[-1])
+        return
+
+    interrupted = [run for run in journal.runs if run.interrupted]
+    if interrupted and dry_run:
+        tqdm.tqdm.write(
+            f"{len(interrupted)} interrupted run(s) in {JOURNAL_FILENAME} will be resumed first"
+        )
+    elif interrupted:
+        with journal:
+            for run in interrupted:
+                resume_run(journal, run)
+    if not input_files:
+        if interrupted:
+            return
+        raise ValueError("No input files given")
+
+    if undo and not dry_run:
         if platform.system() == "Windows":
             undo_filename = ".datename_undo.bat"
             undo_command = "move"
@@ -133,85 +670,115 @@ def datename(
         undo_filename = os.devnull
         undo_command = ""
 
-    with open(undo_filename, "a") as undofile:
-        num_jpg_files = 0
-        for origpath in input_files:
-            for _ in glob.glob(origpath):  # glob: Windows wildcard support
-                num_jpg_files += 1
-
-        progress = tqdm.tqdm(desc="Renaming", total=num_jpg_files)
+    cache_context = nullcontext() if no_cache else MetadataCache(refresh=refresh_cache)
+    with open(undo_filename, "a") as undofile, cache_context as cache:
+        paths = glob_input_files(input_files)
+        if not paths:
+            raise ValueError(f"No files match {' '.join(input_files)}")
+        directories = [path for path in paths if os.path.isdir(path)]
+        if directories:
+            paths = [path for path in paths if not os.path.isdir(path)]
+        progress = tqdm.tqdm(desc="Planning", total=None if directories else len(paths))
+        exif_errors = {}
+        creation_date_fallbacks = []
+
+        exclude_ext = ["json"]
+        if ext:
+            exclude_ext = []
 
         if date_source == DateSourceOption.EXIF:
-            tqdm.tqdm.write("Getting all EXIF data...")
-            input_file_to_exif = get_exif_batch(input_files)
-
-        for origpath in input_files:
-            for path in glob.glob(origpath):  # glob: Windows wildcard support
-                path = Path(path)
-                root = path.parent
-                fname = path.stem
-                fext = path.suffix
-
-                metadata = None
-                if date_source == DateSourceOption.EXIF:
-                    # with exiftool.ExifTool() as et:
-                    #     metadata = et.get_metadata(str(path))
-                    metadata = input_file_to_exif[str(path)]
-
-                    exif_date = metadata[exif_date_key]
-                    # Python3.6 can't parse %z with colon (e.g. +09:00) so delete the colon (e.g. +0900)
-                    exif_date = re.sub(
-                        "([+-])([0-9]{2}):([0-9]{2})", r"\1\2\3", exif_date
-                    )
-
-                    photo_date = datetime.strptime(exif_date, exif_date_format)
-                    # new_fname = metadata[args.exif_date]
-                    # new_fname = new_fname.replace(':', '')
-                    # new_fname = new_fname.replace(' ', '_')
-                elif date_source == DateSourceOption.file_created:
-                    photo_date = datetime.fromtimestamp(creation_date(path))
-                else:  # date == 'file_modified':
-                    photo_date = datetime.fromtimestamp(modified_date(path))
-
-                # Change timezone
-                if timezone:
-                    new_timezone = datetime.strptime(timezone, "%z").tzinfo
-                    photo_date = photo_date.astimezone(tz=new_timezone)
-
-                new_fname = photo_date.strftime("%Y%m%d_%H%M%S.%f")[
-                    :-4
-                ] + photo_date.strftime("%z")
-
-                new_path_wo_ext = root / (prefix + new_fname)
-
-                # NOTE: filename contains dot, so we can't use with_suffix
-                new_path = Path(str(new_path_wo_ext) + fext)
-
-                new_path = path_no_overwrite_counter(new_path)
-
-                tqdm.tqdm.write(f"{path} -> {new_path}")
-                path.rename(new_path)
-
-                raw_renamed = False
-                if rename_raw and fext.lower() in ["jpg", ".jpg"]:
-                    raw_path = Path(root) / (fname + "." + raw_ext)
-                    if raw_path.exists():
-                        # NOTE: filename contains dot, so we can't use with_suffix
-                        raw_new_path = Path(str(new_path_wo_ext) + "." + raw_ext)
-                        raw_new_path = path_no_overwrite_counter(raw_new_path)
-                        tqdm.tqdm.write(f"{raw_path} -> {raw_new_path}")
-                        raw_path.rename(raw_new_path)
-                        raw_renamed = True
-
-                undofile.write(f'{undo_command} "{new_path}" "{path}"\n')
-                if raw_renamed:
-                    undofile.write(f'{undo_command} "{raw_new_path}" "{raw_path}"\n')
-
-                if save_exif and date_source != DateSourceOption.EXIF:
-                    with exiftool.ExifTool() as et:
-                        metadata = et.get_metadata(new_path)
-
-                with open(str(new_path) + ".json", "w") as f:
-                    f.write(pprint.pformat(metadata, indent=4))
-
-                progress.update(1)
+            tqdm.tqdm.write("Reading EXIF data...")
+            # Only the dates, as compact records: the EXIF to save is read in its own pass.
+            native = []
+            if native_jpeg:
+                native, paths = split_native_jpegs(paths, exif_date_keys)
+            path_and_exif = itertools.chain(
+                native,
+                iter_exif_batch(
+                    paths,
+                    workers,
+                    cache,
+                    tags=exif_date_keys,
+                    fast=fast,
+                    errors=exif_errors,
+                    timeout=exiftool_timeout,
+                ),
+                iter_exif_directories(
+                    directories,
+                    workers,
+                    cache,
+                    tags=exif_date_keys,
+                    fast=fast,
+                    errors=exif_errors,
+                    timeout=exiftool_timeout,
+                    extensions=ext,
+                    exclude_extensions=exclude_ext,
+                    recursive=recursive,
+                ),
+            )
+        else:
+            # Only the file names are needed from the directories.
+            directory_files = iter_exif_directories(
+                directories,
+                workers,
+                tags=["File:FileName"],
+                fast=2,
+                timeout=exiftool_timeout,
+                extensions=ext,
+                exclude_extensions=exclude_ext,
+                recursive=recursive,
+            )
+            path_and_exif = itertools.chain(
+                ((path, None) for path in paths),
+                ((path, None) for path, _ in directory_files),
+            )
+
+        plan = plan_renames(
+            path_and_exif,
+            prefix=prefix,
+            date_source=date_source,
+            exif_date_keys=exif_date_keys,
+            exif_date_format=exif_date_format,
+            timezone=timezone,
+            rename_raw=rename_raw,
+            raw_ext=raw_ext,
+            exif_errors=exif_errors,
+            progress=progress,
+            creation_date_fallbacks=creation_date_fallbacks,
+        )
+        progress.close()
+        if creation_date_fallbacks:
+            tqdm.tqdm.write(
+                f"Warning: creation date is not recorded for {len(creation_date_fallbacks)} file(s) "
+                f"(e.g. {creation_date_fallbacks[0]}), probably by the file system. Used modified date"
+            )
+
+        if dry_run:
+            for planned in plan:
+                print_rename(planned.source, planned.target)
+                if planned.raw_source is not None:
+                    print_rename(planned.raw_source, planned.raw_target)
+            return
+
+        if not plan:
+            return
+        sidecars_context = (
+            ExifSidecars()
+            if save_exif and exif_sidecar == SidecarOption.sqlite
+            else nullcontext()
+        )
+        with journal, sidecars_context as sidecars:
+            apply_renames(
+                plan,
+                journal=journal,
+                undofile=undofile,
+                undo_command=undo_command,
+            )
+            if save_exif:
+                save_exif_of(
+                    [planned.target for planned in plan],
+                    workers=workers,
+                    cache=cache,
+                    timeout=exiftool_timeout,
+                    sidecars=sidecars,
+                )
@@ -0,0 +1,36 @@
+import logging
+from typing import Annotated
+
+import coloredlogs
+from cyclopts import Parameter
+
+from camera_tools.exiftool_server import DEFAULT_IDLE_TIMEOUT, serve
+
+
+def exiftool_server(
+    *,
+    socket_path: Annotated[str | None, Parameter(name=["--socket", "-s"])] = None,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+):
+    """
+    Keep exiftool running in the background, shared by every camera-tools command.
+
+    Starting exiftool (perl) takes a while, which dominates commands run on a few files at a time,
+    e.g. in a shell loop. While this server is running, they send their queries to its warm exiftool
+    processes instead, over a Unix domain socket.
+    Set `CAMERA_TOOLS_EXIFTOOL_SERVER=auto` to start it automatically when needed,
+    or `CAMERA_TOOLS_EXIFTOOL_SERVER=never` to never use it. Not available on Windows.
+
+    Author: Kiyoon Kim
+
+    Args:
+        socket_path: Path of the Unix domain socket.
+            Defaults to $XDG_RUNTIME_DIR/camera-tools-exiftool.sock, or one in a private per-user directory
+            in the temp directory. Its directory must not be writable by others.
+        idle_timeout: Exit after this many seconds without requests.
+    """
+    logger = logging.getLogger("camera_tools.exiftool_server")
+    coloredlogs.install(
+        fmt="%(asctime)s - %(levelname)s - %(message)s", level="INFO", logger=logger
+    )
+    serve(socket_path, idle_timeout)
@@ -1,11 +1,14 @@
 from cyclopts import App, Parameter
 
 from .. import __version__
+from .bench import bench_app
 from .bulk_image_resize import bulk_image_resize
 from .datename import datename
+from .exiftool_server import exiftool_server
 from .fast_image_resize import fast_image_resize
 from .jpgs_to_gif import jpgs_to_gif
 from .organise_images_like_dir import organise_images_like_dir
+from .read_exif import read_exif
 
 app = App(
     help_format="markdown",
@@ -22,6 +25,9 @@ app.command()(bulk_image_resize)
 app.command()(fast_image_resize)
 app.command()(jpgs_to_gif)
 app.command()(organise_images_like_dir)
+app.command()(exiftool_server)
+app.command()(read_exif)
+app.command(bench_app)
 
 
 def main():
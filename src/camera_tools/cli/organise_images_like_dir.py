@@ -6,6 +6,8 @@ from shutil import copy2, move
 import coloredlogs
 import verboselogs
 
+from camera_tools.exif_sidecar import ExifSidecars
+
 
 def organise_images_like_dir(
     source_dir: str,
@@ -29,7 +31,8 @@ def organise_images_like_dir(
         source_dir: Directory to copy.
         destination_dir: Destination directory.
         dir_like: Organised directory.
-        copy_json: Copy the json files along with the images.
+        copy_json: Copy the saved EXIF along with the images: from the directory's EXIF sidecar store
+            (.camera_tools_exif.sqlite) into the destination's, or else the json files.
         copy_cr3: Copy the CR3 files along with the images.
         copy_arw: Copy the ARW files along with the images.
         delete_originals: Move files instead of copying.
@@ -87,6 +90,7 @@ def organise_images_like_dir(
             copy_func = os.link
             copy_msg = "Hard linking"
 
+    sidecars = ExifSidecars()
     for root, dirs, files in os.walk(dir_like):
         dest_root = root.replace(dir_like, destination_dir, 1)
         dest_root = Path(dest_root)
@@ -117,9 +121,20 @@ def organise_images_like_dir(
                 if copy_json:
                     source_file = Path(f"{filename_to_source_path[name]}.json")
                     dest_file = dest_root / f"{name}.json"
-                    logger.info("%s file to: %s", copy_msg, dest_file)
 
-                    if source_file.is_file():
+                    if sidecars.copy(
+                        filename_to_source_path[name],
+                        dest_root / name,
+                        move=delete_originals,
+                    ):
+                        logger.info(
+                            "%s EXIF of %s to the sidecar store in: %s",
+                            "Moving" if delete_originals else "Copying",
+                            name,
+                            dest_root,
+                        )
+                    elif source_file.is_file():
+                        logger.info("%s file to: %s", copy_msg, dest_file)
                         copy_func(source_file, dest_file)
                     else:
                         logger.warning("File doesn't exist: %s", source_file)
@@ -145,6 +160,8 @@ def organise_images_like_dir(
                         logger.warning("File doesn't exist: %s", source_file)
                         nb_warning += 1
 
+    sidecars.close()
+
     if nb_warning > 0:
         logger.warning("%d warning(s) found.", nb_warning)
 
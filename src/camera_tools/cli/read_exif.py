@@ -0,0 +1,169 @@
+import csv
+import json
+import logging
+import os
+import sys
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, nullcontext
+from enum import Enum
+from pathlib import Path
+from typing import Annotated, BinaryIO
+
+from cyclopts import Parameter
+
+from camera_tools import exiftool
+from camera_tools.metadata_cache import MetadataCache
+
+from .datename import glob_input_files
+
+# Only the records go to stdout, so they can be piped: errors are logged to stderr.
+logger = logging.getLogger(__name__)
+
+
+class OutputFormat(str, Enum):
+    jsonl = "jsonl"
+    csv = "csv"
+
+
+def dumps_jsonl(metadata: dict) -> bytes:
+    """Serialise a record as one line of JSON, with orjson if installed."""
+    if exiftool.orjson is not None:
+        try:
+            return exiftool.orjson.dumps(
+                metadata, option=exiftool.orjson.OPT_APPEND_NEWLINE
+            )
+        except TypeError:  # file names with invalid UTF-8, kept as surrogates
+            pass
+    line = json.dumps(metadata, ensure_ascii=False)
+    try:
+        return line.encode("utf-8") + b"\n"
+    except UnicodeEncodeError:
+        return json.dumps(metadata).encode("ascii") + b"\n"
+
+
+@contextmanager
+def open_output(output: Path | None) -> Iterator[BinaryIO]:
+    """Open `output` to write to, or stdout if None."""
+    if output is None:
+        yield sys.stdout.buffer
+    else:
+        with output.open("wb") as f:
+            yield f
+
+
+@contextmanager
+def record_writer(
+    out: BinaryIO, output_format: OutputFormat, tags: list[str] | None
+) -> Iterator[Callable[[dict], None]]:
+    """Yield a function that writes a record to `out` and flushes it, so it is read at once."""
+    if output_format != OutputFormat.csv:
+
+        def write(metadata):
+            out.write(dumps_jsonl(metadata))
+            out.flush()
+
+        yield write
+        return
+
+    # csv wants text; invalid UTF-8 in file names is written back as the original bytes
+    with open(
+        out.fileno(),
+        "w",
+        encoding="utf-8",
+        errors="surrogateescape",
+        newline="",
+        closefd=False,
+    ) as text_out:
+        writer = csv.writer(text_out)
+        writer.writerow(["SourceFile", *tags])
+        text_out.flush()
+
+        def write(metadata):
+            writer.writerow(
+                [metadata.get("SourceFile"), *(metadata.get(tag) for tag in tags)]
+            )
+            text_out.flush()
+
+        yield write
+
+
+def read_exif(
+    input_files: list[str],
+    *,
+    tags: Annotated[list[str] | None, Parameter(name=["--tags", "-t"])] = None,
+    output_format: Annotated[
+        OutputFormat, Parameter(name=["--format", "-f"])
+    ] = OutputFormat.jsonl,
+    output: Annotated[Path | None, Parameter(name=["--output", "-o"])] = None,
+    workers: Annotated[int | None, Parameter(name=["--workers", "-j"])] = None,
+    recursive: Annotated[bool, Parameter(name=["--recursive", "-r"])] = False,
+    fast: int = 0,
+    no_cache: bool = False,
+    refresh_cache: bool = False,
+):
+    """
+    Print the EXIF metadata of files, one record per line, e.g. to pipe into jq or a database.
+
+    Files are read by a pool of exiftool processes, and every record is written as soon as
+    it is read. In directories, the files exiftool supports are read. Files that can't be read are
+    reported on stderr.
+
+    Author: Kiyoon Kim
+
+    Args:
+        input_files: Files, wildcards or directories to read.
+        tags: Read only these tags (e.g. EXIF:Model Composite:SubSecCreateDate). Required for CSV.
+        output_format: JSON Lines (one object per file) or CSV (one column per tag).
+        output: Write to this file instead of stdout.
+        workers: Number of exiftool processes. Defaults to the number of CPUs.
+        recursive: Read files in subdirectories of the given directories too.
+        fast: exiftool -fast level.
+        no_cache: Do not use the EXIF metadata cache (~/.cache/camera-tools).
+        refresh_cache: Read EXIF of every file again and overwrite the cache.
+    """
+    if output_format == OutputFormat.csv and not tags:
+        raise ValueError("CSV output needs the columns: give --tags.")
+
+    paths = glob_input_files(input_files)
+    directories = [path for path in paths if Path(path).is_dir()]
+    if directories:
+        paths = [path for path in paths if not Path(path).is_dir()]
+    # no more processes than chunks, unless the directories have more files
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if not directories:
+        workers = max(1, min(workers, -(-len(paths) // exiftool.default_chunk_size)))
+
+    if output_format == OutputFormat.csv:
+        record_type = exiftool.make_record_type(tags)
+
+    errors = {}
+    cache_context = nullcontext() if no_cache else MetadataCache(refresh=refresh_cache)
+    with (
+        open_output(output) as out,
+        record_writer(out, output_format, tags) as write,
+        cache_context as cache,
+        exiftool.ExifToolPool(workers, cache=cache, fast=fast) as et,
+    ):
+        if tags is None:
+            records = et.iter_metadata(paths, errors=errors)
+        else:
+            records = et.iter_tags(
+                tags, paths, errors=errors, records=output_format == OutputFormat.csv
+            )
+        for path, metadata in records:
+            if metadata is None:
+                logger.warning("%s: %s", path, errors[path])
+            else:
+                write(metadata)
+
+        if directories:
+            for path, metadata in et.iter_directory(
+                directories, tags, recursive=recursive
+            ):
+                if "ExifTool:Error" in metadata:
+                    logger.warning("%s: %s", path, metadata["ExifTool:Error"])
+                elif output_format == OutputFormat.csv:
+                    write(record_type.from_dict(metadata))
+                else:
+                    write(metadata)
@@ -0,0 +1,210 @@
+"""
+EXIF backups of a directory's files in a single SQLite file, instead of a `<file>.json` per file.
+
+Each directory gets one `.camera_tools_exif.sqlite` with the exiftool metadata of its files,
+keyed on the file name and stored as zlib-compressed JSON. Writes are batched into
+transactions, so saving the EXIF of thousands of files costs a handful of commits
+and adds one file to the directory rather than thousands.
+
+Example:
+    with ExifSidecars() as sidecars:
+        sidecars.put("DCIM/20240101_090000.12.JPG", metadata)
+
+    metadata = lookup_exif("DCIM/20240101_090000.12.JPG")  # None if not saved
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import zlib
+from os import PathLike
+from pathlib import Path
+from typing import Any
+
+SIDECAR_FILENAME = ".camera_tools_exif.sqlite"
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def sidecar_path(directory: str | PathLike) -> Path:
+    return Path(directory) / SIDECAR_FILENAME
+
+
+def _encode(metadata: dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+
+
+def _decode(data: bytes) -> dict[str, Any]:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class ExifSidecar:
+    """
+    The EXIF store of one directory, keyed on file name.
+
+    Args:
+        directory: Directory of the files.
+        create: Create the store if it doesn't exist. Otherwise, raise FileNotFoundError.
+        batch_size: Number of `put()`s and `delete()`s written per transaction.
+    """
+
+    def __init__(
+        self,
+        directory: str | PathLike,
+        *,
+        create: bool = True,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.path = sidecar_path(directory)
+        if not create and not self.path.is_file():
+            raise FileNotFoundError(f"No EXIF sidecar store: {self.path}")
+        self.batch_size = batch_size
+        # name -> data to write, or None to delete it.
+        self._pending: dict[str, bytes | None] = {}
+        # The default rollback journal, unlike WAL, leaves no extra files in the directory.
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS exif (
+                name TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO exif VALUES (?, ?)",
+                [
+                    (name, data)
+                    for name, data in self._pending.items()
+                    if data is not None
+                ],
+            )
+            self._conn.executemany(
+                "DELETE FROM exif WHERE name = ?",
+                [(name,) for name, data in self._pending.items() if data is None],
+            )
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _put_data(self, name: str, data: bytes | None):
+        self._pending[name] = data
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def _get_data(self, name: str) -> bytes | None:
+        if name in self._pending:
+            return self._pending[name]
+        row = self._conn.execute(
+            "SELECT data FROM exif WHERE name = ?", (name,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, name: str, metadata: dict[str, Any]):
+        self._put_data(name, _encode(metadata))
+
+    def get(self, name: str) -> dict[str, Any] | None:
+        data = self._get_data(name)
+        return None if data is None else _decode(data)
+
+    def delete(self, name: str):
+        self._put_data(name, None)
+
+    def names(self) -> list[str]:
+        self.flush()
+        return [name for (name,) in self._conn.execute("SELECT name FROM exif")]
+
+
+class ExifSidecars:
+    """
+    The EXIF stores of any number of directories, opened as files in them are used.
+
+    Stores are only created when putting, so reading leaves directories without a store as they are.
+
+    Args:
+        batch_size: Number of `put()`s and deletes written per transaction, per directory.
+    """
+
+    def __init__(self, *, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._stores: dict[str, ExifSidecar | None] = {}
+
+    def store(
+        self, directory: str | PathLike, create: bool = False
+    ) -> ExifSidecar | None:
+        """Return the store of a directory, or None if it doesn't exist and isn't to be created."""
+        key = os.path.abspath(directory)
+        store = self._stores.get(key)
+        if store is None and (create or key not in self._stores):
+            try:
+                store = ExifSidecar(key, create=create, batch_size=self.batch_size)
+            except FileNotFoundError:
+                store = None
+            self._stores[key] = store
+        return store
+
+    def close(self):
+        for store in self._stores.values():
+            if store is not None:
+                store.close()
+        self._stores.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def put(self, path: str | PathLike, metadata: dict[str, Any]):
+        """Save the EXIF of a file, in its directory's store."""
+        directory, name = os.path.split(os.fspath(path))
+        self.store(directory, create=True).put(name, metadata)
+
+    def get(self, path: str | PathLike) -> dict[str, Any] | None:
+        directory, name = os.path.split(os.fspath(path))
+        store = self.store(directory)
+        return None if store is None else store.get(name)
+
+    def copy(
+        self, source: str | PathLike, destination: str | PathLike, *, move: bool = False
+    ) -> bool:
+        """
+        Copy (or move) the saved EXIF of a file to where it is copied, as is (without decompressing).
+
+        Returns:
+            False if nothing was saved for `source`.
+        """
+        source_directory, source_name = os.path.split(os.fspath(source))
+        source_store = self.store(source_directory)
+        data = None if source_store is None else source_store._get_data(source_name)
+        if data is None:
+            return False
+        destination_directory, destination_name = os.path.split(os.fspath(destination))
+        self.store(destination_directory, create=True)._put_data(destination_name, data)
+        if move:
+            source_store.delete(source_name)
+        return True
+
+
+def lookup_exif(path: str | PathLike) -> dict[str, Any] | None:
+    """
+    Return the EXIF saved for a file in its directory's store, or None.
+
+    To look up many files, use `ExifSidecars().get()` so each store is opened only once.
+    """
+    with ExifSidecars() as sidecars:
+        return sidecars.get(path)
@@ -54,14 +54,34 @@ Example usage::
 
 from __future__ import unicode_literals
 
-import codecs
+import asyncio
+import dataclasses
+import itertools
 import json
 import os
+import queue
+import selectors
 import shutil
 import subprocess
-import sys
+import tempfile
+import threading
+import time
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, suppress
 from pathlib import Path
+from typing import ClassVar, NamedTuple
+
+# Faster JSON decoders, used when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
 
 try:  # Py3k compatibility
     basestring
@@ -90,41 +110,249 @@ If the executable is not located in one of the paths listed in the
 # The standard value should be fine.
 sentinel = b"{ready}"
 
-# The block size when reading from exiftool.  The standard value
+# The initial block size when reading from exiftool.  The read size
+# doubles every time a read fills the whole block, up to
+# ``max_block_size``, so large outputs are read in few syscalls while
+# small outputs don't pay for a large buffer.  The standard values
 # should be fine, though other values might give better performance in
 # some cases.
-block_size = 4096
+block_size = 65536
+max_block_size = 4 * 1024 * 1024
 
+# The number of files sent to exiftool in one go by the streaming
+# iterators, e.g. :py:meth:`ExifTool.iter_metadata()`.  Memory use is
+# proportional to this, not to the total number of files.
+default_chunk_size = 256
 
-# This code has been adapted from Lib/os.py in the Python source tree
-# (sha1 265e36e277f3)
-def _fscodec():
-    encoding = sys.getfilesystemencoding()
-    errors = "strict"
-    if encoding != "mbcs":
-        try:
-            codecs.lookup_error("surrogateescape")
-        except LookupError:
-            pass
-        else:
-            errors = "surrogateescape"
+# Whether :py:class:`ExifTool` sends its commands to the shared
+# ``camera-tools exiftool-server`` daemon (see
+# :py:mod:`camera_tools.exiftool_server`) instead of starting its own
+# process: ``"auto"`` starts the daemon if it isn't running,
+# ``"never"`` always starts a private process, and anything else uses
+# the daemon only if it is already running.
+server_mode = os.environ.get("CAMERA_TOOLS_EXIFTOOL_SERVER", "")
 
-    def fsencode(filename):
-        """
-        Encode filename to the filesystem encoding with 'surrogateescape' error
-        handler, return bytes unchanged. On Windows, use 'strict' error handler if
-        the file system encoding is 'mbcs' (which is the default encoding).
-        """
-        if isinstance(filename, bytes):
-            return filename
-        else:
-            return filename.encode(encoding, errors)
 
-    return fsencode
+def fsencode(filename):
+    """
+    Encode a parameter as UTF-8 for exiftool, return bytes unchanged.
 
+    exiftool is started with ``-charset filename=utf8``, so file names
+    are passed as UTF-8 on every platform, including Windows where the
+    ANSI code page can't represent e.g. Korean names.  Bytes of POSIX
+    file names that aren't valid UTF-8 (decoded by Python to lone
+    surrogates) are restored with the 'surrogateescape' error handler.
+    """
+    if isinstance(filename, bytes):
+        return filename
+    return os.fspath(filename).encode("utf-8", "surrogateescape")
+
+
+def _parse_json(output):
+    # exiftool writes nothing at all if none of the files could be read.
+    if not output:
+        return []
+    # orjson and msgspec are several times faster on large batches, but
+    # only accept valid UTF-8, unlike POSIX file names.
+    try:
+        if orjson is not None:
+            return orjson.loads(output)
+        if msgspec is not None:
+            return msgspec.json.decode(output)
+    except ValueError:
+        pass
+    return json.loads(output.decode("utf-8", "surrogateescape"))
+
+
+def _binary_size(value):
+    # exiftool shows binary values as e.g.
+    # "(Binary data 12345 bytes, use -b option to extract)".
+    if isinstance(value, str) and value.startswith("(Binary data "):
+        return int(value.split()[2])
+    return None
+
+
+class BatchResult(NamedTuple):
+    """
+    Metadata of a batch of files, and the errors of those that failed.
 
-fsencode = _fscodec()
-del _fscodec
+    ``metadata`` has one entry per file, in the same order, which is
+    ``None`` if the file failed; ``errors`` maps the file names that
+    failed to their error message.
+    """
+
+    metadata: list
+    errors: dict
+
+
+class Record:
+    """
+    Base class of the compact records made by :py:func:`make_record_type()`.
+
+    A record can be read like the metadata dictionary it replaces, by
+    tag name: ``record["Composite:SubSecCreateDate"]`` raises
+    ``KeyError`` if the tag is missing, and :py:meth:`get()` returns a
+    default instead.
+    """
+
+    __slots__ = ()
+    # Tag name, with or without its group, to attribute name; set per
+    # class by make_record_type().
+    _attributes: ClassVar[dict[str, str]] = {}
+
+    def __getitem__(self, tag):
+        if tag == "SourceFile":
+            return self.SourceFile
+        attribute = self._attributes.get(tag) or self._attributes.get(
+            tag.rpartition(":")[2]
+        )
+        if attribute is None:
+            raise KeyError(tag)
+        value = getattr(self, attribute)
+        if value is None:
+            raise KeyError(tag)
+        return value
+
+    def get(self, tag, default=None):
+        try:
+            return self[tag]
+        except KeyError:
+            return default
+
+    @classmethod
+    def from_dict(cls, d):
+        """Make a record from a metadata dictionary, ignoring other tags."""
+        values = {}
+        attributes = cls._attributes
+        for key, value in d.items():
+            # Tags requested without a group are reported with one.
+            attribute = attributes.get(key) or attributes.get(key.rpartition(":")[2])
+            if attribute is not None:
+                values[attribute] = value
+        return cls(d["SourceFile"], **values)
+
+
+def make_record_type(tags, name="ExifRecord"):
+    """
+    Make a compact record class for metadata of the given tags.
+
+    The class is a ``__slots__`` dataclass with a ``SourceFile``
+    attribute and one attribute per tag, ``None`` if the tag is
+    missing, named after the tag with every other character than
+    letters, digits and underscores replaced by ``_`` (e.g.
+    ``Composite_SubSecCreateDate``).  A record takes a fraction of the
+    memory of the dictionary returned by :py:meth:`ExifTool.execute_json()`,
+    which matters when keeping the metadata of tens of thousands of
+    files.  See :py:class:`Record`.
+    """
+    if isinstance(tags, basestring):
+        raise TypeError("The argument 'tags' must be " "an iterable of strings")
+    attributes = {}
+    for tag in tags:
+        attribute = "".join(c if c.isalnum() or c == "_" else "_" for c in tag)
+        attributes[tag] = attribute
+        attributes.setdefault(tag.rpartition(":")[2], attribute)
+    fields = [("SourceFile", str)]
+    fields += [(a, object, None) for a in dict.fromkeys(attributes.values())]
+    return dataclasses.make_dataclass(
+        name,
+        fields,
+        bases=(Record,),
+        namespace={"_attributes": attributes},
+        slots=True,
+    )
+
+
+def _align(filenames, records):
+    # exiftool skips files it can't read, so match on the reported name.
+    if len(records) == len(filenames):
+        return records
+    by_name = {d["SourceFile"]: d for d in records}
+    return [by_name.get(os.fsdecode(f).replace("\\", "/")) for f in filenames]
+
+
+def _unpack(chunk, result, errors):
+    if errors is not None:
+        errors.update(result.errors)
+    return zip(chunk, result.metadata, strict=True)
+
+
+def _merge(results):
+    merged = BatchResult([], {})
+    for metadata, errors in results:
+        merged.metadata.extend(metadata)
+        merged.errors.update(errors)
+    return merged
+
+
+def _condition_params(condition):
+    return [] if condition is None else ["-if", condition]
+
+
+def _parse_write_summary(output):
+    # e.g. b"    2 image files updated\n    1 files weren't updated due to errors"
+    summary = {}
+    for line in output.decode("utf-8", "replace").splitlines():
+        count, _, what = line.strip().partition(" ")
+        if count.isdigit():
+            summary[what] = int(count)
+    return summary
+
+
+def _command_line(executable_, fast=0, api_options=None):
+    options = ["-api", "largefilesupport=1", "-charset", "filename=utf8"]
+    for name, value in (api_options or {}).items():
+        options += ["-api", f"{name}={value}"]
+    common_args = ["-G", "-n"]
+    if fast:
+        common_args.append("-fast" if fast == 1 else f"-fast{fast}")
+    return [
+        executable_,
+        *options,
+        "-stay_open",
+        "True",
+        "-@",
+        "-",
+        "-common_args",
+        *common_args,
+    ]
+
+
+def _walk_files(roots, extensions, exclude_extensions, recursive):
+    # The files exiftool would read in the given directories: sorted, in
+    # no hidden subdirectories, following links to directories but
+    # each directory only once.
+    for root in roots:
+        if not os.path.isdir(root):
+            yield root  # a file given as is, whatever its extension
+            continue
+        visited = set()
+        for directory, subdirectories, names in os.walk(root, followlinks=True):
+            stat = os.stat(directory)
+            if (stat.st_dev, stat.st_ino) in visited:
+                subdirectories.clear()
+                continue
+            visited.add((stat.st_dev, stat.st_ino))
+            if recursive:
+                subdirectories[:] = sorted(
+                    name for name in subdirectories if not name.startswith(".")
+                )
+            else:
+                subdirectories.clear()
+            for name in sorted(names):
+                extension = os.path.splitext(name)[1][1:].upper()
+                if extension in exclude_extensions:
+                    continue
+                if extensions is None or extension in extensions:
+                    yield os.path.join(directory, name)
+
+
+def _chunked(iterable, size):
+    if size < 1:
+        raise ValueError("chunk_size must be at least 1.")
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
 
 
 class ExifTool:
@@ -152,6 +380,29 @@ class ExifTool:
         with ExifTool() as et:
             ...
 
+    ``timeout`` is the default number of seconds to wait for the
+    output of a command, see :py:meth:`execute()`.
+
+    If a ``cache`` (a
+    :py:class:`camera_tools.metadata_cache.MetadataCache`) is given,
+    :py:meth:`get_metadata_batch()` and :py:meth:`get_tags_batch()`
+    only send the files which are not in the cache, or have changed
+    since, to ``exiftool``.
+
+    ``fast`` selects exiftool's ``-fast`` (1) or ``-fast2`` (2) mode.
+    ``-fast`` doesn't scan to the end of JPEGs for trailers, which saves
+    reading whole files over slow links; ``-fast2`` additionally skips
+    MakerNotes and stops at the ``mdat`` atom of QuickTime files, so
+    use it only when the tags you need aren't there.
+    ``api_options`` is a dictionary of exiftool ``-api`` options, e.g.
+    ``{"QuickTimeUTC": 1}``.  For the best speed, request only the tags
+    you need with :py:meth:`get_tags_batch()`.
+
+    ``cwd`` is the working directory of the process, the current one by
+    default.  ``server`` overrides the module-level ``server_mode``;
+    when a shared ``exiftool-server`` daemon is used, commands behave
+    exactly as with a private process, only without the start-up time.
+
     .. warning:: Note that there is no error handling.  Nonsensical
        options will be silently ignored by exiftool, so there's not
        much that can be done in that regard.  You should avoid passing
@@ -164,12 +415,31 @@ class ExifTool:
        associated with a running subprocess.
     """
 
-    def __init__(self, executable_=None):
+    def __init__(
+        self,
+        executable_=None,
+        timeout=None,
+        cache=None,
+        *,
+        fast=0,
+        api_options=None,
+        cwd=None,
+        server=None,
+    ):
         if executable_ is None:
             self.executable = executable
         else:
             self.executable = executable_
+        self.timeout = timeout
+        self.cache = cache
+        self.fast = fast
+        self.api_options = api_options
+        self.cwd = cwd
+        self.server = server
         self.running = False
+        self._connection = None
+        self._execute_numbers = itertools.count(1)
+        self._supported_extensions = None
 
     def start(self):
         """
@@ -178,29 +448,38 @@ class ExifTool:
         This method will issue a ``UserWarning`` if the subprocess is
         already running.  The process is started with the ``-G`` and
         ``-n`` as common arguments, which are automatically included
-        in every command you run with :py:meth:`execute()`.
+        in every command you run with :py:meth:`execute()`, plus
+        ``-fast`` or ``-fast2`` if requested.
+
+        If a shared ``exiftool-server`` daemon is to be used (see
+        ``server_mode``), this connects to it instead.
         """
         if self.running:
-            warnings.warn("ExifTool already running; doing nothing.")
+            warnings.warn("ExifTool already running; doing nothing.", stacklevel=2)
             return
+        mode = server_mode if self.server is None else self.server
+        if mode != "never":
+            from camera_tools import exiftool_server
+
+            self._connection = exiftool_server.connect(auto_start=mode == "auto")
+            if self._connection is not None:
+                self.running = True
+                return
         with open(os.devnull, "w") as devnull:
             self._process = subprocess.Popen(
-                [
-                    self.executable,
-                    "-api",
-                    "largefilesupport=1",
-                    "-stay_open",
-                    "True",
-                    "-@",
-                    "-",
-                    "-common_args",
-                    "-G",
-                    "-n",
-                ],
+                _command_line(self.executable, self.fast, self.api_options),
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
                 stderr=devnull,
+                cwd=self.cwd,
             )
+        # Pipes can't be polled on Windows; a watchdog thread kills the
+        # process there instead, see _read_output().
+        if os.name == "nt":
+            self._selector = None
+        else:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._process.stdout, selectors.EVENT_READ)
         self.running = True
 
     def terminate(self):
@@ -211,10 +490,29 @@ class ExifTool:
         """
         if not self.running:
             return
+        if self._connection is not None:
+            self._disconnect()
+            return
         self._process.stdin.write(b"-stay_open\nFalse\n")
         self._process.stdin.flush()
         self._process.communicate()
-        del self._process
+        self._close()
+
+    def _kill(self):
+        # The process is hung or dead, so it can't be asked to quit.
+        self._process.kill()
+        self._process.communicate()
+        self._close()
+
+    def _close(self):
+        if self._selector is not None:
+            self._selector.close()
+        del self._process, self._selector
+        self.running = False
+
+    def _disconnect(self):
+        self._connection.close()
+        self._connection = None
         self.running = False
 
     def __enter__(self):
@@ -227,7 +525,7 @@ class ExifTool:
     def __del__(self):
         self.terminate()
 
-    def execute(self, *params):
+    def execute(self, *params, timeout=None):
         """
         Execute the given batch of parameters with ``exiftool``.
 
@@ -240,24 +538,147 @@ class ExifTool:
         end-of-output sentinel and returned as a raw ``bytes`` object,
         excluding the sentinel.
 
-        The parameters must also be raw ``bytes``, in whatever
-        encoding exiftool accepts.  For filenames, this should be the
-        system's filesystem encoding.
+        The parameters must also be raw ``bytes``, one per line of
+        exiftool's ``-@`` argument file, so they can't contain newlines.
+        File names must be UTF-8 encoded, see :py:func:`fsencode()`.
+
+        If no output is complete within ``timeout`` seconds (the
+        ``timeout`` given to the constructor by default, ``None``
+        meaning to wait forever), the process is killed and
+        ``TimeoutError`` is raised.  If the process dies,
+        ``RuntimeError`` is raised.  Either way the instance is no
+        longer running, and :py:meth:`start()` may be called again.
 
         .. note:: This is considered a low-level method, and should
            rarely be needed by application developers.
         """
+        return self._execute(params, timeout)
+
+    def _execute(self, params, timeout=None, binary_size=None, stream=False):
         if not self.running:
             raise ValueError("ExifTool instance not running.")
-        self._process.stdin.write(b"\n".join(params + (b"-execute\n",)))
+        if any(b"\n" in param for param in params):
+            raise ValueError("exiftool parameters can't contain newlines.")
+        if timeout is None:
+            timeout = self.timeout
+        if self._connection is not None:
+            output = self._execute_on_server(params, timeout, binary_size)
+            return output if binary_size is None else memoryview(output)
+        execute, marker = b"-execute", sentinel
+        if binary_size is not None:
+            # Numbered, so that "{ready}" in the data can't be taken for it.
+            number = next(self._execute_numbers)
+            execute, marker = b"-execute%d" % number, b"{ready%d}" % number
+        self._process.stdin.write(b"\n".join((*params, execute + b"\n")))
         self._process.stdin.flush()
-        output = b""
-        fd = self._process.stdout.fileno()
-        while not output[-32:].strip().endswith(sentinel):
-            output += os.read(fd, block_size)
-        return output.strip()[: -len(sentinel)]
+        if stream:
+            return None  # the caller reads the output
+        return self._read_output(timeout, binary_size, marker)
 
-    def execute_json(self, *params):
+    def _execute_on_server(self, params, timeout, binary_size=None):
+        from camera_tools import exiftool_server
+
+        try:
+            return exiftool_server.request(
+                self._connection,
+                params,
+                executable=self.executable,
+                cwd=os.fspath(self.cwd or Path.cwd()),
+                fast=self.fast,
+                api_options=self.api_options,
+                timeout=timeout,
+                binary_size=binary_size,
+            )
+        except TimeoutError:
+            raise  # the server killed its process, the connection is fine
+        except OSError as e:
+            self._disconnect()
+            raise RuntimeError(f"Lost the exiftool server: {e}") from e
+
+    def _read_output(self, timeout, binary_size=None, marker=sentinel):
+        # Read into one growing buffer rather than concatenating bytes
+        # objects, which copies the whole output on every read.  Only
+        # the last few bytes are checked for the ``marker`` ending it.
+        #
+        # With ``binary_size``, the output is raw ``-b`` data of that
+        # (expected) size: the buffer is allocated up front, the
+        # marker is expected right after the data, and the data is
+        # returned as a memoryview without stripping or copying.  If
+        # the size was wrong (e.g. the file changed since its size was
+        # read), the process is killed and ``RuntimeError`` raised.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        watchdog = None
+        if deadline is not None and self._selector is None:
+            watchdog = threading.Timer(timeout, self._process.kill)
+            watchdog.start()
+        stdout = self._process.stdout.raw
+        expected_size = 0 if binary_size is None else binary_size + len(marker)
+        buffer = bytearray(block_size + expected_size)
+        size = 0
+        read_size = block_size
+        try:
+            while True:
+                if deadline is not None and self._selector is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._selector.select(remaining):
+                        self._kill()
+                        raise TimeoutError(
+                            f"exiftool did not finish within {timeout} seconds."
+                        )
+                if len(buffer) < size + read_size:
+                    buffer.extend(bytes(max(len(buffer), read_size)))
+                with memoryview(buffer) as view:
+                    n_read = stdout.readinto(view[size : size + read_size])
+                if not n_read:
+                    timed_out = watchdog is not None and not watchdog.is_alive()
+                    self._kill()
+                    if timed_out:
+                        raise TimeoutError(
+                            f"exiftool did not finish within {timeout} seconds."
+                        )
+                    raise RuntimeError("exiftool exited unexpectedly.")
+                size += n_read
+                if size < expected_size or binary_size is None:
+                    # Before the expected size, the marker means the
+                    # output is shorter than expected.
+                    done = buffer[max(0, size - 32) : size].rstrip().endswith(marker)
+                else:
+                    # Done if the output ends here, or is longer than
+                    # expected, whatever follows.
+                    done = (
+                        buffer[binary_size:expected_size] != marker
+                        or buffer[size - 1] == ord("\n")
+                    )
+                if done:
+                    break
+                if n_read == read_size:
+                    read_size = min(read_size * 2, max_block_size)
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+        if binary_size is not None:
+            if buffer[binary_size:expected_size] != marker:
+                # The rest of the output, if any, can't be told apart
+                # from the output of the next command.
+                self._kill()
+                raise RuntimeError(
+                    f"exiftool output was not the expected {binary_size} bytes."
+                )
+            del buffer[binary_size:]
+            return memoryview(buffer)
+        # Same as output.strip()[: -len(marker)], without the copies.
+        end = size
+        while buffer[end - 1] in b" \t\r\n":
+            end -= 1
+        end -= len(marker)
+        start = 0
+        while start < end and buffer[start] in b" \t\r\n":
+            start += 1
+        with memoryview(buffer) as view:
+            return bytes(view[start:end])
+
+    def execute_json(self, *params, timeout=None):
         """
         Execute the given batch of parameters and parse the JSON output.
 
@@ -274,23 +695,36 @@ class ExifTool:
         The parameters to this function must be either raw strings
         (type ``str`` in Python 2.x, type ``bytes`` in Python 3.x) or
         Unicode strings (type ``unicode`` in Python 2.x, type ``str``
-        in Python 3.x).  Unicode strings will be encoded using
-        system's filesystem encoding.  This behaviour means you can
-        pass in filenames according to the convention of the
-        respective Python version – as raw strings in Python 2.x and
-        as Unicode strings in Python 3.x.
+        in Python 3.x).  Unicode strings will be encoded as UTF-8,
+        see :py:func:`fsencode()`, so non-ASCII file names are read
+        like any other on every platform.  File names which exiftool
+        can't read are left out of the result, which is an empty list
+        if none could be read.
+
+        ``timeout`` is passed on to :py:meth:`execute()`.
         """
         params = map(fsencode, params)
-        return json.loads(self.execute(b"-j", *params).decode("utf-8"))
+        output = self.execute(b"-j", *params, timeout=timeout)
+        return _parse_json(output)
 
-    def get_metadata_batch(self, filenames):
+    def get_metadata_batch(self, filenames, condition=None):
         """
         Return all meta-data for the given files.
 
         The return value will have the format described in the
         documentation of :py:meth:`execute_json()`.
+
+        If a ``condition`` is given, it is passed to ``exiftool -if``,
+        which then only returns the files that match it, e.g.
+        ``"$EXIF:Model eq 'Canon EOS M50'"``.  Filtering in
+        ``exiftool`` saves sending and parsing the metadata of every
+        other file.
         """
-        return self.execute_json(*filenames)
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        return self._execute_json_files(_condition_params(condition), filenames)
 
     def get_metadata(self, filename):
         """
@@ -299,9 +733,9 @@ class ExifTool:
         The returned dictionary has the format described in the
         documentation of :py:meth:`execute_json()`.
         """
-        return self.execute_json(filename)[0]
+        return self.get_metadata_batch([filename])[0]
 
-    def get_tags_batch(self, tags, filenames):
+    def get_tags_batch(self, tags, filenames, condition=None):
         """
         Return only specified tags for the given files.
 
@@ -311,7 +745,8 @@ class ExifTool:
         The second argument is an iterable of file names.
 
         The format of the return value is the same as for
-        :py:meth:`execute_json()`.
+        :py:meth:`execute_json()`.  See :py:meth:`get_metadata_batch()`
+        for ``condition``; the tags it uses don't need to be requested.
         """
         # Explicitly ruling out strings here because passing in a
         # string would lead to strange and hard-to-find errors
@@ -321,9 +756,19 @@ class ExifTool:
             raise TypeError(
                 "The argument 'filenames' must be " "an iterable of strings"
             )
-        params = ["-" + t for t in tags]
-        params.extend(filenames)
-        return self.execute_json(*params)
+        params = _condition_params(condition) + ["-" + t for t in tags]
+        return self._execute_json_files(params, filenames)
+
+    def _execute_json_files(self, params, filenames, timeout=None):
+        if self.cache is None:
+            return self.execute_json(*params, *filenames, timeout=timeout)
+        # Files read with other options give other output.
+        cache_args = _command_line("", self.fast, self.api_options)[1:] + params
+        return self.cache.fetch(
+            filenames,
+            cache_args,
+            lambda misses: self.execute_json(*params, *misses, timeout=timeout),
+        )
 
     def get_tags(self, tags, filename):
         """
@@ -361,3 +806,962 @@ class ExifTool:
         ``None`` if this tag was not found in the file.
         """
         return self.get_tag_batch(tag, [filename])[0]
+
+    def read_metadata_batch(self, filenames, condition=None):
+        """
+        Return all meta-data for the given files, isolating failures.
+
+        Unlike :py:meth:`get_metadata_batch()`, a file that can't be
+        read doesn't fail the batch: the return value is a
+        :py:class:`BatchResult` with one entry per file, ``None`` for
+        the files that failed, and their error messages.  A file fails
+        if ``exiftool`` can't read it, reports an ``Error`` for it
+        (e.g. a truncated file), or hangs or crashes ``exiftool``.
+
+        If ``exiftool`` hangs (see ``timeout``) or dies, it is
+        restarted and each half of the batch is read again, halving
+        the half that fails again until the culprit is found, so only
+        it fails.  Each half gets its share of the timeout, so a file
+        that hangs ``exiftool`` costs at most twice the timeout in all.
+
+        With a ``condition`` (see :py:meth:`get_metadata_batch()`), the
+        metadata of files that don't match it is ``None`` too, but
+        without an error.  Files with errors are still reported.
+        """
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        return self._read_batch([], list(filenames), condition)
+
+    def read_tags_batch(self, tags, filenames, condition=None):
+        """
+        Return only specified tags for the given files, isolating failures.
+
+        This is the counterpart of :py:meth:`get_tags_batch()`; see
+        :py:meth:`read_metadata_batch()`.
+        """
+        if isinstance(tags, basestring):
+            raise TypeError("The argument 'tags' must be " "an iterable of strings")
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        # exiftool only reports errors as a tag, which must be requested too.
+        params = ["-" + t for t in tags] + ["-ExifTool:Error"]
+        return self._read_batch(params, list(filenames), condition)
+
+    def _read_batch(self, params, filenames, condition, timeout=None):
+        # Let files with errors through the condition, so they are told apart.
+        read_condition = None if condition is None else f"({condition}) or $Error"
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            records = _align(
+                filenames,
+                self._execute_json_files(
+                    _condition_params(read_condition) + params, filenames, timeout
+                ),
+            )
+        except (TimeoutError, RuntimeError) as e:
+            if not self.running:
+                self.start()
+            if len(filenames) == 1:
+                return BatchResult([None], {filenames[0]: str(e)})
+            # Which file is to blame is unknown, so bisect: it takes
+            # log2(n) reads to find, rather than n.  The halves share
+            # the timeout, so the half with a file that hangs exiftool
+            # times out sooner at every step.
+            middle = len(filenames) // 2
+            return _merge(
+                self._read_batch(
+                    params,
+                    half,
+                    condition,
+                    None if timeout is None else timeout * len(half) / len(filenames),
+                )
+                for half in (filenames[:middle], filenames[middle:])
+            )
+
+        result = BatchResult([], {})
+        for filename, d in zip(filenames, records, strict=True):
+            if d is None:
+                if condition is None:
+                    result.errors[filename] = "exiftool could not read the file."
+            elif "ExifTool:Error" in d:
+                result.errors[filename] = d["ExifTool:Error"]
+            result.metadata.append(None if filename in result.errors else d)
+        return result
+
+    def set_tags_batch(
+        self, mapping, *, overwrite_original_in_place=False, preserve_time=False
+    ):
+        """
+        Write tags to many files.
+
+        The argument maps file names to dictionaries of tag names and
+        values, e.g. ``{"a.jpg": {"EXIF:Artist": "Kiyoon"}}``.  A list
+        value writes every item of a list-type tag, and ``None``
+        deletes the tag.  Because of the ``-n`` common argument, values
+        are written without conversion, e.g. ``Orientation`` as ``6``
+        rather than ``"Rotate 90 CW"``.
+
+        Files that get exactly the same assignments are written by a
+        single ``-execute``, so correcting e.g. the date or the artist
+        of a whole library takes one command per distinct assignment,
+        not one per file.
+
+        Unless ``overwrite_original_in_place`` is true, ``exiftool``
+        keeps a ``_original`` backup of every file it changes; with it,
+        the files are rewritten in place, preserving their inode,
+        Finder tags etc.  ``preserve_time`` (``-P``) keeps the file
+        modification times.
+
+        The return value maps every file name to ``True`` if it was
+        written (or already had the values), or ``False`` if
+        ``exiftool`` reported an error for it.  Cached metadata of the
+        files is dropped.
+        """
+        if isinstance(mapping, basestring):
+            raise TypeError("The argument 'mapping' must be a dictionary")
+        options = []
+        if overwrite_original_in_place:
+            options.append(b"-overwrite_original_in_place")
+        if preserve_time:
+            options.append(b"-P")
+
+        groups = {}
+        for filename, tags in mapping.items():
+            assignments = []
+            for tag, value in tags.items():
+                values = value if isinstance(value, (list, tuple)) else [value]
+                for item in values:
+                    item = "" if item is None else str(item)
+                    assignments.append(fsencode(f"-{tag}={item}"))
+            groups.setdefault(tuple(assignments), []).append(filename)
+
+        result = {}
+        fd, error_file = tempfile.mkstemp(prefix="exiftool_errors_", suffix=".txt")
+        try:
+            os.close(fd)
+            for assignments, filenames in groups.items():
+                output = self.execute(
+                    *assignments,
+                    *options,
+                    b"-efile!",
+                    fsencode(error_file),
+                    *map(fsencode, filenames),
+                )
+                n_errors = _parse_write_summary(output).get(
+                    "files weren't updated due to errors", 0
+                )
+                errors = set()
+                if n_errors:
+                    with open(error_file, "rb") as f:
+                        errors = {line.rstrip(b"\r\n") for line in f}
+                for filename in filenames:
+                    if errors:
+                        result[filename] = fsencode(filename) not in errors
+                    else:
+                        # The files with errors are unknown, so trust none.
+                        result[filename] = not n_errors
+        finally:
+            Path(error_file).unlink(missing_ok=True)
+            if self.cache is not None:
+                self.cache.invalidate(mapping)
+        return result
+
+    def extract_binary_batch(self, tag, filenames):
+        """
+        Yield the binary value of a tag for the given files.
+
+        The first argument is a single tag name, typically an embedded
+        image such as ``PreviewImage``, ``JpgFromRaw`` or
+        ``ThumbnailImage``, so previews can be used without decoding
+        the RAW files.
+
+        The second argument is an iterable of file names.
+
+        This is a generator of ``(filename, data)`` pairs, ``data``
+        being a ``memoryview`` of the raw bytes, in the same order as
+        ``filenames``.  Files without the tag are skipped.  The sizes
+        of the values are read first, ``default_chunk_size`` files at a
+        time; every value is then read with ``-b`` over the running
+        process with its size known in advance, so no ``exiftool`` is
+        spawned per file and binary data is returned intact.
+        """
+        for filename, size in self._iter_binary_sizes(tag, filenames):
+            yield filename, self._extract_binary(tag, filename, size)
+
+    def _iter_binary_sizes(self, tag, filenames):
+        if not isinstance(tag, basestring):
+            raise TypeError("The argument 'tag' must be a string")
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        for chunk in _chunked(filenames, default_chunk_size):
+            records = _align(chunk, self.get_tags_batch([tag], chunk))
+            for filename, d in zip(chunk, records, strict=True):
+                if d is None:
+                    continue
+                d.pop("SourceFile")
+                size = _binary_size(next(iter(d.values()), None))
+                if size is not None:
+                    yield filename, size
+
+    def _extract_binary(self, tag, filename, size):
+        params = (b"-b", fsencode("-" + tag), fsencode(filename))
+        try:
+            return self._execute(params, binary_size=size)
+        except RuntimeError:
+            if not self.running:  # killed, as the output was out of step
+                self.start()
+            raise
+
+    def iter_directory(
+        self,
+        roots,
+        tags=None,
+        extensions=None,
+        exclude_extensions=None,
+        recursive=True,
+        file_order=None,
+        condition=None,
+        timeout=None,
+    ):
+        """
+        Yield the meta-data of the files in the given directories.
+
+        ``exiftool`` walks the directories itself (``-r`` unless
+        ``recursive`` is false), keeping only files with one of the
+        ``extensions`` (``-ext``, e.g. ``["JPG", "MP4"]``) and none of
+        the ``exclude_extensions`` (``--ext``).  Without
+        ``extensions``, every file type ``exiftool`` supports is read.
+        ``file_order`` sorts the files by a tag (``-fileOrder``, e.g.
+        ``"FileName"``).  ``tags`` and ``condition`` are as in
+        :py:meth:`get_tags_batch()`; all meta-data is read by default.
+
+        This is a generator of ``(source_file, metadata)`` pairs, keyed
+        by exiftool's ``SourceFile``, which are yielded as ``exiftool``
+        reads the files, so there is no list of paths to build,
+        encode or send.  Files with errors are included, with their
+        ``ExifTool:Error``.
+
+        ``timeout`` (``timeout`` given to the constructor by default)
+        is the number of seconds without any output after which the
+        process is killed and ``TimeoutError`` raised.  The process is
+        also killed if the generator isn't run to the end.
+        """
+        if isinstance(roots, basestring):
+            raise TypeError("The argument 'roots' must be " "an iterable of strings")
+        params = ["-j"]
+        if recursive:
+            params.append("-r")
+        for extension in extensions or []:
+            params += ["-ext", extension]
+        for extension in exclude_extensions or []:
+            params += ["--ext", extension]
+        if file_order is not None:
+            params += ["-fileOrder", file_order]
+        params += _condition_params(condition)
+        params += ["-" + t for t in tags or []]
+        params = [fsencode(param) for param in (*params, *roots)]
+
+        if timeout is None:
+            timeout = self.timeout
+        if self._connection is not None:
+            # The server answers with the whole output at once.
+            records = _parse_json(self._execute(params, timeout))
+        else:
+            self._execute(params, timeout, stream=True)
+            records = self._iter_output_records(timeout)
+        for d in records:
+            yield d["SourceFile"], d
+
+    def supported_extensions(self):
+        """
+        Return the extensions of the file types ``exiftool`` reads, in upper case.
+
+        These are the files it reads in a directory unless told
+        otherwise with ``-ext``.  Asked once (``-listf``) per instance.
+        """
+        if self._supported_extensions is None:
+            output = self.execute(b"-listf").decode()
+            # "Supported file extensions:" and the extensions
+            self._supported_extensions = frozenset(output.partition(":")[2].split())
+        return self._supported_extensions
+
+    def _read_files(self, params, timeout, filenames, condition):
+        return self._read_batch(params, list(filenames), condition, timeout)
+
+    def _iter_output_records(self, timeout):
+        # exiftool prints every record as soon as the file is read, as
+        # a top-level object of the JSON list closed by "}" at the start
+        # of a line, so records can be parsed one at a time.
+        stdout = self._process.stdout.raw
+        buffer = bytearray()
+        finished = False
+        watchdog = None
+        try:
+            while True:
+                if timeout is not None and self._selector is not None:
+                    if not self._selector.select(timeout):
+                        self._kill()
+                        raise TimeoutError(
+                            f"exiftool gave no output for {timeout} seconds."
+                        )
+                elif timeout is not None:
+                    watchdog = threading.Timer(timeout, self._process.kill)
+                    watchdog.start()
+                chunk = stdout.read(max_block_size)
+                if watchdog is not None:
+                    watchdog.cancel()
+                if not chunk:
+                    timed_out = watchdog is not None and not watchdog.is_alive()
+                    self._kill()
+                    if timed_out:
+                        raise TimeoutError(
+                            f"exiftool gave no output for {timeout} seconds."
+                        )
+                    raise RuntimeError("exiftool exited unexpectedly.")
+                buffer += chunk
+                start = 0
+                while (end := buffer.find(b"\n}", start)) >= 0:
+                    begin = buffer.find(b"{", start)
+                    yield _parse_json(bytes(buffer[begin : end + 2]))
+                    start = end + 2
+                del buffer[:start]
+                if buffer.rstrip().endswith(sentinel):
+                    finished = True
+                    return
+        finally:
+            if not finished and self.running:
+                self._kill()  # the rest of the output can't be skipped reliably
+
+    def iter_metadata(self, filenames, chunk_size=None, errors=None, condition=None):
+        """
+        Yield all meta-data for the given files, chunk by chunk.
+
+        Unlike :py:meth:`get_metadata_batch()`, the files are sent to
+        ``exiftool`` ``chunk_size`` at a time (the module-level
+        ``default_chunk_size`` by default), and ``(filename, metadata)`` pairs
+        are yielded as soon as each chunk is parsed.  Memory use stays
+        bounded by the chunk size however many files there are, and the
+        caller can start working on the first files while later chunks
+        are still to be read.  ``filenames`` may be any iterable,
+        including a lazy one.
+
+        The metadata dictionaries have the format described in the
+        documentation of :py:meth:`execute_json()`.  Failures are
+        isolated as in :py:meth:`read_metadata_batch()`: the metadata
+        of a file that failed is ``None``, and if ``errors`` is a
+        dictionary, its error message is stored in it before the file
+        is yielded.  With a ``condition``, the metadata of files that
+        don't match it is ``None`` as well.
+        """
+        return self._iter_batch(
+            "read_metadata_batch", filenames, chunk_size, errors, condition
+        )
+
+    def iter_tags(
+        self,
+        tags,
+        filenames,
+        chunk_size=None,
+        errors=None,
+        records=False,
+        condition=None,
+    ):
+        """
+        Yield only specified tags for the given files, chunk by chunk.
+
+        This is the streaming counterpart of :py:meth:`get_tags_batch()`;
+        see :py:meth:`iter_metadata()`.  With ``records=True``, the
+        metadata is converted chunk by chunk into compact records (see
+        :py:func:`make_record_type()`) rather than dictionaries, for
+        callers which keep the metadata of many files.
+        """
+        if isinstance(tags, basestring):
+            raise TypeError("The argument 'tags' must be " "an iterable of strings")
+        tags = list(tags)
+        pairs = self._iter_batch(
+            "read_tags_batch", filenames, chunk_size, errors, condition, tags
+        )
+        if not records:
+            return pairs
+        record_type = make_record_type(tags)
+        return (
+            (filename, None if d is None else record_type.from_dict(d))
+            for filename, d in pairs
+        )
+
+    def _iter_batch(self, method, filenames, chunk_size, errors, condition, *args):
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        chunks = _chunked(filenames, chunk_size or default_chunk_size)
+        return self._iter_chunks(method, chunks, errors, condition, *args)
+
+    def _iter_chunks(self, method, chunks, errors, condition, *args):
+        for chunk in chunks:
+            result = getattr(self, method)(*args, chunk, condition)
+            yield from _unpack(chunk, result, errors)
+
+
+class ExifToolPool(ExifTool):
+    """
+    Run several ``exiftool`` processes and spread batch queries over them.
+
+    A single ``exiftool`` process only ever uses one CPU core, so
+    reading the metadata of thousands of files is bound by that core.
+    This class starts ``n_workers`` processes in batch mode, splits the
+    file list of :py:meth:`get_metadata_batch()`,
+    :py:meth:`get_tags_batch()` and :py:meth:`set_tags_batch()` into
+    contiguous shards, runs the shards concurrently and merges the
+    results back in input order.  It can be
+    used as a drop-in replacement for :py:class:`ExifTool`::
+
+        with ExifToolPool(4) as et:
+            metadata = et.get_metadata_batch(files)
+
+    ``n_workers`` defaults to the number of CPUs.  Commands which are
+    not about a list of files, like :py:meth:`execute()`, are run on
+    whichever process is idle.  The instance can safely be shared
+    between threads.  The other arguments apply to every process, see
+    :py:class:`ExifTool`.
+
+    .. py:attribute:: running
+
+       A Boolean value indicating whether this instance is currently
+       associated with running subprocesses.
+    """
+
+    def __init__(
+        self,
+        n_workers=None,
+        executable_=None,
+        timeout=None,
+        cache=None,
+        *,
+        fast=0,
+        api_options=None,
+        server=None,
+    ):
+        super().__init__(
+            executable_,
+            timeout,
+            cache,
+            fast=fast,
+            api_options=api_options,
+            server=server,
+        )
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        if n_workers < 1:
+            raise ValueError("ExifToolPool needs at least one worker.")
+        self.n_workers = n_workers
+        self._workers = []
+
+    def start(self):
+        """
+        Start ``n_workers`` ``exiftool`` processes in batch mode.
+
+        This method will issue a ``UserWarning`` if the subprocesses
+        are already running.  See :py:meth:`ExifTool.start()` for the
+        common options.
+        """
+        if self.running:
+            warnings.warn("ExifToolPool already running; doing nothing.", stacklevel=2)
+            return
+        self._workers = [
+            ExifTool(
+                self.executable,
+                self.timeout,
+                self.cache,
+                fast=self.fast,
+                api_options=self.api_options,
+                server=self.server,
+            )
+            for _ in range(self.n_workers)
+        ]
+        self._idle = queue.SimpleQueue()
+        try:
+            for et in self._workers:
+                et.start()
+                self._idle.put(et)
+        except BaseException:
+            # Don't leave the processes started so far running.
+            for et in self._workers:
+                et.terminate()
+            self._workers = []
+            del self._idle
+            raise
+        self._executor = ThreadPoolExecutor(max_workers=self.n_workers)
+        self.running = True
+
+    def terminate(self):
+        """
+        Terminate all ``exiftool`` processes of this instance.
+
+        If the subprocesses aren't running, this method will do nothing.
+        """
+        if not self.running:
+            return
+        self._executor.shutdown()
+        for et in self._workers:
+            et.terminate()
+        self._workers = []
+        del self._idle, self._executor
+        self.running = False
+
+    @contextmanager
+    def _checkout(self):
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+        et = self._idle.get()
+        try:
+            if not et.running:  # killed after a timeout
+                et.start()
+            yield et
+        finally:
+            self._idle.put(et)
+
+    def _shard(self, filenames):
+        n_shards = min(self.n_workers, len(filenames))
+        shard_size, remainder = divmod(len(filenames), n_shards)
+        shards = []
+        start = 0
+        for i in range(n_shards):
+            end = start + shard_size + (1 if i < remainder else 0)
+            shards.append(filenames[start:end])
+            start = end
+        return shards
+
+    def _map_batch(self, method, filenames, condition, *args):
+        result = []
+        for shard_result in self._map_shards(method, filenames, condition, *args):
+            result.extend(shard_result)
+        return result
+
+    def _map_shards(self, method, filenames, condition, *args):
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        filenames = list(filenames)
+        if not filenames:
+            return []
+
+        def run(shard):
+            with self._checkout() as et:
+                return getattr(et, method)(*args, shard, condition)
+
+        return list(self._executor.map(run, self._shard(filenames)))
+
+    def _iter_chunks(self, method, chunks, errors, condition, *args):
+        # Keep every process busy with a couple of chunks in flight, but
+        # no more, so memory stays bounded.
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+
+        def run(chunk):
+            with self._checkout() as et:
+                return getattr(et, method)(*args, chunk, condition)
+
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, self._executor.submit(run, chunk)))
+            if len(pending) >= 2 * self.n_workers:
+                chunk, future = pending.popleft()
+                yield from _unpack(chunk, future.result(), errors)
+        while pending:
+            chunk, future = pending.popleft()
+            yield from _unpack(chunk, future.result(), errors)
+
+    def extract_binary_batch(self, tag, filenames):
+        """
+        Yield the binary value of a tag for the given files, reading in parallel.
+
+        See :py:meth:`ExifTool.extract_binary_batch()`.  The values are
+        yielded in input order, with a couple of files per process in
+        flight.
+        """
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+
+        def run(filename, size):
+            with self._checkout() as et:
+                return et._extract_binary(tag, filename, size)
+
+        pending = deque()
+        for filename, size in self._iter_binary_sizes(tag, filenames):
+            pending.append((filename, self._executor.submit(run, filename, size)))
+            if len(pending) >= 2 * self.n_workers:
+                filename, future = pending.popleft()
+                yield filename, future.result()
+        while pending:
+            filename, future = pending.popleft()
+            yield filename, future.result()
+
+    def iter_directory(
+        self,
+        roots,
+        tags=None,
+        extensions=None,
+        exclude_extensions=None,
+        recursive=True,
+        file_order=None,
+        condition=None,
+        timeout=None,
+    ):
+        """
+        Yield the meta-data of the files in the given directories, reading in parallel.
+
+        See :py:meth:`ExifTool.iter_directory()`.  The directories are
+        listed here rather than walked by ``exiftool``, keeping the same
+        files it would, so the files can be split into chunks read by
+        all processes, through the cache, whether there is one
+        directory or many.  Failures are isolated as in
+        :py:meth:`read_metadata_batch()`, and ``timeout`` applies to
+        each chunk.  The pairs are yielded in the order of the listing
+        (sorted by name), except with a ``file_order``: then a single
+        process walks and sorts all the files.
+        """
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+        if isinstance(roots, basestring):
+            raise TypeError("The argument 'roots' must be " "an iterable of strings")
+        if file_order is not None:
+            with self._checkout() as et:
+                yield from et.iter_directory(
+                    roots,
+                    tags,
+                    extensions,
+                    exclude_extensions,
+                    recursive,
+                    file_order,
+                    condition,
+                    timeout,
+                )
+            return
+
+        if extensions is None:
+            extensions = self.supported_extensions()
+        else:
+            extensions = {extension.upper() for extension in extensions}
+            if "*" in extensions:
+                extensions = None
+        exclude_extensions = {
+            extension.upper() for extension in exclude_extensions or []
+        }
+        files = _walk_files(roots, extensions, exclude_extensions, recursive)
+        # As read_metadata_batch() and read_tags_batch() read them.
+        params = []
+        if tags is not None:
+            params = ["-" + t for t in tags] + ["-ExifTool:Error"]
+        errors = {}
+        for filename, d in self._iter_chunks(
+            "_read_files",
+            _chunked(files, default_chunk_size),
+            errors,
+            condition,
+            params,
+            timeout,
+        ):
+            if d is not None:
+                yield filename, d
+            elif filename in errors:
+                error = errors.pop(filename)
+                yield filename, {"SourceFile": filename, "ExifTool:Error": error}
+
+    def set_tags_batch(
+        self, mapping, *, overwrite_original_in_place=False, preserve_time=False
+    ):
+        """
+        Write tags to many files, writing in parallel.
+
+        See :py:meth:`ExifTool.set_tags_batch()`.  The files are split
+        into contiguous shards, one per process, and each process
+        groups the files of its shard by their assignments, so there
+        is one command per distinct assignment and process.
+        """
+        if not self.running:
+            raise ValueError("ExifToolPool instance not running.")
+        if isinstance(mapping, basestring):
+            raise TypeError("The argument 'mapping' must be a dictionary")
+        filenames = list(mapping)
+        if not filenames:
+            return {}
+
+        def run(shard):
+            with self._checkout() as et:
+                return et.set_tags_batch(
+                    {filename: mapping[filename] for filename in shard},
+                    overwrite_original_in_place=overwrite_original_in_place,
+                    preserve_time=preserve_time,
+                )
+
+        result = {}
+        for shard_result in self._executor.map(run, self._shard(filenames)):
+            result.update(shard_result)
+        return result
+
+    def execute(self, *params, timeout=None):
+        """
+        Execute the given batch of parameters on an idle ``exiftool``.
+
+        See :py:meth:`ExifTool.execute()`.  The parameters are not
+        split across processes.
+        """
+        with self._checkout() as et:
+            return et.execute(*params, timeout=timeout)
+
+    def get_metadata_batch(self, filenames, condition=None):
+        """
+        Return all meta-data for the given files, reading in parallel.
+
+        The return value has the same format and order as
+        :py:meth:`ExifTool.get_metadata_batch()`.
+        """
+        return self._map_batch("get_metadata_batch", filenames, condition)
+
+    def get_tags_batch(self, tags, filenames, condition=None):
+        """
+        Return only specified tags for the given files, reading in parallel.
+
+        The return value has the same format and order as
+        :py:meth:`ExifTool.get_tags_batch()`.
+        """
+        if isinstance(tags, basestring):
+            raise TypeError("The argument 'tags' must be " "an iterable of strings")
+        return self._map_batch("get_tags_batch", filenames, condition, list(tags))
+
+    def read_metadata_batch(self, filenames, condition=None):
+        """
+        Return all meta-data for the given files, reading in parallel and isolating failures.
+
+        See :py:meth:`ExifTool.read_metadata_batch()`.  Every process
+        isolates the failures of its shard, and restarts, by itself.
+        """
+        return _merge(self._map_shards("read_metadata_batch", filenames, condition))
+
+    def read_tags_batch(self, tags, filenames, condition=None):
+        """
+        Return only specified tags for the given files, reading in parallel and isolating failures.
+
+        See :py:meth:`ExifTool.read_tags_batch()`.
+        """
+        if isinstance(tags, basestring):
+            raise TypeError("The argument 'tags' must be " "an iterable of strings")
+        return _merge(
+            self._map_shards("read_tags_batch", filenames, condition, list(tags))
+        )
+
+
+class AsyncExifTool:
+    """
+    Run the `exiftool` command-line tool from :py:mod:`asyncio`.
+
+    This is the asyncio counterpart of :py:class:`ExifTool`, using the
+    same ``-stay_open`` protocol over the pipes of a subprocess created
+    with :py:func:`asyncio.create_subprocess_exec`, so reading metadata
+    never blocks the event loop::
+
+        async with AsyncExifTool() as et:
+            metadata = await et.get_metadata_batch(files)
+
+    Commands are pipelined: every command is numbered
+    (``-execute<N>``) and written as soon as it is issued, and a single
+    reader task hands each output, delimited by ``{ready<N>}``, to the
+    coroutine that is waiting for it.  Any number of coroutines can
+    therefore issue commands on one process concurrently, without
+    locking; ``exiftool`` runs them in order.
+
+    If a command times out, the process is killed and every other
+    pending command fails with ``RuntimeError``.
+
+    .. py:attribute:: running
+
+       A Boolean value indicating whether this instance is currently
+       associated with a running subprocess.
+    """
+
+    def __init__(self, executable_=None, timeout=None, *, fast=0, api_options=None):
+        if executable_ is None:
+            self.executable = executable
+        else:
+            self.executable = executable_
+        self.timeout = timeout
+        self.fast = fast
+        self.api_options = api_options
+        self.running = False
+        self._process = None
+
+    async def start(self):
+        """
+        Start an ``exiftool`` process in batch mode for this instance.
+
+        See :py:meth:`ExifTool.start()`.
+        """
+        if self.running:
+            warnings.warn(
+                "AsyncExifTool already running; doing nothing.", stacklevel=2
+            )
+            return
+        await self.terminate()  # reap a process killed after a timeout
+        self._process = await asyncio.create_subprocess_exec(
+            *_command_line(self.executable, self.fast, self.api_options),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._pending = deque()
+        self._counter = itertools.count(1)
+        self._reader = asyncio.create_task(self._read_outputs())
+        self.running = True
+
+    async def terminate(self):
+        """
+        Terminate the ``exiftool`` process of this instance.
+
+        Commands that are still pending are run first.  If the
+        subprocess isn't running, this method will do nothing.
+        """
+        if self._process is None:
+            return
+        if self.running:
+            self.running = False
+            self._process.stdin.write(b"-stay_open\nFalse\n")
+            with suppress(ConnectionError):
+                await self._process.stdin.drain()
+        await self._reader
+        await self._process.wait()
+        self._process = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.terminate()
+
+    def _kill(self):
+        self.running = False
+        if self._process.returncode is None:
+            self._process.kill()
+
+    async def _read_outputs(self):
+        stdout = self._process.stdout
+        buffer = bytearray()
+        scanned = 0
+        while True:
+            chunk = await stdout.read(max_block_size)
+            if not chunk:
+                break
+            buffer += chunk
+            while self._pending:
+                number, future = self._pending[0]
+                marker = b"{ready%d}" % number
+                index = buffer.find(marker, max(0, scanned - len(marker)))
+                if index < 0:
+                    scanned = len(buffer)
+                    break
+                self._pending.popleft()
+                if not future.done():
+                    future.set_result(bytes(buffer[:index]).strip())
+                end = buffer.find(b"\n", index)
+                del buffer[: len(buffer) if end < 0 else end + 1]
+                scanned = 0
+
+        self.running = False
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(RuntimeError("exiftool exited unexpectedly."))
+
+    async def execute(self, *params, timeout=None):
+        """
+        Execute the given batch of parameters with ``exiftool``.
+
+        Like :py:meth:`ExifTool.execute()`, this returns the raw
+        output as ``bytes``, and the parameters must be ``bytes``
+        without newlines.  On timeout, ``TimeoutError`` is raised.
+        """
+        if not self.running:
+            raise ValueError("AsyncExifTool instance not running.")
+        # Each parameter is a line: a newline would inject more of them.
+        if any(b"\n" in param for param in params):
+            raise ValueError("exiftool parameters can't contain newlines.")
+        number = next(self._counter)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((number, future))
+        self._process.stdin.write(b"\n".join((*params, b"-execute%d\n" % number)))
+        await self._process.stdin.drain()
+
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._kill()
+            raise TimeoutError(
+                f"exiftool did not finish within {timeout} seconds."
+            ) from None
+
+    async def execute_json(self, *params, timeout=None):
+        """
+        Execute the given batch of parameters and parse the JSON output.
+
+        See :py:meth:`ExifTool.execute_json()`.
+        """
+        params = map(fsencode, params)
+        output = await self.execute(b"-j", *params, timeout=timeout)
+        return _parse_json(output)
+
+    async def get_metadata_batch(self, filenames):
+        """
+        Return all meta-data for the given files.
+
+        See :py:meth:`ExifTool.get_metadata_batch()`.
+        """
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        return await self.execute_json(*filenames)
+
+    async def get_metadata(self, filename):
+        """
+        Return meta-data for a single file.
+
+        See :py:meth:`ExifTool.get_metadata()`.
+        """
+        return (await self.execute_json(filename))[0]
+
+    async def get_tags_batch(self, tags, filenames):
+        """
+        Return only specified tags for the given files.
+
+        See :py:meth:`ExifTool.get_tags_batch()`.
+        """
+        if isinstance(tags, basestring):
+            raise TypeError("The argument 'tags' must be " "an iterable of strings")
+        if isinstance(filenames, basestring):
+            raise TypeError(
+                "The argument 'filenames' must be " "an iterable of strings"
+            )
+        params = ["-" + t for t in tags]
+        params.extend(filenames)
+        return await self.execute_json(*params)
+
+    async def get_tags(self, tags, filename):
+        """
+        Return only specified tags for a single file.
+
+        See :py:meth:`ExifTool.get_tags()`.
+        """
+        return (await self.get_tags_batch(tags, [filename]))[0]
@@ -0,0 +1,362 @@
+"""
+Shared exiftool daemon, so short-lived commands don't pay perl start-up time.
+
+`serve()` keeps warm `ExifTool` processes behind a Unix domain socket, and
+`camera_tools.exiftool.ExifTool` connects to it transparently when it is running
+(see `camera_tools.exiftool.server_mode`). Start it with `camera-tools exiftool-server`,
+or let `ExifTool` start it on demand with `CAMERA_TOOLS_EXIFTOOL_SERVER=auto`.
+It exits after `idle_timeout` seconds without requests.
+
+Every request carries the client's working directory and exiftool options, and is run
+on an idle process started with exactly those, so relative paths and output are the
+same as with a private process. Concurrent requests are run on separate processes.
+
+The socket lives in a directory only its user can write to (by default $XDG_RUNTIME_DIR, or
+a 0700 directory in the temp directory), and clients only connect to a socket owned by
+themselves that nobody else can access, so other local users can't serve or read requests.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from os import PathLike
+from pathlib import Path
+
+from camera_tools import exiftool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IDLE_TIMEOUT = 600
+
+_LENGTH = struct.Struct("!I")
+
+
+def default_socket_path() -> Path:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / "camera-tools-exiftool.sock"
+    # The temp directory is shared, so the socket goes in a directory of its own.
+    return Path(tempfile.gettempdir()) / f"camera-tools-{os.getuid()}" / "exiftool.sock"
+
+
+def _is_private_dir(directory: str | PathLike) -> bool:
+    """Whether the directory belongs to this user, and nobody else can write to it."""
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return False
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+def _is_private_socket(socket_path: str | PathLike) -> bool:
+    """Whether the socket belongs to this user in a private directory, and nobody else can access it."""
+    try:
+        st = os.lstat(socket_path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISSOCK(st.st_mode)
+        and st.st_uid == os.getuid()
+        and not st.st_mode & 0o077
+        and _is_private_dir(os.path.dirname(os.path.abspath(socket_path)))
+    )
+
+
+def _send_frames(sock: socket.socket, frames: list[bytes]):
+    header = [_LENGTH.pack(len(frames))]
+    for frame in frames:
+        header.append(_LENGTH.pack(len(frame)))
+    sock.sendall(b"".join(header))
+    for frame in frames:
+        sock.sendall(frame)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n_received = sock.recv_into(view[received:])
+        if not n_received:
+            raise ConnectionError("exiftool server closed the connection.")
+        received += n_received
+    return bytes(buffer)
+
+
+def _recv_frames(sock: socket.socket) -> list[bytes]:
+    (n_frames,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    lengths = struct.unpack(f"!{n_frames}I", _recv_exact(sock, _LENGTH.size * n_frames))
+    return [_recv_exact(sock, length) for length in lengths]
+
+
+def connect(
+    socket_path: str | PathLike | None = None, *, auto_start: bool = False
+) -> socket.socket | None:
+    """
+    Connect to a running exiftool server, optionally starting one.
+
+    Returns:
+        The connected socket, or None if there is no server (or Unix sockets aren't supported).
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    if socket_path is None:
+        socket_path = default_socket_path()
+
+    sock = _try_connect(socket_path)
+    if sock is not None or not auto_start:
+        return sock
+
+    subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from camera_tools.exiftool_server import serve; serve(sys.argv[1])",
+            os.fspath(socket_path),
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        sock = _try_connect(socket_path)
+        if sock is not None:
+            return sock
+    logger.warning("exiftool server did not start; running exiftool directly.")
+    return None
+
+
+def _try_connect(socket_path: str | PathLike) -> socket.socket | None:
+    if not os.path.lexists(socket_path):
+        return None
+    if not _is_private_socket(socket_path):
+        logger.warning(
+            "Not using the exiftool server at %s: the socket or its directory is "
+            "not owned by you, or others can access it.",
+            socket_path,
+        )
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.fspath(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def request(
+    sock: socket.socket,
+    params: tuple[bytes, ...],
+    *,
+    executable: str,
+    cwd: str,
+    fast: int = 0,
+    api_options: dict | None = None,
+    timeout: float | None = None,
+    binary_size: int | None = None,
+) -> bytes:
+    """
+    Run `ExifTool.execute(*params)` on the server and return its output.
+
+    Raises the same `TimeoutError` or `RuntimeError` a local process would.
+    With `binary_size`, the output is raw `-b` data, see `ExifTool.extract_binary_batch()`.
+    """
+    options = json.dumps(
+        {
+            "executable": executable,
+            "cwd": cwd,
+            "fast": fast,
+            "api_options": api_options,
+            "timeout": timeout,
+            "binary_size": binary_size,
+        },
+        sort_keys=True,
+    )
+    _send_frames(sock, [options.encode("utf-8"), *params])
+    status, payload = _recv_frames(sock)
+    if status == b"ok":
+        return payload
+    message = payload.decode("utf-8", "replace")
+    if status == b"TimeoutError":
+        raise TimeoutError(message)
+    raise RuntimeError(message)
+
+
+class _ExifToolServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, idle_timeout: float):
+        self.idle_timeout = idle_timeout
+        self.last_activity = time.monotonic()
+        self.n_requests_running = 0
+        self.lock = threading.Lock()
+        # (executable, cwd, fast, api_options) -> idle processes with their last use
+        self.idle: dict[tuple, list[tuple[exiftool.ExifTool, float]]] = {}
+        super().__init__(socket_path, _RequestHandler)
+
+    def checkout(self, key: tuple) -> exiftool.ExifTool:
+        with self.lock:
+            self.n_requests_running += 1
+            self.last_activity = time.monotonic()
+            if self.idle.get(key):
+                et, _ = self.idle[key].pop()
+                return et
+        executable, cwd, fast, api_options = key
+        et = exiftool.ExifTool(
+            executable,
+            fast=fast,
+            api_options=dict(api_options) if api_options else None,
+            cwd=cwd,
+            server="never",
+        )
+        et.start()
+        return et
+
+    def checkin(self, key: tuple, et: exiftool.ExifTool | None):
+        with self.lock:
+            self.n_requests_running -= 1
+            self.last_activity = time.monotonic()
+            if et is not None and et.running:
+                self.idle.setdefault(key, []).append((et, self.last_activity))
+
+    def reap_idle(self):
+        """Terminate processes idle for too long, and the server once nothing is running."""
+        while True:
+            time.sleep(min(self.idle_timeout, 5))
+            now = time.monotonic()
+            to_terminate = []
+            with self.lock:
+                for key, processes in self.idle.items():
+                    keep = [
+                        (et, used)
+                        for et, used in processes
+                        if now - used < self.idle_timeout
+                    ]
+                    to_terminate += [
+                        et for et, used in processes if now - used >= self.idle_timeout
+                    ]
+                    self.idle[key] = keep
+                stop = (
+                    self.n_requests_running == 0
+                    and now - self.last_activity >= self.idle_timeout
+                )
+            for et in to_terminate:
+                et.terminate()
+            if stop:
+                logger.info("No requests for %s seconds; stopping.", self.idle_timeout)
+                self.shutdown()
+                return
+
+    def terminate_all(self):
+        with self.lock:
+            processes = [et for entries in self.idle.values() for et, _ in entries]
+            self.idle.clear()
+        for et in processes:
+            et.terminate()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    server: _ExifToolServer
+
+    def handle(self):
+        while True:
+            try:
+                options, *params = _recv_frames(self.request)
+            except (ConnectionError, struct.error):
+                return
+            try:
+                response = [b"ok", self._run(options, params)]
+            except (TimeoutError, RuntimeError, OSError) as e:
+                response = [type(e).__name__.encode(), str(e).encode("utf-8")]
+            except Exception as e:
+                # Every request must be answered, or the client waits forever.
+                logger.exception("exiftool server request failed")
+                response = [b"RuntimeError", f"{type(e).__name__}: {e}".encode()]
+            try:
+                _send_frames(self.request, response)
+            except OSError:
+                return
+
+    def _run(self, options: bytes, params: list[bytes]) -> bytes:
+        options = json.loads(options)
+        api_options = options["api_options"]
+        key = (
+            options["executable"],
+            options["cwd"],
+            options["fast"],
+            tuple(sorted(api_options.items())) if api_options else None,
+        )
+        try:
+            et = self.server.checkout(key)
+        except Exception:
+            self.server.checkin(key, None)
+            raise
+        try:
+            return et._execute(params, options["timeout"], options["binary_size"])
+        except (TimeoutError, RuntimeError, OSError):
+            raise
+        except Exception:
+            et.terminate()  # it may be out of step with its output
+            raise
+        finally:
+            self.server.checkin(key, et)
+
+
+def serve(
+    socket_path: str | PathLike | None = None,
+    idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+):
+    """
+    Run the exiftool server until it has been idle for `idle_timeout` seconds.
+
+    Returns immediately if another server is already listening on `socket_path`.
+    The socket's directory must be writable only by this user (a missing directory is made so).
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+    socket_path = Path(socket_path)
+
+    socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if not _is_private_dir(socket_path.parent):
+        raise PermissionError(
+            f"{socket_path.parent} is not owned by you or others can write to it; "
+            "use a private directory for the exiftool server socket."
+        )
+
+    if os.path.lexists(socket_path):
+        sock = _try_connect(socket_path)
+        if sock is not None:
+            sock.close()
+            logger.info("exiftool server already running at %s", socket_path)
+            return
+        socket_path.unlink()  # stale, left by a server that crashed
+
+    old_umask = os.umask(0o077)
+    try:
+        server = _ExifToolServer(os.fspath(socket_path), idle_timeout)
+    finally:
+        os.umask(old_umask)
+
+    logger.info("exiftool server listening at %s", socket_path)
+    threading.Thread(target=server.reap_idle, daemon=True).start()
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.terminate_all()
+        socket_path.unlink(missing_ok=True)
@@ -0,0 +1,252 @@
+"""
+Read the video properties of MP4/MOV files straight from their boxes (atoms), without ffprobe.
+
+`read_video_info()` seeks through `moov/trak/mdia/minf/stbl` of the first video track with a
+few small positioned reads, skipping `mdat`, so it takes microseconds and reads a few KB
+even for huge clips. `video_info()` falls back to ffprobe for anything it can't handle
+(other containers, fragmented MP4, unknown codecs). To share a memoised probe with other
+checks, probe with (at least) `FFPROBE_STREAM_ENTRIES` and `FFPROBE_FORMAT_ENTRIES`
+and read it with `video_info_from_probe()`.
+
+Example:
+    info = video_info("MVI_0001.MP4")
+    if info is not None and info.codec == "hevc" and info.pix_fmt == "yuv422p10le":
+        print(info.height, info.fps, info.duration)
+"""
+
+from __future__ import annotations
+
+import os
+import struct
+from collections import Counter
+from fractions import Fraction
+from os import PathLike
+from typing import BinaryIO, NamedTuple
+
+from camera_tools import probe
+
+# Sample entry formats, as ffprobe's codec_name.
+CODEC_NAMES = {
+    b"avc1": "h264",
+    b"avc3": "h264",
+    b"hvc1": "hevc",
+    b"hev1": "hevc",
+    b"av01": "av1",
+    b"vp09": "vp9",
+    b"mp4v": "mpeg4",
+    b"apch": "prores",
+    b"apcn": "prores",
+    b"apcs": "prores",
+    b"apco": "prores",
+    b"ap4h": "prores",
+    b"jpeg": "mjpeg",
+}
+
+# hvcC chromaFormat
+_CHROMA_FORMATS = {0: "gray", 1: "yuv420p", 2: "yuv422p", 3: "yuv444p"}
+
+# Size of a VisualSampleEntry before its child boxes, including the box header.
+_VISUAL_SAMPLE_ENTRY_SIZE = 86
+
+# Larger boxes are not read (stts of a long variable frame rate clip is still far smaller).
+_MAX_BOX_READ = 64 * 1024 * 1024
+
+# What `video_info_from_probe()` reads from ffprobe. The format duration is for containers
+# without a stream duration, such as MKV.
+FFPROBE_STREAM_ENTRIES = [
+    "codec_name",
+    "width",
+    "height",
+    "r_frame_rate",
+    "duration",
+    "pix_fmt",
+]
+FFPROBE_FORMAT_ENTRIES = ["duration"]
+
+
+class VideoInfo(NamedTuple):
+    codec: str  # ffprobe's codec_name, e.g. "hevc"
+    width: int
+    height: int
+    fps: float  # like ffprobe's r_frame_rate
+    duration: float  # seconds
+    pix_fmt: str | None  # e.g. "yuv422p10le". Only known for HEVC without ffprobe.
+
+
+class _UnsupportedError(Exception):
+    pass
+
+
+def _iter_boxes(f: BinaryIO, start: int, end: int):
+    """Yield (type, payload start, box end) of the boxes between `start` and `end`."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", f.read(8))
+            header_size = 16
+        elif size == 0:  # extends to the end
+            size = end - position
+        if size < header_size or position + size > end:
+            raise _UnsupportedError(f"Corrupt {box_type!r} box")
+        yield box_type, position + header_size, position + size
+        position += size
+
+
+def _find_box(f: BinaryIO, start: int, end: int, box_type: bytes) -> tuple[int, int]:
+    for found_type, payload_start, box_end in _iter_boxes(f, start, end):
+        if found_type == box_type:
+            return payload_start, box_end
+    raise _UnsupportedError(f"No {box_type!r} box")
+
+
+def _read(f: BinaryIO, start: int, end: int) -> bytes:
+    if end - start > _MAX_BOX_READ:
+        raise _UnsupportedError("Box too large")
+    f.seek(start)
+    data = f.read(end - start)
+    if len(data) < end - start:
+        raise _UnsupportedError("Truncated file")
+    return data
+
+
+def _handler_type(f: BinaryIO, mdia_start: int, mdia_end: int) -> bytes:
+    start, end = _find_box(f, mdia_start, mdia_end, b"hdlr")
+    # version and flags, pre_defined (QuickTime: component type)
+    return _read(f, start, end)[8:12]
+
+
+def _media_timescale_duration(data: bytes) -> tuple[int, int]:
+    if data[0] == 1:  # version 1: 64-bit times
+        return struct.unpack_from(">IQ", data, 20)
+    return struct.unpack_from(">II", data, 12)
+
+
+def _hevc_pix_fmt(hvcc: bytes) -> str | None:
+    if len(hvcc) < 18:
+        return None
+    chroma_format = hvcc[16] & 0b11
+    bit_depth = (hvcc[17] & 0b111) + 8
+    pix_fmt = _CHROMA_FORMATS[chroma_format]
+    return pix_fmt if bit_depth == 8 else f"{pix_fmt}{bit_depth}le"
+
+
+def _frame_rate(stts: bytes, timescale: int) -> float:
+    (n_entries,) = struct.unpack_from(">I", stts, 4)
+    if n_entries == 0 or len(stts) < 8 + 8 * n_entries:
+        raise _UnsupportedError("No samples (fragmented MP4?)")
+    # The most common sample duration, like ffprobe's r_frame_rate of a constant frame rate video.
+    sample_durations = Counter()
+    for i in range(n_entries):
+        sample_count, sample_delta = struct.unpack_from(">II", stts, 8 + 8 * i)
+        sample_durations[sample_delta] += sample_count
+    sample_delta = sample_durations.most_common(1)[0][0]
+    if sample_delta == 0:
+        raise _UnsupportedError("Zero sample duration")
+    return timescale / sample_delta
+
+
+def _read_video_track(f: BinaryIO, mdia_start: int, mdia_end: int) -> VideoInfo:
+    mdhd_start, mdhd_end = _find_box(f, mdia_start, mdia_end, b"mdhd")
+    timescale, duration = _media_timescale_duration(_read(f, mdhd_start, mdhd_end))
+    if timescale == 0 or duration in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        raise _UnsupportedError("Unknown duration (fragmented MP4?)")
+
+    minf_start, minf_end = _find_box(f, mdia_start, mdia_end, b"minf")
+    stbl_start, stbl_end = _find_box(f, minf_start, minf_end, b"stbl")
+    stsd_start, stsd_end = _find_box(f, stbl_start, stbl_end, b"stsd")
+    # version and flags, entry_count, then the first sample entry
+    entry_start = stsd_start + 8
+    entry = _read(
+        f, entry_start, min(stsd_end, entry_start + _VISUAL_SAMPLE_ENTRY_SIZE)
+    )
+    if len(entry) < _VISUAL_SAMPLE_ENTRY_SIZE:
+        raise _UnsupportedError("Truncated sample entry")
+    entry_size, entry_format = struct.unpack_from(">I4s", entry)
+    codec = CODEC_NAMES.get(entry_format)
+    if codec is None:
+        raise _UnsupportedError(f"Unknown codec {entry_format!r}")
+    width, height = struct.unpack_from(">HH", entry, 32)
+
+    pix_fmt = None
+    if codec == "hevc":
+        entry_end = min(stsd_end, entry_start + entry_size)
+        for box_type, start, end in _iter_boxes(
+            f, entry_start + _VISUAL_SAMPLE_ENTRY_SIZE, entry_end
+        ):
+            if box_type == b"hvcC":
+                pix_fmt = _hevc_pix_fmt(_read(f, start, end))
+                break
+
+    stts_start, stts_end = _find_box(f, stbl_start, stbl_end, b"stts")
+    fps = _frame_rate(_read(f, stts_start, stts_end), timescale)
+    return VideoInfo(codec, width, height, fps, duration / timescale, pix_fmt)
+
+
+def read_video_info(path: str | PathLike) -> VideoInfo | None:
+    """
+    Read the first video track's properties from an MP4/MOV file's boxes.
+
+    Returns:
+        None if the file isn't an MP4/MOV this reader can handle (or can't be read).
+    """
+    try:
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            moov_start, moov_end = _find_box(f, 0, file_size, b"moov")
+            for box_type, trak_start, trak_end in _iter_boxes(f, moov_start, moov_end):
+                if box_type != b"trak":
+                    continue
+                mdia_start, mdia_end = _find_box(f, trak_start, trak_end, b"mdia")
+                if _handler_type(f, mdia_start, mdia_end) == b"vide":
+                    return _read_video_track(f, mdia_start, mdia_end)
+    except (OSError, _UnsupportedError, struct.error):
+        return None
+    return None
+
+
+def video_info(path: str | PathLike) -> VideoInfo | None:
+    """
+    Return the first video stream's properties, reading the boxes or else with ffprobe.
+
+    Returns:
+        None if neither can read the video.
+    """
+    info = read_video_info(path)
+    if info is not None:
+        return info
+    return video_info_from_probe(
+        probe.probe(
+            path, FFPROBE_STREAM_ENTRIES, FFPROBE_FORMAT_ENTRIES, select_streams="v:0"
+        )
+    )
+
+
+def video_info_from_probe(output: dict) -> VideoInfo | None:
+    """
+    Return the first stream's properties from ffprobe's output, which must be a video stream.
+
+    Returns:
+        None if ffprobe couldn't read the video, or was not asked for the entries needed.
+    """
+    streams = output.get("streams")
+    if not streams:
+        return None
+    stream = streams[0]
+    try:
+        duration = stream.get("duration") or output["format"]["duration"]
+        return VideoInfo(
+            stream["codec_name"],
+            int(stream["width"]),
+            int(stream["height"]),
+            float(Fraction(stream["r_frame_rate"])),
+            float(duration),
+            stream.get("pix_fmt"),
+        )
+    except (KeyError, ValueError, ZeroDivisionError):
+        return None
@@ -0,0 +1,286 @@
+"""
+Persistent cache of exiftool metadata, so unchanged files are never read twice.
+
+Entries are keyed on the file's real path, size, modification time and inode,
+together with the exiftool arguments used to read it (e.g. the tags requested).
+Any change to the file invalidates its entry.
+
+Example:
+    with MetadataCache() as cache, ExifTool(cache=cache) as et:
+        metadata = et.get_metadata_batch(files)  # only cache misses go to exiftool
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from os import PathLike
+from pathlib import Path
+from typing import Any
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Evict this fraction more than needed, so the following inserts don't have to evict again.
+_EVICT_HEADROOM = 0.1
+
+# Check the size of the database after this many inserted entries (and on close), not on every insert.
+_BYTES_CHECK_EVERY = 1000
+
+# SQLite limits the number of host parameters in a single statement.
+_QUERY_CHUNK_SIZE = 500
+
+
+def default_cache_path() -> Path:
+    if platform.system() == "Windows":
+        cache_dir = os.environ.get("LOCALAPPDATA", Path.home() / "AppData" / "Local")
+    else:
+        cache_dir = os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")
+    return Path(cache_dir) / "camera-tools" / "exiftool_metadata.sqlite"
+
+
+def _file_key(filename: str | bytes | PathLike) -> tuple[str, int, int, int] | None:
+    try:
+        realpath = os.path.realpath(os.fsdecode(filename))
+        stat = Path(realpath).stat()
+    except (OSError, ValueError):
+        return None
+    return realpath, stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+def _source_file(filename: str | bytes | PathLike) -> str:
+    # exiftool reports Windows paths with forward slashes.
+    return os.fsdecode(filename).replace("\\", "/")
+
+
+class MetadataCache:
+    """
+    SQLite-backed cache of exiftool JSON records.
+
+    The least recently used entries are evicted when there are more than `max_entries`,
+    or when the entries take more than `max_bytes` in the database file.
+    The size is only checked every 1000 inserted entries and on close, so it may briefly
+    exceed `max_bytes` by that many entries.
+    With `refresh=True`, every file is read again and the cache is overwritten.
+    An instance can be shared between threads, e.g. the processes of an `ExifToolPool`.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike | None = None,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        refresh: bool = False,
+    ):
+        if path is None:
+            path = default_cache_path()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS metadata (
+                path TEXT NOT NULL,
+                args TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (path, args)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS metadata_last_used ON metadata (last_used)"
+        )
+        self._conn.commit()
+        # An upper bound, kept up to date without counting: replaced entries are added again.
+        self._n_entries = self._count()
+        self._unchecked_entries = 0
+
+    def close(self):
+        with self._lock:
+            if self._unchecked_entries:
+                with self._conn:
+                    self._check_size()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def _used_bytes(self) -> int:
+        page_size, page_count, freelist_count = (
+            self._conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+            for pragma in ("page_size", "page_count", "freelist_count")
+        )
+        return page_size * (page_count - freelist_count)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM metadata")
+            self._n_entries = 0
+
+    def invalidate(self, filenames: Iterable[str | bytes | PathLike]):
+        """
+        Drop the entries of `filenames`, e.g. after writing to them.
+
+        Writing with exiftool `-P -overwrite_original_in_place` may keep the size,
+        modification time and inode, so the entries wouldn't be invalidated otherwise.
+        """
+        paths = [(os.path.realpath(os.fsdecode(filename)),) for filename in filenames]
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "DELETE FROM metadata WHERE path = ?", paths
+            )
+            self._n_entries -= cursor.rowcount
+
+    def fetch(
+        self,
+        filenames: Iterable[str | bytes | PathLike],
+        args: Sequence[str | bytes],
+        read_files: Callable[[list], list[dict[str, Any]]],
+    ) -> list[dict[str, Any]]:
+        """
+        Return the exiftool records of `filenames`, calling `read_files` only for the cache misses.
+
+        Args:
+            filenames: Files to read.
+            args: The exiftool arguments that, besides the file names, determine the output.
+                Records read with different arguments are cached separately.
+            read_files: Reads a list of files with exiftool, returning records with `SourceFile`.
+                Files it returns no record for (unreadable, or not matching an `-if` condition)
+                are remembered as such, and left out of the result.
+        """
+        filenames = list(filenames)
+        keys = [_file_key(filename) for filename in filenames]
+        args_key = "\0".join(os.fsdecode(arg) for arg in args)
+
+        cached = {} if self.refresh else self._get_many(keys, args_key)
+        # Files that can't be stat'ed can't be read by exiftool either, which would skip them.
+        misses = [
+            filename
+            for filename, key in zip(filenames, keys, strict=True)
+            if key is not None and key[0] not in cached
+        ]
+        fetched: dict[str, dict[str, Any]] = {}
+        if misses:
+            records = read_files(misses)
+            if len(records) == len(misses):
+                for filename, record in zip(misses, records, strict=True):
+                    fetched[_source_file(filename)] = record
+            else:
+                # exiftool skips files it can't read, so match on the reported name.
+                fetched = {record["SourceFile"]: record for record in records}
+            self._put_many(
+                [
+                    (key, fetched.get(_source_file(filename)))
+                    for filename, key in zip(filenames, keys, strict=True)
+                    if key is not None and key[0] not in cached
+                ],
+                args_key,
+            )
+
+        result = []
+        for filename, key in zip(filenames, keys, strict=True):
+            source_file = _source_file(filename)
+            if source_file in fetched:
+                result.append(fetched[source_file])
+            elif key is not None and key[0] in cached:
+                record = json.loads(cached[key[0]])
+                if record is not None:
+                    record["SourceFile"] = source_file
+                    result.append(record)
+        return result
+
+    def _get_many(
+        self, keys: list[tuple[str, int, int, int] | None], args_key: str
+    ) -> dict[str, str]:
+        wanted = {key[0]: key for key in keys if key is not None}
+        paths = list(wanted)
+        hits: dict[str, str] = {}
+        with self._lock, self._conn:
+            for start in range(0, len(paths), _QUERY_CHUNK_SIZE):
+                chunk = paths[start : start + _QUERY_CHUNK_SIZE]
+                rows = self._conn.execute(
+                    "SELECT path, size, mtime_ns, inode, data FROM metadata "
+                    f"WHERE args = ? AND path IN ({','.join('?' * len(chunk))})",
+                    [args_key, *chunk],
+                )
+                for path, size, mtime_ns, inode, data in rows:
+                    if wanted[path] == (path, size, mtime_ns, inode):
+                        hits[path] = data
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE metadata SET last_used = ? WHERE path = ? AND args = ?",
+                [(now, path, args_key) for path in hits],
+            )
+        return hits
+
+    def _put_many(
+        self,
+        entries: list[tuple[tuple[str, int, int, int], dict[str, Any] | None]],
+        args_key: str,
+    ):
+        if not entries:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (path, args_key, size, mtime_ns, inode, json.dumps(record), now)
+                    for (path, size, mtime_ns, inode), record in entries
+                ],
+            )
+            self._n_entries += len(entries)
+            self._unchecked_entries += len(entries)
+            if (
+                self._n_entries > self.max_entries
+                or self._unchecked_entries >= _BYTES_CHECK_EVERY
+            ):
+                self._check_size()
+
+    def _check_size(self):
+        self._unchecked_entries = 0
+        used_bytes = self._used_bytes()
+        if self._n_entries > self.max_entries or used_bytes > self.max_bytes:
+            self._evict(used_bytes)
+
+    def _evict(self, used_bytes: int):
+        self._n_entries = self._count()
+        # Assume entries of about the same size to estimate how many fit in `max_bytes`.
+        fitting = min(
+            self.max_entries, self._n_entries * self.max_bytes // max(used_bytes, 1)
+        )
+        if fitting >= self._n_entries:
+            return
+        n_evict = self._n_entries - int(fitting * (1 - _EVICT_HEADROOM))
+        self._conn.execute(
+            "DELETE FROM metadata WHERE rowid IN "
+            "(SELECT rowid FROM metadata ORDER BY last_used LIMIT ?)",
+            (n_evict,),
+        )
+        self._n_entries -= n_evict
@@ -0,0 +1,131 @@
+"""
+Shared ffprobe wrapper: only the needed entries, memoised per file, run concurrently.
+
+`probe()` asks ffprobe for just the requested entries (`-show_entries`, `-select_streams`),
+which is much cheaper than `-show_streams -show_format`, and memoises the result on the
+file's path, size and modification time, so probing the same file again is free.
+`probe_many()` runs probes in a bounded thread pool, since ffprobe takes one file per run.
+
+Example:
+    # height and frame rate of the first video stream
+    info = probe(path, ["height", "r_frame_rate"], select_streams="v:0")
+    height = int(info["streams"][0]["height"])
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import subprocess
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from os import PathLike
+from typing import Any
+
+FFPROBE = ["ffprobe", "-v", "error", "-print_format", "json"]
+
+DEFAULT_MEMO_SIZE = 4096
+
+
+def _show_params(
+    stream_entries: Sequence[str] | None,
+    format_entries: Sequence[str] | None,
+    stream_tags: Sequence[str] | None,
+) -> list[str]:
+    if not (stream_entries or format_entries or stream_tags):
+        return ["-show_streams", "-show_format"]
+    sections = []
+    if stream_entries:
+        sections.append("stream=" + ",".join(stream_entries))
+    if stream_tags:
+        sections.append("stream_tags=" + ",".join(stream_tags))
+    if format_entries:
+        sections.append("format=" + ",".join(format_entries))
+    return ["-show_entries", ":".join(sections)]
+
+
+@functools.lru_cache(maxsize=DEFAULT_MEMO_SIZE)
+def _probe(
+    path: str, size: int, mtime_ns: int, params: tuple[str, ...]
+) -> dict[str, Any]:
+    # size and mtime_ns are only part of the memo key
+    proc = subprocess.run(
+        [*FFPROBE, *params, path], stdout=subprocess.PIPE, check=False
+    )
+    return json.loads(proc.stdout.decode("utf-8") or "{}")
+
+
+def probe(
+    path: str | PathLike,
+    stream_entries: Sequence[str] | None = None,
+    format_entries: Sequence[str] | None = None,
+    *,
+    stream_tags: Sequence[str] | None = None,
+    select_streams: str | None = None,
+) -> dict[str, Any]:
+    """
+    Run ffprobe on a file and return its JSON output, e.g. `{"streams": [{"height": 1080}]}`.
+
+    Without any entries, all streams and the format are shown, like `-show_streams -show_format`.
+
+    Args:
+        stream_entries: Stream entries to show (e.g. `["codec_name", "height"]`).
+        format_entries: Format entries to show (e.g. `["duration"]`).
+        stream_tags: Stream tags to show (e.g. `["title"]`), under each stream's "tags".
+        select_streams: Only show these streams (e.g. "v:0" for the first video stream).
+
+    Returns:
+        ffprobe's output, `{}` (or without "streams") if the file can't be read.
+        Results are memoised and shared, so don't modify them.
+    """
+    params = _show_params(stream_entries, format_entries, stream_tags)
+    if select_streams is not None:
+        params += ["-select_streams", select_streams]
+    path = os.fspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return _probe.__wrapped__(path, -1, -1, tuple(params))
+    return _probe(os.path.realpath(path), stat.st_size, stat.st_mtime_ns, tuple(params))
+
+
+def probe_many(
+    paths: Iterable[str | PathLike],
+    stream_entries: Sequence[str] | None = None,
+    format_entries: Sequence[str] | None = None,
+    *,
+    stream_tags: Sequence[str] | None = None,
+    select_streams: str | None = None,
+    workers: int | None = None,
+) -> Iterator[tuple[str | PathLike, dict[str, Any]]]:
+    """
+    Yield `(path, probe(path, ...))` in input order, running `workers` ffprobes at a time.
+
+    Only a couple of probes per worker are in flight, so `paths` can be a long iterator.
+    It can also be used just to warm the memo, e.g. `for _ in probe_many(paths): pass`.
+    """
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    kwargs = {
+        "stream_entries": stream_entries,
+        "format_entries": format_entries,
+        "stream_tags": stream_tags,
+        "select_streams": select_streams,
+    }
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for path in paths:
+            pending.append((path, executor.submit(probe, path, **kwargs)))
+            if len(pending) >= 2 * workers:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+
+def clear_memo():
+    """Forget every memoised result."""
+    _probe.cache_clear()
@@ -0,0 +1,215 @@
+"""
+Append-only journal of file renames, so an interrupted run can be resumed or undone.
+
+Each run first records every rename it intends to do, then each rename as it is done.
+Records are JSON lines, synced to disk once per batch of renames rather than per line,
+so a killed run loses at most the last batch of "done" records, which are recovered
+by checking which names exist on disk.
+
+The journal is read once, when `RenameJournal` is created. Once every run in it has ended,
+the next run starts the file afresh, so it only keeps the runs still needed:
+the last one (to undo it) and any interrupted or partly undone ones (to finish them).
+
+Records:
+    {"run": 1, "op": "plan", "src": "/photos/IMG_0001.JPG", "dst": "/photos/20240101_090000.12.JPG"}
+    {"run": 1, "op": "done", "src": ..., "dst": ...}
+    {"run": 1, "op": "end"}
+    {"run": 1, "op": "undone", "src": ..., "dst": ...}
+    {"run": 1, "op": "undo_end"}
+
+Example:
+    journal = RenameJournal(".datename_journal.jsonl")
+    interrupted = [run for run in journal.runs if run.interrupted]
+    with journal:
+        journal.begin(renames)
+        for src, dst in renames:
+            os.rename(src, dst)
+            journal.done(src, dst)
+        journal.end()
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from os import PathLike
+
+DEFAULT_FSYNC_EVERY = 256
+DEFAULT_FSYNC_INTERVAL = 1.0
+
+
+@dataclass
+class JournalRun:
+    run: int
+    renames: list[tuple[str, str]] = field(default_factory=list)
+    done: set[tuple[str, str]] = field(default_factory=set)
+    undone: set[tuple[str, str]] = field(default_factory=set)
+    ended: bool = False
+    undo_ended: bool = False
+
+    @property
+    def interrupted(self) -> bool:
+        """Killed before all its renames were done (and not undone since)."""
+        return not self.ended and not self.undo_ended
+
+    @property
+    def undoable(self) -> bool:
+        return not self.undo_ended and bool(self.renames)
+
+    @property
+    def finished(self) -> bool:
+        """Neither interrupted nor partly undone, so only needed to undo it."""
+        return self.undo_ended or (self.ended and not self.undone)
+
+
+def read_journal(path: str | PathLike) -> list[JournalRun]:
+    """
+    Read the runs recorded in a journal, oldest first.
+
+    A truncated last line (from a crash while writing it) is ignored.
+    """
+    runs: dict[int, JournalRun] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                run = runs.setdefault(record["run"], JournalRun(record["run"]))
+                op = record["op"]
+                if op == "plan":
+                    run.renames.append((record["src"], record["dst"]))
+                elif op == "done":
+                    run.done.add((record["src"], record["dst"]))
+                elif op == "end":
+                    run.ended = True
+                elif op == "undone":
+                    run.undone.add((record["src"], record["dst"]))
+                elif op == "undo_end":
+                    run.undo_ended = True
+    except FileNotFoundError:
+        return []
+    return list(runs.values())
+
+
+def _ends_with_newline(path: str | PathLike) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class RenameJournal:
+    """
+    Appends records to a journal file, for a new run (`self.run`) or to resume or undo an old one.
+
+    The runs already in the file are read once, into `self.runs`, and kept up to date
+    with the records of the old runs written since.
+
+    Args:
+        path: Journal file, created when it is opened if it doesn't exist.
+        fsync_every: Sync to disk after this many "done"/"undone" records...
+        fsync_interval: ...or this many seconds since the last sync, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        path: str | PathLike,
+        *,
+        fsync_every: int = DEFAULT_FSYNC_EVERY,
+        fsync_interval: float = DEFAULT_FSYNC_INTERVAL,
+    ):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.runs = read_journal(path)
+        self.run = max((run.run for run in self.runs), default=0) + 1
+        self._runs_by_number = {run.run: run for run in self.runs}
+        self._f = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def open(self):
+        # Closed by `close()`, which `__exit__` calls.
+        self._f = open(self.path, "a", encoding="utf-8")  # noqa: SIM115
+        if self._f.tell() > 0 and not _ends_with_newline(self.path):
+            # End the line cut off by a crash, so the next record isn't appended to it.
+            self._f.write("\n")
+
+    def close(self):
+        if self._f is not None:
+            self.sync()
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, op: str, run: int | None, **fields):
+        record = {"run": self.run if run is None else run, "op": op, **fields}
+        self._f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def sync(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _old_run(self, run: int | None) -> JournalRun | None:
+        """The record of an old run being resumed or undone, to keep up to date."""
+        return None if run is None else self._runs_by_number.get(run)
+
+    def _record(
+        self, op: str, src: str | PathLike, dst: str | PathLike, run: int | None
+    ):
+        self._write(op, run, src=os.fspath(src), dst=os.fspath(dst))
+        self._unsynced += 1
+        if (
+            self._unsynced >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def begin(self, renames: Iterable[tuple[str | PathLike, str | PathLike]]):
+        """
+        Record every rename of the new run, before doing any of them.
+
+        If every old run is finished, the file is emptied first: the new run becomes the one to undo.
+        """
+        if all(run.finished for run in self.runs):
+            self._f.truncate(0)
+            self.runs = []
+            self._runs_by_number = {}
+        for src, dst in renames:
+            self._write("plan", None, src=os.fspath(src), dst=os.fspath(dst))
+        self.sync()
+
+    def done(self, src: str | PathLike, dst: str | PathLike, run: int | None = None):
+        self._record("done", src, dst, run)
+        if (old_run := self._old_run(run)) is not None:
+            old_run.done.add((os.fspath(src), os.fspath(dst)))
+
+    def end(self, run: int | None = None):
+        self._write("end", run)
+        self.sync()
+        if (old_run := self._old_run(run)) is not None:
+            old_run.ended = True
+
+    def undone(self, src: str | PathLike, dst: str | PathLike, run: int | None = None):
+        """Record that the rename `src -> dst` was reverted (`dst -> src`)."""
+        self._record("undone", src, dst, run)
+        if (old_run := self._old_run(run)) is not None:
+            old_run.undone.add((os.fspath(src), os.fspath(dst)))
+
+    def undo_end(self, run: int | None = None):
+        self._write("undo_end", run)
+        self.sync()
+        if (old_run := self._old_run(run)) is not None:
+            old_run.undo_ended = True
@@ -0,0 +1,69 @@
+"""
+File birth (creation) time, also on Linux, where `os.stat()` doesn't report it.
+
+On Linux, `statx(2)` is called through ctypes (glibc 2.28+). Elsewhere, `os.stat()` already has it
+(`st_birthtime` on macOS/BSD, `st_ctime` on Windows). The file system has to record it too:
+ext4, btrfs, xfs and exFAT do, but tmpfs, older ext4 and many network file systems don't.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import os
+import platform
+import struct
+import sys
+from os import PathLike
+
+_AT_FDCWD = -100
+_STATX_BTIME = 0x800
+# sizeof(struct statx)
+_STATX_SIZE = 256
+# stx_btime is a struct statx_timestamp: tv_sec (s64), tv_nsec (u32)
+_STX_BTIME_OFFSET = 80
+
+
+def _load_statx():
+    if sys.platform != "linux":
+        return None
+    try:
+        statx = ctypes.CDLL(None, use_errno=True).statx
+    except (OSError, AttributeError):  # e.g. musl, older glibc
+        return None
+    statx.argtypes = [
+        ctypes.c_int,
+        ctypes.c_char_p,
+        ctypes.c_int,
+        ctypes.c_uint,
+        ctypes.c_void_p,
+    ]
+    statx.restype = ctypes.c_int
+    return statx
+
+
+_statx = _load_statx()
+
+
+def birth_time(path: str | PathLike) -> float | None:
+    """
+    Return when a file was created, as a timestamp like `os.stat().st_mtime`.
+
+    Returns:
+        None if the file system (or the OS) doesn't record it.
+    """
+    if _statx is not None:
+        buffer = ctypes.create_string_buffer(_STATX_SIZE)
+        if _statx(_AT_FDCWD, os.fsencode(path), 0, _STATX_BTIME, buffer) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), os.fspath(path))
+        (mask,) = struct.unpack_from("=I", buffer, 0)
+        if not mask & _STATX_BTIME:
+            return None
+        seconds, nanoseconds = struct.unpack_from("=qI", buffer, _STX_BTIME_OFFSET)
+        return seconds + nanoseconds / 1e9
+
+    stat = os.stat(path)
+    birthtime = getattr(stat, "st_birthtime", None)
+    if birthtime is None and platform.system() == "Windows":
+        return stat.st_ctime
+    return birthtime
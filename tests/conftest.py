@@ -0,0 +1,15 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from camera_tools import exiftool
+
+
+@pytest.fixture
+def fake_exiftool(monkeypatch):
+    """Path of a fake exiftool (see fake_exiftool.py), never shared through the exiftool server."""
+    if os.name == "nt":
+        pytest.skip("the fake exiftool is a script run by its shebang")
+    monkeypatch.setattr(exiftool, "server_mode", "never")
+    return str(Path(__file__).with_name("fake_exiftool.py"))
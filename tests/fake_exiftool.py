@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+A fake exiftool for the tests, speaking the `-stay_open True -@ -` protocol of the real one.
+
+What a file reads as is given by its content:
+    FAKE{"EXIF:Make": "Canon"}  these tags
+    BIN<data>                   an EXIF:PreviewImage of <data>, extracted with -b
+    ERROR<message>              an ExifTool:Error
+    HANG                        exiftool hangs reading it
+    CRASH                       exiftool dies reading it
+Every file also has File:FileSize. Missing files are skipped with an error on stderr, like exiftool.
+In directories, only the SUPPORTED_EXTENSIONS are read (-listf), unless -ext is given.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+out = sys.stdout.buffer
+
+# Read in directories unless -ext says otherwise.
+SUPPORTED_EXTENSIONS = ["CR3", "JPG", "MOV", "MP4", "MTS"]
+
+
+def read_tags(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, None
+    tags = {"SourceFile": path, "File:FileSize": len(data)}
+    blob = None
+    if data.startswith(b"FAKE"):
+        tags.update(json.loads(data[4:].split(b"\n")[0]))
+    elif data.startswith(b"BIN"):
+        blob = data[3:]
+        tags["EXIF:PreviewImage"] = (
+            f"(Binary data {len(blob)} bytes, use -b option to extract)"
+        )
+    elif data.startswith(b"ERROR"):
+        tags["ExifTool:Error"] = data[5:].decode()
+    elif data.startswith(b"HANG"):
+        time.sleep(1000)
+    elif data.startswith(b"CRASH"):
+        os._exit(3)
+    return tags, blob
+
+
+def matches(condition, tags):
+    # Enough of exiftool's Perl conditions for the tests: $Tag, eq, ne, and, or.
+    def value(name):
+        for key, tag_value in tags.items():
+            if key.rpartition(":")[2] == name.rpartition(":")[2]:
+                return tag_value
+        return None
+
+    expression = re.sub(r"\$([\w:]+)", lambda m: f"value({m.group(1)!r})", condition)
+    expression = expression.replace(" eq ", " == ").replace(" ne ", " != ")
+    return bool(eval(expression, {"value": value}))
+
+
+def is_selected(tag, wanted):
+    return tag == "SourceFile" or any(
+        tag == name or tag.rpartition(":")[2] == name.rpartition(":")[2]
+        for name in wanted
+    )
+
+
+def walk(root, recursive, extensions, excluded):
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories.sort()
+        for name in sorted(names):
+            extension = name.rpartition(".")[2].lower()
+            wanted = extensions or {e.lower() for e in SUPPORTED_EXTENSIONS}
+            if extension in excluded or extension not in wanted:
+                continue
+            yield (Path(directory) / name).as_posix()
+        if not recursive:
+            return
+
+
+def write_tags(files, assignments, error_file):
+    written = [f for f in files if Path(f).exists()]
+    failed = [f for f in files if not Path(f).exists()]
+    for f in written:
+        with open(f, "ab") as fh:
+            fh.write(("\n" + ";".join(assignments)).encode())
+    if error_file is not None:
+        with open(error_file, "w") as fh:
+            fh.writelines(f + "\n" for f in failed)
+    out.write(f"    {len(written)} image files updated\n".encode())
+    if failed:
+        out.write(f"    {len(failed)} files weren't updated due to errors\n".encode())
+
+
+def run(args):
+    files, wanted, assignments = [], [], []
+    json_output = binary = recursive = False
+    condition = error_file = None
+    extensions, excluded = set(), set()
+    arguments = iter(args)
+    for arg in arguments:
+        if arg in ("-G", "-n", "-fast", "-fast2", "-P", "-overwrite_original_in_place"):
+            pass
+        elif arg == "-listf":
+            out.write(
+                f"Supported file extensions:\n  {' '.join(SUPPORTED_EXTENSIONS)}\n".encode()
+            )
+            return
+        elif arg in ("-api", "-charset", "-fileOrder"):
+            next(arguments)
+        elif arg == "-efile!":
+            error_file = next(arguments)
+        elif arg == "-j":
+            json_output = True
+        elif arg == "-b":
+            binary = True
+        elif arg == "-r":
+            recursive = True
+        elif arg == "-ext":
+            extensions.add(next(arguments).lower())
+        elif arg == "--ext":
+            excluded.add(next(arguments).lower())
+        elif arg == "-if":
+            condition = next(arguments)
+        elif arg.startswith("-") and "=" in arg:
+            assignments.append(arg[1:])
+        elif arg.startswith("-"):
+            wanted.append(arg[1:])
+        elif Path(arg).is_dir():
+            files.extend(walk(arg, recursive, extensions, excluded))
+        else:
+            files.append(arg)
+
+    if assignments:
+        write_tags(files, assignments, error_file)
+        return
+    records = []
+    for f in files:
+        tags, blob = read_tags(f)
+        if tags is None:
+            sys.stderr.write(f"Error: File not found - {f}\n")
+            continue
+        if condition is not None and not matches(condition, tags):
+            continue
+        if binary:
+            if blob is not None:
+                out.write(blob)
+            continue
+        if wanted:
+            tags = {k: v for k, v in tags.items() if is_selected(k, wanted)}
+        records.append(tags)
+    if json_output and records:
+        # Flushed record by record, as exiftool prints them.
+        for i, tags in enumerate(records):
+            out.write(
+                (("[" if i == 0 else ",\n") + json.dumps(tags, indent=2)).encode()
+            )
+            out.flush()
+        out.write(b"]\n")
+
+
+def main():
+    args = sys.argv[1:]
+    common_args = (
+        args[args.index("-common_args") + 1 :] if "-common_args" in args else []
+    )
+    command = []
+    for line in sys.stdin.buffer:
+        line = line.rstrip(b"\n").decode("utf-8", "surrogateescape")
+        if line.startswith("-execute"):
+            run(command + common_args)
+            command = []
+            out.write(b"{ready" + line[len("-execute") :].encode() + b"}\n")
+            out.flush()
+        elif line == "-stay_open":
+            pass
+        elif line == "False" and not command:
+            return
+        else:
+            command.append(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import pytest
+
+from camera_tools.cli.datename import parse_exif_date
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        # Naive without a time zone
+        ("2024:01:01 09:00:00", "2024-01-01T09:00:00"),
+        ("2024:01:01 09:00:00.12", "2024-01-01T09:00:00.120000"),
+        # More digits than microseconds
+        ("2024:01:01 09:00:00.1234567", "2024-01-01T09:00:00.123456"),
+        ("2024:01:01 09:00:00.12+09:00", "2024-01-01T09:00:00.120000+09:00"),
+        ("2024:01:01 09:00:00+0900", "2024-01-01T09:00:00+09:00"),
+        ("2024:01:01 09:00:00+09", "2024-01-01T09:00:00+09:00"),
+        ("2024:01:01 09:00:00-05:30", "2024-01-01T09:00:00-05:30"),
+        ("2024:01:01 09:00:00Z", "2024-01-01T09:00:00+00:00"),
+        # XMP
+        ("2024-01-01T09:00:00.5Z", "2024-01-01T09:00:00.500000+00:00"),
+        # H264:DateTimeOriginal
+        ("2024:01:01 09:00:00+09:00 DST", "2024-01-01T09:00:00+09:00"),
+        ("2024:01:01 09:00:00 DST", "2024-01-01T09:00:00"),
+    ],
+)
+def test_parse_exif_date(value, expected):
+    assert parse_exif_date(value).isoformat() == expected
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "0000:00:00 00:00:00",
+        "2024:13:01 09:00:00",
+        "2024:01:01",
+        "",
+        "2024:01:01 09:00:00abc",
+        "2024:01:01 09:00:00+9",
+        "2024:01:01 09:00:00+09:0",
+        "2024:01:01 09:00:00+ab:cd",
+        "not a date at all, but long",
+    ],
+)
+def test_parse_exif_date_rejects(value):
+    assert parse_exif_date(value) is None
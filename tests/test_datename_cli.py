@@ -0,0 +1,68 @@
+import pytest
+
+from camera_tools.cli.datename import JOURNAL_FILENAME
+from camera_tools.cli.main import app
+from camera_tools.rename_journal import RenameJournal
+
+
+def test_exif_date_key_does_not_consume_input_files():
+    _, bound, _ = app.parse_args(
+        ["datename", "--exif-date-key", "H264:DateTimeOriginal", "a.MTS", "b.MTS"]
+    )
+    assert bound.args == (["a.MTS", "b.MTS"],)
+    assert bound.kwargs["exif_date_key"] == ["H264:DateTimeOriginal"]
+
+
+def test_exif_date_key_repeated_for_a_chain():
+    _, bound, _ = app.parse_args(
+        [
+            "datename",
+            "--exif-date-key",
+            "Composite:SubSecCreateDate",
+            "--exif-date-key",
+            "XML:CreationDateValue",
+            "DCIM",
+        ]
+    )
+    assert bound.args == (["DCIM"],)
+    assert bound.kwargs["exif_date_key"] == [
+        "Composite:SubSecCreateDate",
+        "XML:CreationDateValue",
+    ]
+
+
+def test_no_input_files_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(ValueError, match="No input files"):
+        app(["datename"], exit_on_error=False)
+
+
+def test_ext_does_not_consume_input_files():
+    _, bound, _ = app.parse_args(
+        ["datename", "--ext", "JPG", "--ext", "MP4", "DCIM", "-r"]
+    )
+    assert bound.args == (["DCIM"],)
+    assert bound.kwargs["ext"] == ["JPG", "MP4"]
+
+
+def test_undo_dry_run_only_prints(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "IMG_0001.JPG"
+    target = tmp_path / "20240101_090000.12+0900.JPG"
+    target.write_bytes(b"jpeg")
+    with RenameJournal(JOURNAL_FILENAME) as journal:
+        journal.begin([(source, target)])
+        journal.done(source, target)
+        journal.end()
+    journal_before = (tmp_path / JOURNAL_FILENAME).read_text()
+
+    app(
+        ["datename", "--undo-last", "--dry-run"],
+        exit_on_error=False,
+        result_action="return_value",
+    )
+
+    assert f"{target} -> {source}" in capsys.readouterr().out
+    assert target.exists()
+    assert not source.exists()
+    assert (tmp_path / JOURNAL_FILENAME).read_text() == journal_before
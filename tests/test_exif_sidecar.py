@@ -0,0 +1,62 @@
+import sqlite3
+
+from camera_tools.exif_sidecar import (
+    ExifSidecar,
+    ExifSidecars,
+    lookup_exif,
+    sidecar_path,
+)
+
+
+def _saved_names(directory):
+    """The names committed to a directory's store, as another process would see them."""
+    with sqlite3.connect(sidecar_path(directory)) as conn:
+        return sorted(name for (name,) in conn.execute("SELECT name FROM exif"))
+
+
+def test_put_and_get(tmp_path):
+    with ExifSidecars() as sidecars:
+        sidecars.put(tmp_path / "a.JPG", {"EXIF:Make": "Canon"})
+        assert sidecars.get(tmp_path / "a.JPG") == {"EXIF:Make": "Canon"}
+        assert sidecars.get(tmp_path / "b.JPG") is None
+
+    assert lookup_exif(tmp_path / "a.JPG") == {"EXIF:Make": "Canon"}
+    assert lookup_exif(tmp_path / "sub" / "a.JPG") is None
+    # Looking up doesn't create a store.
+    assert not sidecar_path(tmp_path / "sub").exists()
+
+
+def test_deletes_are_batched_like_puts(tmp_path):
+    with ExifSidecar(tmp_path, batch_size=3) as store:
+        for name in "abcd":
+            store.put(name, {"File:FileName": name})
+        store.flush()
+
+        store.delete("a")
+        store.delete("b")
+        # Not committed yet, but already gone for this store.
+        assert _saved_names(tmp_path) == ["a", "b", "c", "d"]
+        assert store.get("a") is None
+
+        store.delete("c")
+        # The batch of 3 was committed.
+        assert _saved_names(tmp_path) == ["d"]
+
+        store.put("a", {"File:FileName": "a again"})
+        store.delete("e")  # never saved
+
+    # The rest on close.
+    assert _saved_names(tmp_path) == ["a", "d"]
+    assert lookup_exif(tmp_path / "a") == {"File:FileName": "a again"}
+
+
+def test_move_between_directories(tmp_path):
+    (tmp_path / "dst").mkdir()
+    with ExifSidecars() as sidecars:
+        sidecars.put(tmp_path / "a.JPG", {"EXIF:Make": "Canon"})
+        assert sidecars.copy(tmp_path / "a.JPG", tmp_path / "dst" / "b.JPG", move=True)
+        assert not sidecars.copy(tmp_path / "a.JPG", tmp_path / "dst" / "c.JPG")
+        assert sidecars.get(tmp_path / "a.JPG") is None
+
+    assert _saved_names(tmp_path) == []
+    assert lookup_exif(tmp_path / "dst" / "b.JPG") == {"EXIF:Make": "Canon"}
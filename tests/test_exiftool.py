@@ -0,0 +1,263 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from camera_tools import exiftool
+from camera_tools.metadata_cache import MetadataCache
+
+
+@pytest.fixture
+def et(fake_exiftool):
+    with exiftool.ExifTool(fake_exiftool, timeout=10) as et:
+        yield et
+
+
+def test_extract_binary_batch(et, tmp_path):
+    (tmp_path / "a.CR3").write_bytes(b"BIN" + bytes(range(256)) * 3)
+    (tmp_path / "b.CR3").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    (tmp_path / "c.CR3").write_bytes(b"BIN\n\n")
+
+    files = [str(tmp_path / name) for name in ("a.CR3", "b.CR3", "c.CR3")]
+    result = [
+        (f, bytes(data)) for f, data in et.extract_binary_batch("PreviewImage", files)
+    ]
+
+    assert result == [(files[0], bytes(range(256)) * 3), (files[2], b"\n\n")]
+
+
+def test_extract_binary_with_ready_in_the_data(et, tmp_path):
+    # "{ready}" right at the end of the first pipe read must not end the output.
+    data = b"x" * (65536 - len(b"{ready}\n")) + b"{ready}\n" + b"y" * 100
+    (tmp_path / "a.CR3").write_bytes(b"BIN" + data)
+
+    [(_, result)] = et.extract_binary_batch("PreviewImage", [str(tmp_path / "a.CR3")])
+
+    assert bytes(result) == data
+    assert et.get_tag("File:FileSize", str(tmp_path / "a.CR3")) == len(data) + 3
+
+
+@pytest.mark.parametrize(
+    "changed", [b"BIN12345", b"BIN" + b"z" * 100_000], ids=["shorter", "longer"]
+)
+def test_extract_binary_of_a_changed_file(et, tmp_path, changed):
+    (tmp_path / "a.CR3").write_bytes(b"BIN" + b"a" * 1000)
+    (tmp_path / "b.CR3").write_bytes(b"BIN" + b"b" * 1000)
+    files = [str(tmp_path / "a.CR3"), str(tmp_path / "b.CR3")]
+
+    binaries = et.extract_binary_batch("PreviewImage", files)
+    assert bytes(next(binaries)[1]) == b"a" * 1000
+    # Changed after its size was read.
+    (tmp_path / "b.CR3").write_bytes(changed)
+    with pytest.raises(RuntimeError, match="expected 1000 bytes"):
+        next(binaries)
+
+    # Restarted, rather than out of step with the rest of the output.
+    assert et.running
+    [(_, result)] = et.extract_binary_batch("PreviewImage", files[:1])
+    assert bytes(result) == b"a" * 1000
+
+
+def _write_batch(tmp_path, bad_index, bad_content, n_files=8):
+    files = []
+    for i in range(n_files):
+        path = tmp_path / f"{i}.JPG"
+        if i == bad_index:
+            path.write_bytes(bad_content)
+        else:
+            path.write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+        files.append(str(path))
+    return files
+
+
+def test_read_batch_isolates_a_file_that_hangs_exiftool(fake_exiftool, tmp_path):
+    files = _write_batch(tmp_path, 5, b"HANG")
+    timeout = 2
+
+    with exiftool.ExifTool(fake_exiftool, timeout=timeout) as et:
+        start = time.monotonic()
+        result = et.read_tags_batch(["EXIF:Make"], files)
+        elapsed = time.monotonic() - start
+
+    assert list(result.errors) == [files[5]]
+    assert [d and d["EXIF:Make"] for d in result.metadata] == [
+        "Canon" if i != 5 else None for i in range(8)
+    ]
+    # The whole batch, then halves sharing one timeout, not a timeout per file.
+    assert elapsed < 2 * timeout + 1
+
+
+def test_read_batch_bisects_a_file_that_crashes_exiftool(
+    fake_exiftool, tmp_path, monkeypatch
+):
+    files = _write_batch(tmp_path, 2, b"CRASH", n_files=16)
+    starts = []
+    start = exiftool.ExifTool.start
+    monkeypatch.setattr(
+        exiftool.ExifTool, "start", lambda et: starts.append(et) or start(et)
+    )
+
+    with exiftool.ExifTool(fake_exiftool) as et:
+        result = et.read_metadata_batch(files)
+
+    assert list(result.errors) == [files[2]]
+    assert sum(d is not None for d in result.metadata) == 15
+    # Restarted after the reads of 16, 8, 4, 2 and 1 files, rather than once per file.
+    assert len(starts) == 1 + 5
+
+
+def test_async_exiftool_pipelines_commands(fake_exiftool, tmp_path):
+    files = _write_batch(tmp_path, None, b"", n_files=4)
+
+    async def read():
+        async with exiftool.AsyncExifTool(fake_exiftool, timeout=10) as et:
+            return await asyncio.gather(
+                et.get_metadata_batch(files[:2]),
+                et.get_tags_batch(["EXIF:Make"], files[2:]),
+            )
+
+    all_tags, make = asyncio.run(read())
+
+    assert [d["SourceFile"] for d in all_tags] == files[:2]
+    assert make == [{"SourceFile": f, "EXIF:Make": "Canon"} for f in files[2:]]
+
+
+def test_async_exiftool_rejects_newlines_in_parameters(fake_exiftool, tmp_path):
+    (tmp_path / "a.JPG").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+
+    async def inject():
+        async with exiftool.AsyncExifTool(fake_exiftool, timeout=10) as et:
+            with pytest.raises(ValueError, match="newlines"):
+                # Would run a second command, writing to the file.
+                await et.execute_json(str(tmp_path / "a.JPG") + "\n-EXIF:Make=Evil")
+            return await et.get_tags_batch(["EXIF:Make"], [str(tmp_path / "a.JPG")])
+
+    assert asyncio.run(inject())[0]["EXIF:Make"] == "Canon"
+
+
+def test_starting_a_running_pool_warns_at_the_caller(fake_exiftool):
+    with (
+        exiftool.ExifToolPool(2, fake_exiftool) as pool,
+        pytest.warns(UserWarning, match="already running") as warnings,
+    ):
+        pool.start()
+
+    assert warnings[0].filename == __file__
+
+
+def test_iter_directory_splits_records_only_at_their_end(et, tmp_path):
+    # Values with "\n}" and nested objects, one spanning several pipe reads.
+    tricky = {
+        "XMP:Description": "a\n}\nb {",
+        "XMP:RegionInfo": {"RegionList": [{"Name": "x", "Area": {"W": 0.5}}]},
+        "XMP:Notes": "}\n" * 50_000,
+    }
+    (tmp_path / "a.JPG").write_bytes(b"FAKE" + json.dumps(tricky).encode())
+    (tmp_path / "b.JPG").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+
+    records = dict(et.iter_directory([str(tmp_path)]))
+
+    assert {k: records[f"{tmp_path}/a.JPG"][k] for k in tricky} == tricky
+    assert records[f"{tmp_path}/b.JPG"]["EXIF:Make"] == "Canon"
+
+
+def test_pool_iter_directory_shards_files_through_the_cache(
+    fake_exiftool, tmp_path, monkeypatch
+):
+    photos = tmp_path / "photos"
+    (photos / "sub").mkdir(parents=True)
+    (photos / ".thumbnails").mkdir()
+    for i in range(8):
+        (photos / f"{i}.JPG").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    (photos / "sub" / "a.CR3").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    (photos / "sub" / "b.JPG").write_bytes(b"ERRORFile format error")
+    (photos / "notes.txt").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    (photos / ".thumbnails" / "0.JPG").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    monkeypatch.setattr(exiftool, "default_chunk_size", 2)
+    readers = []
+    read_files = exiftool.ExifTool._read_files
+    monkeypatch.setattr(
+        exiftool.ExifTool,
+        "_read_files",
+        lambda et, *args: readers.append(et) or read_files(et, *args),
+    )
+    executed = []
+    execute_json = exiftool.ExifTool.execute_json
+    monkeypatch.setattr(
+        exiftool.ExifTool,
+        "execute_json",
+        lambda et, *args, **kwargs: (
+            executed.append(args) or execute_json(et, *args, **kwargs)
+        ),
+    )
+
+    with (
+        MetadataCache(tmp_path / "cache.sqlite") as cache,
+        exiftool.ExifToolPool(3, fake_exiftool, cache=cache) as pool,
+    ):
+        first = list(pool.iter_directory([str(photos)], ["EXIF:Make"]))
+        n_executed = len(executed)
+        second = list(pool.iter_directory([str(photos)], ["EXIF:Make"]))
+
+    expected = [str(photos / f"{i}.JPG") for i in range(8)]
+    expected += [str(photos / "sub" / "a.CR3"), str(photos / "sub" / "b.JPG")]
+    assert [path for path, _ in first] == expected
+    assert first[-1][1] == {
+        "SourceFile": expected[-1],
+        "ExifTool:Error": "File format error",
+    }
+    assert all(d["EXIF:Make"] == "Canon" for _, d in first[:-1])
+    # 5 chunks of 2 files in each pass, spread over every process.
+    assert len(readers) == 2 * 5
+    assert len({id(et) for et in readers}) == 3
+    # Read from the cache the second time.
+    assert second == first
+    assert len(executed) == n_executed
+
+
+def test_set_tags_batch_deletes_its_error_file_on_failure(et, tmp_path, monkeypatch):
+    (tmp_path / "a.JPG").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    temp_dir = tmp_path / "tmp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(exiftool.tempfile, "tempdir", str(temp_dir))
+
+    def fail(output):
+        raise ValueError("unexpected output")
+
+    monkeypatch.setattr(exiftool, "_parse_write_summary", fail)
+    with pytest.raises(ValueError, match="unexpected output"):
+        et.set_tags_batch({str(tmp_path / "a.JPG"): {"EXIF:Artist": "Kiyoon"}})
+
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_pool_set_tags_batch_writes_in_parallel(fake_exiftool, tmp_path, monkeypatch):
+    files = _write_batch(tmp_path, None, b"", n_files=6)
+    mapping = {f: {"EXIF:Artist": "Kiyoon"} for f in files}
+    mapping[files[3]] = {"EXIF:Artist": "Other", "EXIF:Rating": 5}
+    missing = str(tmp_path / "missing.JPG")
+    mapping[missing] = {"EXIF:Artist": "Kiyoon"}
+    writers = []
+    set_tags_batch = exiftool.ExifTool.set_tags_batch
+    monkeypatch.setattr(
+        exiftool.ExifTool,
+        "set_tags_batch",
+        lambda et, shard, **kwargs: (
+            writers.append((et, list(shard))) or set_tags_batch(et, shard, **kwargs)
+        ),
+    )
+
+    with exiftool.ExifToolPool(3, fake_exiftool) as pool:
+        result = pool.set_tags_batch(mapping)
+
+    assert result == {**dict.fromkeys(files, True), missing: False}
+    assert list(result) == list(mapping)
+    assert [shard for _, shard in writers] == [
+        files[:3],
+        files[3:5],
+        [files[5], missing],
+    ]
+    assert len({id(et) for et, _ in writers}) == 3
+    assert (tmp_path / "3.JPG").read_text().endswith("EXIF:Artist=Other;EXIF:Rating=5")
+    assert (tmp_path / "4.JPG").read_text().endswith("EXIF:Artist=Kiyoon")
@@ -0,0 +1,151 @@
+import struct
+
+import pytest
+
+from camera_tools import isobmff, probe
+from camera_tools.isobmff import VideoInfo, read_video_info
+
+
+def box(box_type: bytes, *children: bytes) -> bytes:
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mdhd(timescale: int, duration: int, version: int = 0) -> bytes:
+    if version == 1:
+        times = struct.pack(">QQIQ", 0, 0, timescale, duration)
+    else:
+        times = struct.pack(">IIII", 0, 0, timescale, duration)
+    return box(b"mdhd", bytes([version, 0, 0, 0]), times, bytes(4))
+
+
+def hdlr(handler_type: bytes) -> bytes:
+    return box(b"hdlr", bytes(8), handler_type, bytes(12), b"\0")
+
+
+def sample_entry(entry_format: bytes, width: int, height: int, *children) -> bytes:
+    fields = bytes(6) + struct.pack(">H", 1) + bytes(16)
+    fields += struct.pack(">HH", width, height) + bytes(50)
+    return box(entry_format, fields, *children)
+
+
+def hvcc(chroma_format: int, bit_depth: int) -> bytes:
+    return box(b"hvcC", bytes(16), bytes([0xFC | chroma_format, 0xF8 | bit_depth - 8]))
+
+
+def stts(*entries: tuple[int, int]) -> bytes:
+    table = b"".join(struct.pack(">II", *entry) for entry in entries)
+    return box(b"stts", bytes(4), struct.pack(">I", len(entries)), table)
+
+
+def trak(handler_type: bytes, media_header: bytes, entry: bytes, time_to_sample: bytes):
+    stsd = box(b"stsd", bytes(4), struct.pack(">I", 1), entry)
+    stbl = box(b"stbl", stsd, time_to_sample)
+    return box(
+        b"trak", box(b"mdia", media_header, hdlr(handler_type), box(b"minf", stbl))
+    )
+
+
+def mp4(*traks: bytes) -> bytes:
+    return (
+        box(b"ftyp", b"isom", bytes(4))
+        + box(b"mdat", bytes(100))
+        + box(b"moov", *traks)
+    )
+
+
+AUDIO_TRAK = trak(
+    b"soun", mdhd(48000, 480000), box(b"mp4a", bytes(28)), stts((1, 1024))
+)
+
+
+def test_h264_with_mdhd_version_0(tmp_path):
+    video = trak(
+        b"vide",
+        mdhd(30000, 30000 * 10),
+        sample_entry(b"avc1", 1920, 1080),
+        stts((300, 1001)),
+    )
+    (tmp_path / "a.mp4").write_bytes(mp4(AUDIO_TRAK, video))
+
+    info = read_video_info(tmp_path / "a.mp4")
+
+    assert info == VideoInfo(
+        "h264", 1920, 1080, pytest.approx(29.97, abs=0.01), 10.0, None
+    )
+
+
+def test_hevc_with_mdhd_version_1(tmp_path):
+    video = trak(
+        b"vide",
+        mdhd(25, 2**33, version=1),
+        sample_entry(b"hvc1", 3840, 2160, hvcc(chroma_format=2, bit_depth=10)),
+        # Mostly 1/25 s frames: the most common duration gives the frame rate.
+        stts((1000, 1), (1, 2)),
+    )
+    (tmp_path / "a.mov").write_bytes(mp4(video))
+
+    info = read_video_info(tmp_path / "a.mov")
+
+    assert info == VideoInfo("hevc", 3840, 2160, 25.0, 2**33 / 25, "yuv422p10le")
+
+
+def test_last_box_extending_to_the_end(tmp_path):
+    video = trak(
+        b"vide", mdhd(600, 6000), sample_entry(b"avc1", 640, 480), stts((300, 20))
+    )
+    data = mp4(video)
+    moov_start = data.index(b"moov") - 4
+    # A size of 0 means the box extends to the end of the file.
+    data = data[:moov_start] + bytes(4) + data[moov_start + 4 :]
+    (tmp_path / "a.mp4").write_bytes(data)
+
+    assert read_video_info(tmp_path / "a.mp4") == VideoInfo(
+        "h264", 640, 480, 30.0, 10.0, None
+    )
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda data: data[:-10],  # truncated moov
+        lambda data: data.replace(b"avc1", b"xxxx"),  # unknown codec
+        lambda data: data.replace(b"vide", b"soun"),  # no video track
+        lambda data: b"not an mp4 at all",
+    ],
+    ids=["truncated", "unknown codec", "no video", "not mp4"],
+)
+def test_unsupported_falls_back_to_ffprobe(tmp_path, monkeypatch, corrupt):
+    video = trak(
+        b"vide", mdhd(600, 6000), sample_entry(b"avc1", 640, 480), stts((300, 20))
+    )
+    (tmp_path / "a.mp4").write_bytes(corrupt(mp4(video)))
+    probed = []
+
+    def fake_probe(path, stream_entries, format_entries, **kwargs):
+        probed.append((stream_entries, format_entries, kwargs))
+        return {
+            "streams": [
+                {
+                    "codec_name": "h264",
+                    "width": 640,
+                    "height": 480,
+                    "r_frame_rate": "30/1",
+                }
+            ],
+            "format": {"duration": "9.5"},
+        }
+
+    monkeypatch.setattr(probe, "probe", fake_probe)
+
+    assert read_video_info(tmp_path / "a.mp4") is None
+    assert isobmff.video_info(tmp_path / "a.mp4") == VideoInfo(
+        "h264", 640, 480, 30.0, 9.5, None
+    )
+    assert probed == [
+        (
+            isobmff.FFPROBE_STREAM_ENTRIES,
+            isobmff.FFPROBE_FORMAT_ENTRIES,
+            {"select_streams": "v:0"},
+        )
+    ]
@@ -0,0 +1,141 @@
+import struct
+
+import pytest
+
+from camera_tools.cli.datename import split_native_jpegs
+from camera_tools.jpeg_header import read_jpeg_tags
+
+
+def segment(marker: int, payload: bytes) -> bytes:
+    return struct.pack(">BBH", 0xFF, marker, 2 + len(payload)) + payload
+
+
+def ifd(byte_order: str, entries: list[tuple[int, int, int, bytes]], data_start: int):
+    """
+    An IFD at `data_start` (from the TIFF header), followed by the values not in the entries.
+
+    `entries` are (tag ID, type, count, value) with the value packed in the file's byte order.
+    """
+    table = struct.pack(byte_order + "H", len(entries))
+    extra = b""
+    extra_start = data_start + 2 + 12 * len(entries) + 4
+    for tag_id, tag_type, count, value in entries:
+        if len(value) <= 4:
+            inline = value.ljust(4, b"\0")
+        else:
+            inline = struct.pack(byte_order + "I", extra_start + len(extra))
+            extra += value
+        table += struct.pack(byte_order + "HHI", tag_id, tag_type, count) + inline
+    return table + bytes(4) + extra
+
+
+def ascii_entry(tag_id: int, text: str):
+    value = text.encode() + b"\0"
+    return tag_id, 2, len(value), value
+
+
+def exif(byte_order: str) -> bytes:
+    """A TIFF payload with IFD0 (Make, Orientation) and the Exif IFD (dates)."""
+    exif_ifd_entries = [
+        ascii_entry(0x9003, "2024:01:01 09:00:00"),
+        ascii_entry(0x9011, "+09:00"),
+        ascii_entry(0x9291, "12"),
+    ]
+    ifd0_entries = [
+        ascii_entry(0x010F, "Canon"),
+        (0x0112, 3, 1, struct.pack(byte_order + "H", 6)),
+    ]
+    ifd0_size = len(ifd(byte_order, ifd0_entries, 8)) + 12
+    pointer = (0x8769, 4, 1, struct.pack(byte_order + "I", 8 + ifd0_size))
+    ifd0 = ifd(byte_order, [*ifd0_entries, pointer], 8)
+    header = {"<": b"II", ">": b"MM"}[byte_order]
+    header += struct.pack(byte_order + "HI", 42, 8)
+    return header + ifd0 + ifd(byte_order, exif_ifd_entries, 8 + len(ifd0))
+
+
+def jpeg(*app_segments: bytes, width: int = 640, height: int = 480) -> bytes:
+    frame = segment(0xC0, struct.pack(">BHHB", 8, height, width, 3) + bytes(9))
+    return (
+        b"\xff\xd8"
+        + b"".join(app_segments)
+        + frame
+        + segment(0xDA, bytes(10))
+        + b"image data\xff\xd9"
+    )
+
+
+@pytest.mark.parametrize("byte_order", ["<", ">"], ids=["II", "MM"])
+def test_both_byte_orders(tmp_path, byte_order):
+    (tmp_path / "a.jpg").write_bytes(
+        jpeg(segment(0xE1, b"Exif\0\0" + exif(byte_order)))
+    )
+
+    assert read_jpeg_tags(tmp_path / "a.jpg") == {
+        "SourceFile": str(tmp_path / "a.jpg"),
+        "File:ImageWidth": 640,
+        "File:ImageHeight": 480,
+        "EXIF:Make": "Canon",
+        "EXIF:Orientation": 6,
+        "EXIF:DateTimeOriginal": "2024:01:01 09:00:00",
+        "EXIF:OffsetTimeOriginal": "+09:00",
+        "EXIF:SubSecTimeOriginal": "12",
+        "Composite:SubSecDateTimeOriginal": "2024:01:01 09:00:00.12+09:00",
+    }
+
+
+def test_app1_without_exif(tmp_path):
+    xmp = segment(0xE1, b"http://ns.adobe.com/xap/1.0/\0<x:xmpmeta/>")
+    (tmp_path / "a.jpg").write_bytes(jpeg(xmp))
+
+    assert read_jpeg_tags(tmp_path / "a.jpg") == {
+        "SourceFile": str(tmp_path / "a.jpg"),
+        "File:ImageWidth": 640,
+        "File:ImageHeight": 480,
+    }
+
+
+def _corrupt_exif(payload: bytes) -> bytes:
+    return jpeg(segment(0xE1, b"Exif\0\0" + payload))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        # IFD0 cut off after its entry count.
+        _corrupt_exif(exif("<")[:12]),
+        # TIFF header cut off.
+        _corrupt_exif(b"II*\0"),
+        # IFD0 offset past the end of the segment.
+        _corrupt_exif(b"II*\0" + struct.pack("<I", 10_000) + bytes(20)),
+        # Make's value offset past the end of the segment.
+        _corrupt_exif(
+            b"II*\0"
+            + struct.pack("<IH", 8, 1)
+            + struct.pack("<HHII", 0x010F, 2, 20, 10_000)
+            + bytes(4)
+        ),
+        # Segment longer than the file.
+        jpeg(segment(0xE1, b"Exif\0\0" + exif("<")))[:40],
+        # Not a JPEG, or empty.
+        b"II*\0" + bytes(100),
+        b"",
+    ],
+    ids=[
+        "truncated IFD",
+        "truncated TIFF header",
+        "IFD offset past the end",
+        "value offset past the end",
+        "truncated segment",
+        "not JPEG",
+        "empty",
+    ],
+)
+def test_corrupt_header_falls_back_to_exiftool(tmp_path, data):
+    (tmp_path / "a.jpg").write_bytes(data)
+
+    assert read_jpeg_tags(tmp_path / "a.jpg") is None
+    native, rest = split_native_jpegs(
+        [str(tmp_path / "a.jpg")], ["Composite:SubSecDateTimeOriginal"]
+    )
+    assert native == []
+    assert rest == [str(tmp_path / "a.jpg")]
@@ -0,0 +1,165 @@
+import itertools
+import os
+import types
+from pathlib import Path
+
+import pytest
+
+from camera_tools import metadata_cache
+from camera_tools.metadata_cache import MetadataCache
+
+
+class FakeReader:
+    """Reads every file as a record with its content, counting the files read."""
+
+    def __init__(self, unreadable=()):
+        self.read = []
+        self.unreadable = set(unreadable)
+
+    def __call__(self, filenames):
+        self.read.extend(Path(f).name for f in filenames)
+        return [
+            {"SourceFile": f, "Content": Path(f).read_text()}
+            for f in filenames
+            if Path(f).name not in self.unreadable
+        ]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with MetadataCache(tmp_path / "cache.sqlite") as cache:
+        yield cache
+
+
+def _write(tmp_path, *names):
+    files = []
+    for name in names:
+        (tmp_path / name).write_text(name)
+        files.append(str(tmp_path / name))
+    return files
+
+
+def test_unchanged_files_are_read_once(cache, tmp_path):
+    files = _write(tmp_path, "a.JPG", "b.JPG")
+    reader = FakeReader()
+
+    first = cache.fetch(files, ["-j"], reader)
+    second = cache.fetch(files, ["-j"], reader)
+
+    assert (
+        first
+        == second
+        == [
+            {"SourceFile": files[0], "Content": "a.JPG"},
+            {"SourceFile": files[1], "Content": "b.JPG"},
+        ]
+    )
+    assert reader.read == ["a.JPG", "b.JPG"]
+
+
+def _change_size(path):
+    with open(path, "a") as f:
+        f.write("more")
+
+
+def _change_mtime(path):
+    stat = Path(path).stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def _change_inode(path):
+    # Same size and modification time, but a new file.
+    stat = Path(path).stat()
+    new = Path(path + ".new")
+    new.write_text(Path(path).read_text())
+    new.replace(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    if Path(path).stat().st_ino == stat.st_ino:
+        pytest.skip("the file system reused the inode")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [_change_size, _change_mtime, _change_inode],
+    ids=["size", "mtime", "inode"],
+)
+def test_changed_file_is_read_again(cache, tmp_path, change):
+    files = _write(tmp_path, "a.JPG", "b.JPG")
+    reader = FakeReader()
+    cache.fetch(files, ["-j"], reader)
+
+    change(files[0])
+    cache.fetch(files, ["-j"], reader)
+
+    assert reader.read == ["a.JPG", "b.JPG", "a.JPG"]
+
+
+def test_entries_are_keyed_on_the_args(cache, tmp_path):
+    files = _write(tmp_path, "a.JPG")
+    reader = FakeReader()
+
+    cache.fetch(files, ["-EXIF:Make"], reader)
+    cache.fetch(files, ["-EXIF:Model"], reader)
+    cache.fetch(files, ["-EXIF:Make"], reader)
+
+    assert reader.read == ["a.JPG", "a.JPG"]
+    assert len(cache) == 2
+
+
+def test_files_without_a_record_are_cached_too(cache, tmp_path):
+    files = _write(tmp_path, "a.JPG", "b.txt")
+    reader = FakeReader(unreadable={"b.txt"})
+
+    first = cache.fetch(files, ["-j"], reader)
+    second = cache.fetch(files, ["-j"], reader)
+
+    assert first == second == [{"SourceFile": files[0], "Content": "a.JPG"}]
+    assert reader.read == ["a.JPG", "b.txt"]
+
+
+def test_refresh_reads_every_file_again(tmp_path):
+    files = _write(tmp_path, "a.JPG")
+    reader = FakeReader()
+    with MetadataCache(tmp_path / "cache.sqlite") as cache:
+        cache.fetch(files, ["-j"], reader)
+    with MetadataCache(tmp_path / "cache.sqlite", refresh=True) as cache:
+        cache.fetch(files, ["-j"], reader)
+
+    assert reader.read == ["a.JPG", "a.JPG"]
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    # A clock that always moves, so every use has its own time.
+    monkeypatch.setattr(
+        metadata_cache, "time", types.SimpleNamespace(time=itertools.count().__next__)
+    )
+    files = _write(tmp_path, "a.JPG", "b.JPG", "c.JPG", "d.JPG")
+    reader = FakeReader()
+
+    with MetadataCache(tmp_path / "cache.sqlite", max_entries=3) as cache:
+        for f in files[:3]:
+            cache.fetch([f], ["-j"], reader)
+        cache.fetch(files[:1], ["-j"], reader)  # a.JPG used again
+        cache.fetch(files[3:], ["-j"], reader)
+        assert len(cache) <= 3
+
+        reader.read.clear()
+        cache.fetch(files, ["-j"], reader)
+
+    # b.JPG and c.JPG were the least recently used.
+    assert reader.read == ["b.JPG", "c.JPG"]
+
+
+def test_max_bytes_is_checked_on_close(tmp_path):
+    files = _write(tmp_path, *(f"{i}.JPG" for i in range(200)))
+
+    def read_big(filenames):
+        return [{"SourceFile": f, "Data": "x" * 10_000} for f in filenames]
+
+    with MetadataCache(tmp_path / "cache.sqlite", max_bytes=500_000) as cache:
+        cache.fetch(files, ["-j"], read_big)
+        # Only checked every 1000 entries, or on close.
+        assert len(cache) == 200
+
+    with MetadataCache(tmp_path / "cache.sqlite") as cache:
+        assert 0 < len(cache) <= 50
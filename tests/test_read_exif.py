@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from camera_tools import exiftool
+from camera_tools.cli.read_exif import read_exif
+
+
+@pytest.fixture
+def default_exiftool(fake_exiftool, monkeypatch):
+    monkeypatch.setattr(exiftool, "executable", fake_exiftool)
+
+
+@pytest.fixture
+def photos(tmp_path, monkeypatch):
+    photos = tmp_path / "photos"
+    (photos / "sub").mkdir(parents=True)
+    (photos / "a.JPG").write_bytes(b'FAKE{"EXIF:Make": "Canon"}')
+    (photos / "b.JPG").write_bytes(b"ERRORUnknown file type")
+    (photos / "sub" / "c.JPG").write_bytes(b'FAKE{"EXIF:Make": "Sony"}')
+    monkeypatch.chdir(photos)
+
+
+@pytest.mark.usefixtures("default_exiftool", "photos")
+def test_csv_to_stdout_with_errors_logged(capfd, caplog):
+    read_exif(
+        ["a.JPG", "b.JPG", "sub"],
+        tags=["EXIF:Make"],
+        output_format="csv",
+        no_cache=True,
+    )
+
+    assert capfd.readouterr().out.splitlines() == [
+        "SourceFile,EXIF:Make",
+        "a.JPG,Canon",
+        "sub/c.JPG,Sony",
+    ]
+    assert caplog.messages == ["b.JPG: Unknown file type"]
+
+
+@pytest.mark.usefixtures("default_exiftool", "photos")
+def test_jsonl_to_a_file(capfd):
+    read_exif(
+        ["a.JPG", "sub"], tags=["EXIF:Make"], output=Path("out.jsonl"), no_cache=True
+    )
+
+    records = [json.loads(line) for line in Path("out.jsonl").read_text().splitlines()]
+    assert records == [
+        {"SourceFile": "a.JPG", "EXIF:Make": "Canon"},
+        {"SourceFile": "sub/c.JPG", "EXIF:Make": "Sony"},
+    ]
+    assert capfd.readouterr().out == ""
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from camera_tools.cli.datename import JOURNAL_FILENAME, datename
+from camera_tools.rename_journal import RenameJournal, read_journal
+
+
+@pytest.fixture
+def cut_off_run(tmp_path, monkeypatch):
+    """
+    A run killed mid-batch, with the last line of the journal half written.
+
+    a.JPG was renamed and recorded, b.JPG renamed but its record lost, and c.JPG not renamed yet.
+    """
+    monkeypatch.chdir(tmp_path)
+    renames = [
+        (str(tmp_path / f"{name}.JPG"), str(tmp_path / f"2024_{name}.JPG"))
+        for name in "abc"
+    ]
+    (tmp_path / "2024_a.JPG").write_text("a")
+    (tmp_path / "2024_b.JPG").write_text("b")
+    (tmp_path / "c.JPG").write_text("c")
+    with RenameJournal(JOURNAL_FILENAME) as journal:
+        journal.begin(renames)
+        journal.done(*renames[0])
+    with open(JOURNAL_FILENAME, "a") as f:
+        f.write(json.dumps({"run": 1, "op": "done", "src": renames[1][0]})[:30])
+    return renames
+
+
+def test_resume_a_run_cut_off_mid_batch(tmp_path, cut_off_run):
+    [run] = read_journal(JOURNAL_FILENAME)
+    assert run.interrupted
+    assert run.done == {cut_off_run[0]}
+
+    datename()
+
+    assert sorted(p.name for p in tmp_path.glob("*.JPG")) == [
+        "2024_a.JPG",
+        "2024_b.JPG",
+        "2024_c.JPG",
+    ]
+    [run] = read_journal(JOURNAL_FILENAME)
+    assert run.ended
+    assert run.done == set(cut_off_run)
+
+
+def test_undo_a_run_cut_off_mid_batch(tmp_path, cut_off_run):
+    datename(undo_last=True, dry_run=True)
+    assert sorted(p.name for p in tmp_path.glob("*.JPG")) == [
+        "2024_a.JPG",
+        "2024_b.JPG",
+        "c.JPG",
+    ]
+
+    datename(undo_last=True)
+
+    # Both renames done before it was killed are undone, recorded or not.
+    assert sorted(p.name for p in tmp_path.glob("*.JPG")) == ["a.JPG", "b.JPG", "c.JPG"]
+    [run] = read_journal(JOURNAL_FILENAME)
+    assert run.undo_ended
+    assert run.undone == set(cut_off_run[:2])
+
+
+def test_new_run_starts_the_journal_afresh(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    for run in (1, 2):
+        journal = RenameJournal(path)
+        assert journal.run == run
+        with journal:
+            journal.begin([("a", "b")])
+            journal.done("a", "b")
+            journal.end()
+
+    # Run 1 ended, so only run 2 is kept, to undo it.
+    assert [run.run for run in read_journal(path)] == [2]
+
+
+def test_journal_keeps_interrupted_runs(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    with RenameJournal(path) as journal:
+        journal.begin([("a", "b"), ("c", "d")])
+        journal.done("a", "b")
+
+    journal = RenameJournal(path)
+    assert [run.interrupted for run in journal.runs] == [True]
+    with journal:
+        journal.begin([("e", "f")])
+        journal.end()
+
+    assert [run.run for run in read_journal(path)] == [1, 2]
+    # Resumed since it was read: then it is finished, and dropped by the next run.
+    with journal:
+        journal.done("c", "d", run=1)
+        journal.end(run=1)
+    assert journal.runs[0].ended
+    journal = RenameJournal(path)
+    with journal:
+        journal.begin([("g", "h")])
+    assert [run.run for run in read_journal(path)] == [3]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import argparse
+
+
+class Formatter(
+    argparse.ArgumentDefaultsHelpFormatter, argparse.RawDescriptionHelpFormatter
+):
+    pass
+
+
+parser = argparse.ArgumentParser(
+    description="""Micro-benchmark of the ExifTool output reader.
+
+Runs a fake stay_open process that answers every -execute with a large synthetic JSON output,
+and reports MB/s read (and read + parsed) with the old `output += os.read(fd, 4096)` loop
+and with ExifTool.execute().
+The old reader is quadratic, so keep the sizes small when comparing. POSIX only.
+
+Author: Kiyoon Kim (yoonkr33@gmail.com)""",
+    formatter_class=Formatter,
+)
+parser.add_argument(
+    "--sizes_mb",
+    type=float,
+    nargs="+",
+    default=[1, 4, 16],
+    help="Sizes of the synthetic output in MB",
+)
+parser.add_argument(
+    "--repeat", type=int, default=3, help="Number of runs per size, best is reported"
+)
+parser.add_argument(
+    "--skip_legacy", action="store_true", help="Only benchmark the current reader"
+)
+
+args = parser.parse_args()
+
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from camera_tools import exiftool
+
+# Answers every -execute with a JSON list of records padded like MakerNotes, followed by the sentinel.
+FAKE_EXIFTOOL = """
+import os
+import sys
+size = int(os.environ["BENCH_OUTPUT_SIZE"])
+record = '{"SourceFile": "IMG_0001.CR3", "MakerNotes:Blob": "%s"}' % ("A" * 4000)
+n_records = max(1, size // (len(record) + 1))
+payload = ("[" + ",".join([record] * n_records) + "]\\n").encode()
+for line in sys.stdin.buffer:
+    if line.startswith(b"-execute"):
+        sys.stdout.buffer.write(payload + b"{ready}\\n")
+        sys.stdout.buffer.flush()
+    elif line.strip() == b"False":
+        break
+"""
+
+
+def legacy_execute(et, *params):
+    """The reader before the rewrite: concatenate 4 KiB reads and re-strip the tail every time."""
+    et._process.stdin.write(b"\n".join((*params, b"-execute\n")))
+    et._process.stdin.flush()
+    output = b""
+    fd = et._process.stdout.fileno()
+    while not output[-32:].strip().endswith(exiftool.sentinel):
+        output += os.read(fd, 4096)
+    return output.strip()[: -len(exiftool.sentinel)]
+
+
+def bench(et, execute, repeat):
+    best_read = best_total = float("inf")
+    n_bytes = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = execute(et, b"-j")
+        read = time.perf_counter() - start
+        json.loads(output)
+        total = time.perf_counter() - start
+        n_bytes = len(output)
+        best_read = min(best_read, read)
+        best_total = min(best_total, total)
+    return n_bytes / best_read / 1e6, n_bytes / best_total / 1e6
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # ExifTool.start() passes the usual exiftool options, which the fake process ignores.
+        fake_executable = os.path.join(tmp_dir, "exiftool")
+        with open(fake_executable, "w") as f:
+            f.write(f"#!{sys.executable}\n{FAKE_EXIFTOOL}")
+        os.chmod(fake_executable, 0o755)
+
+        readers = [("current", exiftool.ExifTool.execute)]
+        if not args.skip_legacy:
+            readers.insert(0, ("legacy", legacy_execute))
+
+        print(f"{'reader':>8} {'size MB':>8} {'read MB/s':>10} {'read+parse MB/s':>16}")
+        for size_mb in args.sizes_mb:
+            os.environ["BENCH_OUTPUT_SIZE"] = str(int(size_mb * 1e6))
+            for name, execute in readers:
+                with exiftool.ExifTool(fake_executable, server="never") as et:
+                    read_mbps, total_mbps = bench(et, execute, args.repeat)
+                print(f"{name:>8} {size_mb:>8g} {read_mbps:>10.1f} {total_mbps:>16.1f}")